@@ -9,11 +9,17 @@ import os
 import pytz
 import re
 from utils.link_checker import ShopifyChecker
-from utils.db_manager import DatabaseManager
-from utils.export_manager import ExportManager
+from utils.storage import get_storage_backend
+from utils.export_manager import ExportManager, RECORD_FIELDS, DEFAULT_RECORD_FIELDS
+from utils.export_jobs import get_export_job_manager
 from utils.telegram_notifier import TelegramNotifier
-from utils.scheduler import CheckScheduler
+from utils.notifications import get_notification_dispatcher
+from utils.scheduler import get_scheduler
+from utils.run_metrics import RunMetrics, format_duration
+from utils.metrics import start_metrics_server
+from utils.check_pass import run_check_pass, pass_log, NOTIFY_POLL_SECONDS
 from utils.i18n import get_text
+from utils.structured_log import get_logger
 from utils.template_generator import PageTemplateGenerator
 
 # Configure page
@@ -22,6 +28,11 @@ st.set_page_config(page_title="Shopify Store Monitor",
                    layout="wide",
                    initial_sidebar_state="expanded")
 
+# Check history kept by the weekly compaction job
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '90'))
+
+job_log = get_logger('shopify.jobs')
+
 
 def text_to_html(text):
     """Convert plain text to clean HTML matching markdown preview exactly"""
@@ -131,77 +142,70 @@ def convert_utc_to_pacific(utc_timestamp_str):
         return utc_timestamp_str
 
 
-def scheduled_check_callback():
-    """Callback function for scheduled checks - runs in separate thread"""
+def scheduled_pass(statuses=None):
+    """
+    Check every store (or those with the given statuses) - runs in a
+    scheduler job thread. PROFILE_MODE / PROFILE_CHECKS profile the pass.
+    """
+    label = ', '.join(statuses) if statuses else 'ALL'
+    kind = 'scheduled_' + ('_'.join(status.lower() for status in statuses) if statuses else 'all')
     try:
-        print("\n" + "=" * 50)
-        print("🔄 SCHEDULED CHECK CALLBACK STARTED")
-        print("=" * 50)
-
         # Create standalone instances for thread (can't use st.session_state in threads)
-        print("📦 Creating instances...")
-        data_manager = DatabaseManager()
-        checker = ShopifyChecker()
-        telegram_notifier = TelegramNotifier()
-
-        # Get all stores
-        data = data_manager.get_data()
-        print(f"📊 Found {len(data)} stores to check")
-
-        # Check each store
-        for i, url in enumerate(data.keys(), 1):
-            print(f"[{i}/{len(data)}] Checking: {url[:50]}...")
-            status, timezone_checked = checker.check_store_status(url)
-
-            # If DEAD, do second check
-            if status == "DEAD":
-                print(f"   ⚠️ DEAD detected, rechecking...")
-                time.sleep(1)
-                status, timezone_checked = checker.check_store_status(url)
-                print(f"   Second check result: {status}")
+        run_check_pass(get_storage_backend(), statuses, kind,
+                       notifications=get_notification_dispatcher(),
+                       should_stop=get_scheduler().should_stop)
+    except Exception:
+        pass_log.exception('pass_failed', statuses=label)
+        raise
 
-            data_manager.update_store_status(url, status, timezone_checked)
 
-        # Check for newly dead stores in the last 5 minutes
-        print("\n🔍 Checking for newly dead stores (last 5 min)...")
-        newly_dead = data_manager.get_newly_dead_stores(minutes=5)
-        print(f"   Found {len(newly_dead)} newly dead stores")
+def scheduled_check_callback():
+    """Full pass over every store"""
+    scheduled_pass()
 
-        # Send Telegram notification if there are newly dead stores
-        if newly_dead:
-            print(
-                f"📢 Attempting to notify about {len(newly_dead)} dead stores..."
-            )
-            result = telegram_notifier.notify_dead_stores(newly_dead)
-            print(f"   Notification result: {result}")
-        else:
-            print("   No newly dead stores to notify")
 
-        # Also check for other status changes
-        print("\n🔍 Checking for status changes (last 5 min)...")
-        changes = data_manager.get_latest_changes(minutes=5)
-        print(f"   Found {len(changes)} status changes")
+def scheduled_recheck_dead():
+    """Recheck DEAD stores only"""
+    scheduled_pass(['DEAD'])
 
-        if changes:
-            print(f"📢 Attempting to notify about {len(changes)} changes...")
-            result = telegram_notifier.notify_status_changes(changes)
-            print(f"   Notification result: {result}")
-        else:
-            print("   No status changes to notify")
 
-        print("\n" + "=" * 50)
-        print("✅ SCHEDULED CHECK CALLBACK COMPLETED")
-        print("=" * 50 + "\n")
+def scheduled_recheck_unpaid():
+    """Recheck UNPAID stores only"""
+    scheduled_pass(['UNPAID'])
 
-    except Exception as e:
-        print(f"\n❌ ERROR in scheduled check: {e}")
-        import traceback
-        traceback.print_exc()
+
+def scheduled_export():
+    """Daily CSV export of all stores, through the export job manager (cached, old files evicted)"""
+    job = get_export_job_manager().submit_records(get_storage_backend(), 'csv', compress=True)
+    while not job.finished:
+        time.sleep(1)
+    if job.status == 'failed':
+        raise RuntimeError(f"Scheduled export failed: {job.error}")
+    job_log.info('scheduled_export_ready', filename=job.filename, rows=job.rows_done)
+
+
+def scheduled_compact_history():
+    """Trim check history older than HISTORY_RETENTION_DAYS"""
+    deleted = get_storage_backend().compact_history(HISTORY_RETENTION_DAYS)
+    job_log.info('history_compacted', deleted=deleted, retention_days=HISTORY_RETENTION_DAYS)
+
+
+def register_scheduled_jobs(scheduler):
+    """
+    Register every scheduled job. Defaults spread the work over the day;
+    override any of them with SCHEDULE_<JOB> (interval, cron or "off").
+    """
+    scheduler.set_check_callback(scheduled_check_callback)
+    # Every job writing store statuses is exclusive: one check pass at a time, any process
+    scheduler.add_job('recheck_dead', scheduled_recheck_dead, '15 */2 * * *', exclusive=True)
+    scheduler.add_job('recheck_unpaid', scheduled_recheck_unpaid, '5,35 * * * *', exclusive=True)
+    scheduler.add_job('export', scheduled_export, '0 6 * * *')
+    scheduler.add_job('compact_history', scheduled_compact_history, '30 3 * * 0')
 
 
 # Initialize session state
 if 'data_manager' not in st.session_state:
-    st.session_state.data_manager = DatabaseManager()
+    st.session_state.data_manager = get_storage_backend()
 if 'checker' not in st.session_state:
     st.session_state.checker = ShopifyChecker()
 if 'export_manager' not in st.session_state:
@@ -209,8 +213,9 @@ if 'export_manager' not in st.session_state:
 if 'telegram_notifier' not in st.session_state:
     st.session_state.telegram_notifier = TelegramNotifier()
 if 'scheduler' not in st.session_state:
-    st.session_state.scheduler = CheckScheduler()
-    st.session_state.scheduler.set_check_callback(scheduled_check_callback)
+    st.session_state.scheduler = get_scheduler()
+    register_scheduled_jobs(st.session_state.scheduler)
+    start_metrics_server(st.session_state.data_manager)
 if 'theme' not in st.session_state:
     st.session_state.theme = 'dark'
 if 'language' not in st.session_state:
@@ -314,14 +319,14 @@ def main():
         # Check all button
         if st.button(get_text('start_checking', lang), type="primary"):
             if st.session_state.data_manager.get_total_count() > 0:
-                check_all_stores()
+                run_exclusive_pass(check_all_stores)
             else:
                 st.error(get_text('no_urls', lang))
 
         # Quick recheck dead stores
         if st.button(get_text('recheck_dead', lang)):
             if st.session_state.data_manager.get_dead_count() > 0:
-                recheck_dead_stores()
+                run_exclusive_pass(recheck_dead_stores)
             else:
                 st.info(get_text('no_dead', lang))
 
@@ -362,6 +367,41 @@ def main():
         else:
             st.info(get_text('scheduler_stopped', lang))
 
+        with st.expander(get_text('scheduled_jobs', lang)):
+            for job in st.session_state.scheduler.get_jobs():
+                next_run = job['next_run'][:16] if job['next_run'] else '-'
+                last = job['last_status'] or '-'
+                if job['last_duration_seconds'] is not None:
+                    last += f" ({job['last_duration_seconds']}s)"
+                st.markdown(f"**{job['name']}** `{job['schedule']}`  \n"
+                            f"{get_text('job_next_run', lang)}: {next_run} · "
+                            f"{get_text('job_last_run', lang)}: {last}")
+
+        with st.expander(get_text('recent_runs', lang)):
+            runs = st.session_state.data_manager.get_check_runs(10)
+            if runs:
+                rows = []
+                for run in runs:
+                    stages = {name: seconds for name, seconds in run['stage_seconds'].items() if seconds}
+                    slowest = max(stages, key=stages.get) if stages else '-'
+                    duration = None
+                    if run['finished_at']:
+                        duration = (datetime.fromisoformat(run['finished_at']) -
+                                    datetime.fromisoformat(run['started_at'])).total_seconds()
+                    rows.append({
+                        get_text('run_started', lang): convert_utc_to_pacific(run['started_at'])[:16],
+                        get_text('run_kind', lang): run['kind'],
+                        get_text('status', lang): run['status'],
+                        get_text('run_checked', lang): f"{run['checked']}/{run['total']}",
+                        'URLs/min': round((run['urls_per_second'] or 0) * 60, 1),
+                        get_text('run_duration', lang): format_duration(duration),
+                        get_text('run_slowest_stage', lang): slowest,
+                        get_text('run_profile', lang): (run.get('profile') or {}).get('report') or '-'
+                    })
+                st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+            else:
+                st.caption(get_text('no_runs', lang))
+
         st.markdown("---")
 
         # Telegram controls
@@ -540,13 +580,21 @@ def main():
             get_text('all_data', lang),
             get_text('live_only', lang),
             get_text('dead_only', lang),
-            get_text('unpaid_only', lang)
+            get_text('unpaid_only', lang),
+            get_text('csv_export', lang),
+            get_text('jsonl_export', lang)
         ]
         export_type = st.selectbox(get_text('export_type', lang),
                                    export_options)
+        export_fields = None
+        if export_type in (get_text('csv_export', lang), get_text('jsonl_export', lang)):
+            export_fields = st.multiselect(get_text('export_fields', lang),
+                                           RECORD_FIELDS, default=DEFAULT_RECORD_FIELDS)
+        export_gzip = st.checkbox(get_text('export_gzip', lang), value=False)
 
         if st.button(get_text('download_export', lang)):
-            export_data(export_type)
+            export_data(export_type, compress=export_gzip, fields=export_fields)
+        export_job_status()
 
         st.markdown("---")
 
@@ -1117,11 +1165,19 @@ Twitter: https://twitter.com/storecutban"""
             ))
 
 
+def run_exclusive_pass(check_function):
+    """Run a manual check pass unless another pass (scheduled or manual, any process) is running"""
+    with st.session_state.scheduler.exclusive_pass() as acquired:
+        if not acquired:
+            st.warning(get_text('check_in_progress', st.session_state.language))
+            return
+        check_function()
+
+
 def check_all_stores():
     """Check all stores with progress tracking"""
     lang = st.session_state.language
-    data = st.session_state.data_manager.get_data()
-    total_urls = len(data)
+    total_urls = st.session_state.data_manager.get_total_count()
 
     if total_urls == 0:
         st.error(get_text('no_urls', lang))
@@ -1140,64 +1196,76 @@ def check_all_stores():
         unpaid_counter = col3.empty()
         checked_counter = col4.empty()
 
+        rate_text = st.empty()
+
         live_count = 0
         dead_count = 0
         unpaid_count = 0
 
-        for i, (url, store_data) in enumerate(data.items()):
-            progress = (i + 1) / total_urls
-            progress_bar.progress(progress)
-            status_text.text(
-                get_text('checking',
-                         lang,
-                         current=i + 1,
-                         total=total_urls,
-                         url=url[:50]))
-
-            status, timezone_checked = st.session_state.checker.check_store_status(
-                url)
-
-            if status == "DEAD":
+        data_manager = st.session_state.data_manager
+        checker = st.session_state.checker
+        with RunMetrics('check_all', total_urls, data_manager) as metrics:
+            for i, store in enumerate(data_manager.iter_stores()):
+                url = store.url
+                # Stores added mid-pass can push the count past the initial total
+                progress = min((i + 1) / total_urls, 1.0)
+                progress_bar.progress(progress)
                 status_text.text(
-                    get_text('rechecking_dead', lang, url=url[:50]))
-                time.sleep(1)
-                status, timezone_checked = st.session_state.checker.check_store_status(
-                    url)
-
-            st.session_state.data_manager.update_store_status(
-                url, status, timezone_checked)
-
-            # Update live counters to keep WebSocket alive
-            if status == "LIVE":
-                live_count += 1
-            elif status == "DEAD":
-                dead_count += 1
-            elif status == "UNPAID":
-                unpaid_count += 1
-
-            live_counter.metric("✅ Live",
-                                live_count,
-                                delta=f"{(live_count/(i+1)*100):.1f}%")
-            dead_counter.metric("❌ Dead",
-                                dead_count,
-                                delta=f"{(dead_count/(i+1)*100):.1f}%")
-            unpaid_counter.metric("⚠️ Unpaid",
-                                  unpaid_count,
-                                  delta=f"{(unpaid_count/(i+1)*100):.1f}%")
-            checked_counter.metric("📊 Checked",
-                                   i + 1,
-                                   delta=f"{((i+1)/total_urls*100):.1f}%")
+                    get_text('checking',
+                             lang,
+                             current=i + 1,
+                             total=total_urls,
+                             url=url[:50]))
+
+                status, timezone_checked = checker.check_store_status(url)
+                metrics.add_timings(checker.last_timings)
+
+                if status == "DEAD":
+                    status_text.text(
+                        get_text('rechecking_dead', lang, url=url[:50]))
+                    with metrics.stage('delay'):
+                        time.sleep(1)
+                    status, timezone_checked = checker.check_store_status(url)
+                    metrics.add_timings(checker.last_timings)
+
+                with metrics.stage('db_write'):
+                    data_manager.update_store_status(url, status, timezone_checked,
+                                                     checker.last_response_time, checker.last_status_code)
+                with metrics.stage('notify'):
+                    get_notification_dispatcher().notify_new_events(
+                        data_manager, min_interval=NOTIFY_POLL_SECONDS)
+                metrics.record(status)
+                metrics.maybe_save()
+
+                # Update live counters to keep WebSocket alive
+                if status == "LIVE":
+                    live_count += 1
+                elif status == "DEAD":
+                    dead_count += 1
+                elif status == "UNPAID":
+                    unpaid_count += 1
+
+                live_counter.metric("✅ Live",
+                                    live_count,
+                                    delta=f"{(live_count/(i+1)*100):.1f}%")
+                dead_counter.metric("❌ Dead",
+                                    dead_count,
+                                    delta=f"{(dead_count/(i+1)*100):.1f}%")
+                unpaid_counter.metric("⚠️ Unpaid",
+                                      unpaid_count,
+                                      delta=f"{(unpaid_count/(i+1)*100):.1f}%")
+                checked_counter.metric("📊 Checked",
+                                       i + 1,
+                                       delta=f"{((i+1)/total_urls*100):.1f}%")
+                rate_text.caption(metrics.format_progress())
 
         progress_bar.empty()
         status_text.empty()
+        rate_text.empty()
 
-    newly_dead = st.session_state.data_manager.get_newly_dead_stores(minutes=5)
-    if newly_dead:
-        st.session_state.telegram_notifier.notify_dead_stores(newly_dead)
+    st.session_state.data_manager.flush()
 
-    changes = st.session_state.data_manager.get_latest_changes(minutes=5)
-    if changes:
-        st.session_state.telegram_notifier.notify_status_changes(changes)
+    get_notification_dispatcher().notify_new_events(st.session_state.data_manager)
 
     get_cached_status_counts.clear()
     get_cached_counts.clear()
@@ -1221,18 +1289,31 @@ def recheck_dead_stores():
         progress_bar = st.progress(0)
         status_text = st.empty()
 
-        for i, url in enumerate(dead_stores):
-            progress = (i + 1) / len(dead_stores)
-            progress_bar.progress(progress)
-            status_text.text(get_text('rechecking_dead', lang, url=url[:50]))
+        rate_text = st.empty()
 
-            status, timezone_checked = st.session_state.checker.check_store_status(
-                url)
-            st.session_state.data_manager.update_store_status(
-                url, status, timezone_checked)
+        data_manager = st.session_state.data_manager
+        checker = st.session_state.checker
+        with RunMetrics('recheck_dead', len(dead_stores), data_manager) as metrics:
+            for i, url in enumerate(dead_stores):
+                progress = (i + 1) / len(dead_stores)
+                progress_bar.progress(progress)
+                status_text.text(get_text('rechecking_dead', lang, url=url[:50]))
+
+                status, timezone_checked = checker.check_store_status(url)
+                metrics.add_timings(checker.last_timings)
+                with metrics.stage('db_write'):
+                    data_manager.update_store_status(url, status, timezone_checked,
+                                                     checker.last_response_time, checker.last_status_code)
+                metrics.record(status)
+                metrics.maybe_save()
+                rate_text.caption(metrics.format_progress())
 
         progress_bar.empty()
         status_text.empty()
+        rate_text.empty()
+
+    st.session_state.data_manager.flush()
+    get_notification_dispatcher().notify_new_events(st.session_state.data_manager)
 
     get_cached_status_counts.clear()
     get_cached_counts.clear()
@@ -1543,29 +1624,57 @@ def delete_links_by_option(delete_option):
         return 0
 
 
-def export_data(export_type):
-    """Handle data export"""
+def export_data(export_type, compress=False, fields=None):
+    """Queue a background export; progress is shown by export_job_status()"""
     lang = st.session_state.language
-    with st.spinner(get_text('exporting', lang)):
-        # Map display names to internal names
-        type_map = {
-            get_text('all_data', lang): 'All Data',
-            get_text('live_only', lang): 'LIVE Only',
-            get_text('dead_only', lang): 'DEAD Only',
-            get_text('unpaid_only', lang): 'UNPAID Only'
-        }
+    # Map display names to internal names
+    type_map = {
+        get_text('all_data', lang): 'All Data',
+        get_text('live_only', lang): 'LIVE Only',
+        get_text('dead_only', lang): 'DEAD Only',
+        get_text('unpaid_only', lang): 'UNPAID Only'
+    }
+    record_formats = {
+        get_text('csv_export', lang): 'csv',
+        get_text('jsonl_export', lang): 'jsonl'
+    }
+
+    jobs = get_export_job_manager()
+    if export_type in record_formats:
+        job = jobs.submit_records(st.session_state.data_manager, fmt=record_formats[export_type],
+                                  fields=fields or None, compress=compress)
+    else:
         internal_type = type_map.get(export_type, export_type)
+        job = jobs.submit_report(st.session_state.data_manager, internal_type, compress=compress)
 
-        filename = st.session_state.export_manager.export_data(
-            st.session_state.data_manager, internal_type)
+    st.session_state.export_job_id = job.id
+    st.session_state.export_job_label = export_type
 
-        if filename:
-            with open(filename, 'r') as f:
-                st.download_button(label=f"📥 {export_type}",
-                                   data=f.read(),
-                                   file_name=os.path.basename(filename),
-                                   mime='text/plain')
-            st.success(get_text('export_success', lang, type=export_type))
+
+@st.fragment(run_every=1)
+def export_job_status():
+    """Progress / download for the current background export, refreshed every second"""
+    job_id = st.session_state.get('export_job_id')
+    job = get_export_job_manager().get(job_id) if job_id else None
+    if job is None:
+        return
+
+    lang = st.session_state.language
+    label = st.session_state.get('export_job_label', '')
+    if not job.finished:
+        st.progress(job.progress, text=get_text('export_progress', lang,
+                                                done=job.rows_done, total=job.rows_total))
+    elif job.status == 'failed':
+        st.error(get_text('export_failed', lang, error=job.error))
+    elif job.filename and os.path.exists(job.filename):
+        mimes = {'.csv': 'text/csv', '.jsonl': 'application/x-ndjson', '.gz': 'application/gzip'}
+        with open(job.filename, 'rb') as f:
+            st.download_button(label=f"📥 {label}",
+                               data=f,
+                               file_name=os.path.basename(job.filename),
+                               mime=mimes.get(os.path.splitext(job.filename)[1], 'text/plain'),
+                               key=f"download_{job.id}")
+        st.success(get_text('export_cached' if job.cached else 'export_success', lang, type=label))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for per-check database time.
+
+Runs the hot DatabaseManager calls made for every checked store
+(recording a check + status counts) against the database in DATABASE_URL,
+in three modes:
+
+    legacy    the old per-check statement sequence (SELECT previous status,
+              UPDATE, INSERT if missing, history and change-event INSERTs)
+    upsert    the single-statement upsert, sent as plain SQL
+    prepared  the single-statement upsert as a server-side prepared statement
+
+Benchmark stores, their history and their change events are deleted
+afterwards, but a notification pass running meanwhile can still see their
+transitions: use a scratch database, not the production one.
+
+Usage: python bench_db.py [--checks 2000]
+"""
+import argparse
+import time
+import statistics
+from utils.db_manager import DatabaseManager
+
+BENCH_PREFIX = "bench-db-"
+
+
+def legacy_update(db: DatabaseManager, url: str, status: str, timezone_checked: str,
+                  response_time: float, status_code: int) -> None:
+    """The per-check statements update_store_status ran before the single upsert"""
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            current_time = db.get_current_time()
+            cur.execute('SELECT id, status FROM stores WHERE url = %s FOR UPDATE', (url,))
+            row = cur.fetchone()
+            previous_status = row[1] if row else None
+            if row:
+                cur.execute('''
+                    UPDATE stores
+                    SET status = %(status)s, last_check = %(now)s, check_count = check_count + 1,
+                        updated_at = %(now)s, timezone_checked = %(tz)s,
+                        first_check = COALESCE(first_check, %(now)s),
+                        first_dead_date = CASE
+                            WHEN %(status)s = 'DEAD' AND %(prev)s != 'DEAD' THEN %(now)s
+                            WHEN %(status)s != 'DEAD' AND %(prev)s = 'DEAD' THEN NULL
+                            ELSE first_dead_date
+                        END
+                    WHERE id = %(id)s
+                ''', {'status': status, 'now': current_time, 'tz': timezone_checked,
+                      'prev': previous_status, 'id': row[0]})
+                store_id = row[0]
+            else:
+                cur.execute('''
+                    INSERT INTO stores (url, status, first_check, last_check, check_count,
+                                        timezone_checked, first_dead_date)
+                    VALUES (%s, %s, %s, %s, 1, %s, %s) RETURNING id
+                ''', (url, status, current_time, current_time, timezone_checked,
+                      current_time if status == 'DEAD' else None))
+                store_id = cur.fetchone()[0]
+            cur.execute('''
+                INSERT INTO check_history (store_id, status, checked_at, response_time, status_code)
+                VALUES (%s, %s, %s, %s, %s)
+            ''', (store_id, status, current_time, response_time, status_code))
+            if previous_status != status:
+                cur.execute('''
+                    INSERT INTO store_events (store_id, url, event, old_status, new_status)
+                    VALUES (%s, %s, %s, %s, %s)
+                ''', (store_id, url, 'changed' if previous_status else 'added', previous_status, status))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db.return_connection(conn)
+
+
+def run_pass(db: DatabaseManager, urls, rounds: int, legacy: bool = False) -> list:
+    """Time one recorded check + get_status_counts per URL, per round"""
+    record = (lambda *args: legacy_update(db, *args)) if legacy else db.update_store_status
+    timings = []
+    statuses = ["LIVE", "DEAD", "UNPAID"]
+    for r in range(rounds):
+        for i, url in enumerate(urls):
+            start = time.perf_counter()
+            record(url, statuses[(i + r) % 3], "America/New_York", 0.25, 200)
+            db.get_status_counts()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def cleanup(db: DatabaseManager) -> None:
+    """Remove every benchmark store with its check history and change events"""
+    pattern = BENCH_PREFIX + '%'
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute('''
+                DELETE FROM check_history
+                WHERE store_id IN (SELECT id FROM stores WHERE url LIKE %s)
+            ''', (pattern,))
+            cur.execute('DELETE FROM store_events WHERE url LIKE %s', (pattern,))
+            cur.execute('DELETE FROM stores WHERE url LIKE %s', (pattern,))
+        conn.commit()
+    finally:
+        db.return_connection(conn)
+
+
+def report(label: str, timings: list) -> float:
+    """Print a summary line and return the mean in milliseconds"""
+    ordered = sorted(timings)
+    mean_ms = statistics.mean(timings) * 1000
+    p95_ms = ordered[int(len(ordered) * 0.95) - 1] * 1000
+    print(f"{label:<12} checks={len(timings):>6}  mean={mean_ms:7.3f} ms  "
+          f"p50={statistics.median(timings) * 1000:7.3f} ms  p95={p95_ms:7.3f} ms")
+    return mean_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=2000, help='checks per mode')
+    parser.add_argument('--stores', type=int, default=200, help='distinct benchmark stores')
+    args = parser.parse_args()
+
+    urls = [f"{BENCH_PREFIX}{i}.myshopify.com" for i in range(args.stores)]
+    rounds = max(1, args.checks // len(urls))
+
+    results = {}
+    for label, use_prepared, legacy in (("legacy", False, True), ("upsert", False, False),
+                                        ("prepared", True, False)):
+        db = DatabaseManager(use_prepared=use_prepared)
+        try:
+            cleanup(db)  # leftovers of an interrupted run
+            db.load_urls(urls)
+            run_pass(db, urls[:20], 1, legacy)  # warm up pool and plan cache
+            results[label] = report(label, run_pass(db, urls, rounds, legacy))
+        finally:
+            cleanup(db)
+
+    print()
+    for label in ("upsert", "prepared"):
+        saved = results["legacy"] - results[label]
+        print(f"Per-check DB time, legacy -> {label}: {results['legacy']:.3f} ms -> {results[label]:.3f} ms "
+              f"({saved / results['legacy'] * 100:.1f}% less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for in-process store records.
+
+Builds N stores with a full check history in a fresh subprocess, once with
+the previous dict-of-dicts layout (ISO strings, list of history dicts) and
+once with StoreRecord (slots, epoch ints, ring-buffer history), and reports
+the RSS each layout adds over an empty interpreter.
+
+Usage: python bench_memory.py [--sizes 100000 500000] [--history 50]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+CHILD = r'''
+import gc, json, random, resource, sys
+from datetime import datetime, timedelta
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+
+mode, n, history = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+from utils.store_record import StoreRecord, to_epoch_us
+gc.collect()
+base = rss_mb()
+
+statuses = ['LIVE', 'DEAD', 'UNPAID']
+start = datetime(2025, 1, 1)
+stores = {}
+for i in range(n):
+    url = f"store-{i}.myshopify.com"
+    if mode == 'dict':
+        hist = []
+        for h in range(history):
+            hist.append({'timestamp': (start + timedelta(hours=h)).isoformat(),
+                         'status': statuses[(i + h) % 3],
+                         'response_time': 0.4, 'status_code': 200})
+        stores[url] = {'status': statuses[i % 3], 'first_check': start.isoformat(),
+                       'last_check': (start + timedelta(hours=history)).isoformat(),
+                       'first_dead_date': None, 'check_count': history,
+                       'timezone_checked': 'America/Chicago', 'check_history': hist}
+    else:
+        rec = StoreRecord(statuses[i % 3])
+        rec.first_check = to_epoch_us(start.isoformat())
+        rec.last_check = to_epoch_us((start + timedelta(hours=history)).isoformat())
+        rec.check_count = history
+        rec.timezone_checked = 'America/Chicago'
+        for h in range(history):
+            rec.add_history(rec.first_check + h * 3_600_000_000, statuses[(i + h) % 3], 0.4, 200)
+        stores[url] = rec
+
+gc.collect()
+print(json.dumps({'rss_mb': rss_mb() - base}))
+'''
+
+
+def measure(mode: str, n: int, history: int) -> float:
+    """RSS growth in MB for building n stores in a subprocess"""
+    out = subprocess.run([sys.executable, '-c', CHILD, mode, str(n), str(history)],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)['rss_mb']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 500000])
+    parser.add_argument('--history', type=int, default=50, help='history entries per store')
+    args = parser.parse_args()
+
+    print(f"{'stores':>8}  {'dict RSS':>12}  {'record RSS':>12}  {'ratio':>6}")
+    for n in args.sizes:
+        dict_mb = measure('dict', n, args.history)
+        record_mb = measure('record', n, args.history)
+        print(f"{n:>8}  {dict_mb:>9.1f} MB  {record_mb:>9.1f} MB  {dict_mb / record_mb:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Load test for Telegram notification delivery.
+
+Starts the local Bot API stand-in (utils/telegram_stub.py) with the given
+latency, error rate and rate limit, drives bursts of status changes through
+TelegramNotifier, and reports per-change delivery latency (queued -> received
+by the stub) and loss. Changes are matched by URL in delivered messages and
+in CSV digest attachments.
+
+Usage: python bench_telegram.py [--bursts 5] [--burst-size 500] [--rate-limit 1] [--error-rate 0.05]
+"""
+import argparse
+import csv
+import io
+import os
+import statistics
+import time
+from utils.telegram_stub import TelegramStub
+
+BENCH_PREFIX = "https://bench-tg-"
+
+
+def delivered_urls(message: dict) -> list:
+    """Store URLs contained in one message the stub received"""
+    if message['method'] == 'sendDocument':
+        rows = csv.DictReader(io.StringIO(message['document']['content'].decode('utf-8')))
+        return [row['url'] for row in rows]
+    return [line[2:] for line in message.get('text', '').splitlines() if line.startswith('• ')]
+
+
+def report(queued_at: dict, stub: TelegramStub, notifier, elapsed: float) -> None:
+    """Print latency, loss and API counters"""
+    latencies = {}
+    duplicates = 0
+    for message in stub.messages:
+        for url in delivered_urls(message):
+            if url in latencies:
+                duplicates += 1
+            elif url in queued_at:
+                latencies[url] = message['received_at'] - queued_at[url]
+
+    lost = len(queued_at) - len(latencies)
+    print(f"changes queued   {len(queued_at):>8}")
+    print(f"delivered        {len(latencies):>8}  lost={lost} ({lost / len(queued_at) * 100:.1f}%)  "
+          f"duplicates={duplicates}")
+    if latencies:
+        ordered = sorted(latencies.values())
+        p95 = ordered[max(int(len(ordered) * 0.95) - 1, 0)]
+        print(f"latency          p50={statistics.median(ordered):7.2f} s  p95={p95:7.2f} s  "
+              f"max={ordered[-1]:7.2f} s")
+    print(f"messages         {len(stub.messages):>8}  "
+          f"({sum(m['method'] == 'sendDocument' for m in stub.messages)} with attachment)")
+    print(f"stub             {stub.stats}")
+    print(f"notifier         {notifier.get_delivery_stats()}")
+    print(f"elapsed          {elapsed:8.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bursts', type=int, default=5)
+    parser.add_argument('--burst-size', type=int, default=500, help='status changes per burst')
+    parser.add_argument('--burst-interval', type=float, default=2.0, help='seconds between bursts')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='fraction of requests failing with 502')
+    parser.add_argument('--rate-limit', type=int, default=1, help='stub messages per chat per second, 0 = unlimited')
+    parser.add_argument('--coalesce', type=float, default=1.0, help='TELEGRAM_COALESCE_SECONDS')
+    parser.add_argument('--min-interval', type=float, default=0.0, help='TELEGRAM_MIN_INTERVAL')
+    parser.add_argument('--timeout', type=float, default=300.0, help='seconds to wait for delivery')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    stub = TelegramStub(latency=args.latency, error_rate=args.error_rate, rate_limit=args.rate_limit,
+                        seed=args.seed)
+    os.environ.update({
+        'TELEGRAM_API_BASE': stub.start(),
+        'TELEGRAM_BOT_TOKEN': 'bench',
+        'TELEGRAM_CHAT_ID': 'bench-chat',
+        'TELEGRAM_COALESCE_SECONDS': str(args.coalesce),
+        'TELEGRAM_MIN_INTERVAL': str(args.min_interval),
+    })
+    # Imported after the environment is set - the notifier reads it at class definition
+    from utils.telegram_notifier import TelegramNotifier
+    notifier = TelegramNotifier()
+
+    # Transitions the notifier reports (inline messages skip e.g. UNPAID -> LIVE)
+    transitions = [('LIVE', 'DEAD'), ('DEAD', 'LIVE'), ('LIVE', 'UNPAID')]
+    queued_at = {}
+    start = time.time()
+    try:
+        for burst in range(args.bursts):
+            changes = []
+            for i in range(args.burst_size):
+                old, new = transitions[i % len(transitions)]
+                changes.append({'url': f"{BENCH_PREFIX}{burst}-{i}.myshopify.com",
+                                'from_status': old, 'to_status': new})
+            now = time.time()
+            for change in changes:
+                queued_at[change['url']] = now
+            notifier.notify_status_changes(changes)
+            if burst < args.bursts - 1:
+                time.sleep(args.burst_interval)
+
+        if not notifier.flush(timeout=args.timeout):
+            print(f"⚠️ Queue not drained after {args.timeout:.0f}s")
+        report(queued_at, stub, notifier, time.time() - start)
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Command-line interface for Shopify Link Checker.
+
+Uses the storage backend selected by STORAGE_BACKEND (see
+utils/storage.py), or the one given with --backend.
+
+Usage:
+    python cli.py export --format csv --fields url,status,last_status_code
+    python cli.py export --format jsonl --status DEAD --status UNPAID --gzip
+    python cli.py export --format txt --status DEAD
+    python cli.py export --format jsonl --delta --cursor warehouse
+    python cli.py export --format parquet --table check_history
+    python cli.py metrics --port 9108
+    python cli.py check --status DEAD
+    python cli.py check --profile cprofile --profile-checks 50
+"""
+import argparse
+import os
+import sys
+
+from utils.check_pass import run_check_pass
+from utils.export_manager import ExportManager, RECORD_FIELDS, DEFAULT_RECORD_FIELDS
+from utils.metrics import MetricsRegistry, MetricsServer, storage_collector
+from utils.profiling import PROFILE_MODES
+from utils.run_metrics import format_duration
+from utils.scheduler import CheckScheduler
+from utils.storage import get_storage_backend
+
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+TEXT_EXPORT_TYPES = {
+    None: "All Data",
+    'LIVE': "LIVE Only",
+    'DEAD': "DEAD Only",
+    'UNPAID': "UNPAID Only",
+}
+
+
+def cmd_export(args) -> int:
+    """Export stores as CSV, JSON Lines, a text report, or Parquet / Arrow tables"""
+    data_manager = get_storage_backend()
+    export_manager = ExportManager()
+
+    if args.format in COLUMNAR_FORMATS:
+        if args.status or args.delta or args.gzip or args.output:
+            print("❌ Parquet / Arrow exports take whole tables: no --status, --delta, --gzip or --output",
+                  file=sys.stderr)
+            return 2
+        try:
+            filename = export_manager.export_columnar(
+                data_manager, args.table, fmt=args.format, incremental=not args.full)
+        except (ImportError, NotImplementedError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+        if filename is None:
+            print(f"No new {args.table} rows since the last export", file=sys.stderr)
+            return 0
+    elif args.format == 'txt':
+        if args.delta:
+            print("❌ --delta needs --format csv or jsonl", file=sys.stderr)
+            return 2
+        statuses = args.status or [None]
+        if len(statuses) > 1 or statuses[0] not in TEXT_EXPORT_TYPES:
+            print("❌ Text reports take at most one --status of LIVE, DEAD or UNPAID", file=sys.stderr)
+            return 2
+        filename = export_manager.export_data(data_manager, TEXT_EXPORT_TYPES[statuses[0]], compress=args.gzip)
+    else:
+        fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+        try:
+            if args.delta:
+                filename = export_manager.export_delta(
+                    data_manager, fmt=args.format, fields=fields, cursor=args.cursor,
+                    compress=args.gzip, filename=args.output)
+                if filename is None:
+                    print("No changes since the last delta export", file=sys.stderr)
+                    return 0
+            else:
+                filename = export_manager.export_records(
+                    data_manager, fmt=args.format, fields=fields, statuses=args.status,
+                    compress=args.gzip, filename=args.output)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+
+    print(filename)
+    return 0
+
+
+def cmd_metrics(args) -> int:
+    """
+    Serve storage-derived metrics (stores, scheduler, check runs) for
+    Prometheus without the Streamlit app. Check and notification counters
+    are exported by the process doing the checks (METRICS_PORT).
+    """
+    registry = MetricsRegistry()
+    registry.add_collector(storage_collector(get_storage_backend()))
+    try:
+        server = MetricsServer(args.host, args.port, registry)
+    except OSError as e:
+        print(f"❌ Cannot listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 1
+    print(f"📊 Serving metrics on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_check(args) -> int:
+    """
+    Run a check pass, optionally profiled, unless another pass (scheduled
+    or manual, any process) is running. Status changes are not sent from
+    here: the app's next pass queues them from the change log.
+    """
+    kind = 'cli_' + ('_'.join(status.lower() for status in args.status) if args.status else 'all')
+    storage = get_storage_backend()
+    lock = storage.acquire_leader_lock(CheckScheduler.PASS_LOCK)
+    if lock is None:
+        print("⏭️ Another check pass is running", file=sys.stderr)
+        return 1
+    try:
+        metrics = run_check_pass(storage, args.status, kind,
+                                 profile_mode=args.profile, profile_checks=args.profile_checks)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        lock.release()
+    print(f"📈 Run {metrics.id} {metrics.status}: {metrics.checked}/{metrics.total} stores in "
+          f"{format_duration(metrics.elapsed)}, {metrics.urls_per_second * 60:.1f} URLs/min")
+    if metrics.profile:
+        print(f"🔬 Profile ({metrics.profile['checks']} checks): {metrics.profile['report'] or 'not written'}")
+    return 0 if metrics.status == 'ok' else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Argument parser with one subcommand per task"""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['postgres', 'sqlite', 'json'],
+                        help='storage backend (default: STORAGE_BACKEND env)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser('export', help='export stores')
+    export.add_argument('--format', choices=['csv', 'jsonl', 'txt', *COLUMNAR_FORMATS], default='csv')
+    export.add_argument('--fields', default=','.join(DEFAULT_RECORD_FIELDS),
+                        help=f"comma-separated columns for csv/jsonl. Available: {', '.join(RECORD_FIELDS)}")
+    export.add_argument('--status', action='append', type=str.upper,
+                        help='only stores with this status (repeatable)')
+    export.add_argument('--gzip', action='store_true', help='gzip the output file')
+    export.add_argument('--output', '-o', help='output path for csv/jsonl (.gz suffix compresses)')
+    export.add_argument('--delta', action='store_true',
+                        help='only stores added, changed or removed since the last delta export')
+    export.add_argument('--cursor', default='default',
+                        help='name of the delta watermark, one per downstream consumer')
+    export.add_argument('--table', choices=['check_history', 'stores'], default='check_history',
+                        help='table for parquet/arrow exports')
+    export.add_argument('--full', action='store_true',
+                        help='parquet/arrow: export the whole table instead of rows since the last export')
+    export.set_defaults(func=cmd_export)
+
+    metrics = subparsers.add_parser('metrics', help='serve Prometheus metrics from storage')
+    metrics.add_argument('--host', default=os.getenv('METRICS_HOST', '0.0.0.0'))
+    metrics.add_argument('--port', type=int, default=int(os.getenv('METRICS_PORT', '9108')))
+    metrics.set_defaults(func=cmd_metrics)
+
+    check = subparsers.add_parser('check', help='check stores (optionally profiled)')
+    check.add_argument('--status', action='append', type=str.upper,
+                       help='only stores with this status (repeatable)')
+    check.add_argument('--profile', choices=['off', *PROFILE_MODES],
+                       help='profile the pass (default: PROFILE_MODE env)')
+    check.add_argument('--profile-checks', type=int,
+                       help='profile only the first N checks, 0 = all (default: PROFILE_CHECKS env)')
+    check.set_defaults(func=cmd_check)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.backend:
+        os.environ['STORAGE_BACKEND'] = args.backend
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,9 @@
 """
 Migration script to move data from JSON to PostgreSQL
 """
-import json
 import os
 from utils.db_manager import DatabaseManager
+from utils.data_manager import DataManager
 from datetime import datetime
 
 def migrate_json_to_db():
@@ -11,14 +11,15 @@ def migrate_json_to_db():
     
     json_file = "shopify_data.json"
     
-    if not os.path.exists(json_file):
+    if not os.path.exists(json_file) and not os.path.exists(f"{json_file}.journal"):
         print("No JSON file found. Starting with fresh database.")
         return
     
     print(f"Loading data from {json_file}...")
     
-    with open(json_file, 'r', encoding='utf-8') as f:
-        json_data = json.load(f)
+    # DataManager replays the append-only journal on top of the snapshot
+    json_manager = DataManager(json_file)
+    json_data = json_manager.get_data()
     
     print(f"Found {len(json_data)} stores in JSON file")
     
@@ -40,7 +41,6 @@ def migrate_json_to_db():
             # But we need to preserve the original timestamps
             # For this migration, we'll need direct SQL
             
-            import psycopg2
             conn = db.get_connection()
             cur = conn.cursor()
             
@@ -94,7 +94,7 @@ def migrate_json_to_db():
             
             finally:
                 cur.close()
-                conn.close()
+                db.return_connection(conn)
         
         except Exception as e:
             print(f"Error migrating {url}: {e}")
@@ -105,8 +105,12 @@ def migrate_json_to_db():
     
     # Backup JSON file
     backup_file = f"{json_file}.backup"
+    # Fold any pending journal entries into the snapshot before backing it up
+    json_manager.save_to_file()
     if os.path.exists(json_file):
         os.rename(json_file, backup_file)
+        if os.path.exists(json_manager.journal_file):
+            os.remove(json_manager.journal_file)
         print(f"Original JSON file backed up to {backup_file}")
 
 if __name__ == "__main__":
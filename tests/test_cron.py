@@ -0,0 +1,121 @@
+"""Cron / interval schedule parsing and next-run times"""
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from utils.cron import CronSchedule, IntervalSchedule, parse_schedule
+
+
+def utc(*args):
+    return pytz.UTC.localize(datetime(*args))
+
+
+def next_runs(expression, start, count=3):
+    schedule = CronSchedule(expression, timezone='UTC')
+    runs = []
+    moment = start
+    for _ in range(count):
+        moment = schedule.next_after(moment)
+        runs.append(moment)
+    return runs
+
+
+@pytest.mark.parametrize('text', [None, '', '  ', 'off', 'OFF', 'none', 'disabled'])
+def test_disabled_schedules(text):
+    assert parse_schedule(text) is None
+
+
+@pytest.mark.parametrize('text, minutes', [
+    ('30', 30), ('every 30m', 30), ('45min', 45), ('2h', 120), ('every 1d', 1440), ('Every 2H', 120),
+])
+def test_intervals(text, minutes):
+    schedule = parse_schedule(text)
+    assert isinstance(schedule, IntervalSchedule)
+    assert schedule.minutes == minutes
+    assert schedule.next_after(utc(2026, 3, 1, 12, 0)) == utc(2026, 3, 1, 12, 0) + timedelta(minutes=minutes)
+
+
+def test_zero_interval_is_rejected():
+    with pytest.raises(ValueError):
+        parse_schedule('every 0m')
+
+
+def test_cron_expression_is_parsed():
+    assert isinstance(parse_schedule('0 6 * * *'), CronSchedule)
+
+
+@pytest.mark.parametrize('alias, expected', [
+    ('@hourly', [utc(2026, 3, 4, 11, 0), utc(2026, 3, 4, 12, 0), utc(2026, 3, 4, 13, 0)]),
+    ('@daily', [utc(2026, 3, 5), utc(2026, 3, 6), utc(2026, 3, 7)]),
+    ('@midnight', [utc(2026, 3, 5), utc(2026, 3, 6), utc(2026, 3, 7)]),
+    ('@weekly', [utc(2026, 3, 8), utc(2026, 3, 15), utc(2026, 3, 22)]),  # Sundays
+    ('@monthly', [utc(2026, 4, 1), utc(2026, 5, 1), utc(2026, 6, 1)]),
+])
+def test_aliases(alias, expected):
+    assert next_runs(alias, utc(2026, 3, 4, 10, 30)) == expected  # a Wednesday
+
+
+def test_next_run_is_strictly_after_the_moment():
+    assert next_runs('30 10 * * *', utc(2026, 3, 4, 10, 30), 1) == [utc(2026, 3, 5, 10, 30)]
+    assert next_runs('30 10 * * *', utc(2026, 3, 4, 10, 29, 59), 1) == [utc(2026, 3, 4, 10, 30)]
+
+
+def test_steps_ranges_and_lists():
+    assert next_runs('*/20 * * * *', utc(2026, 3, 4, 10, 5)) == [
+        utc(2026, 3, 4, 10, 20), utc(2026, 3, 4, 10, 40), utc(2026, 3, 4, 11, 0)]
+    assert next_runs('0 8-18/4 * * *', utc(2026, 3, 4, 9, 0), 4) == [
+        utc(2026, 3, 4, 12, 0), utc(2026, 3, 4, 16, 0), utc(2026, 3, 5, 8, 0), utc(2026, 3, 5, 12, 0)]
+    assert next_runs('15,45 2 * * *', utc(2026, 3, 4, 3, 0)) == [
+        utc(2026, 3, 5, 2, 15), utc(2026, 3, 5, 2, 45), utc(2026, 3, 6, 2, 15)]
+    assert next_runs('5/20 0 * * *', utc(2026, 3, 4), 3) == [
+        utc(2026, 3, 4, 0, 5), utc(2026, 3, 4, 0, 25), utc(2026, 3, 4, 0, 45)]
+
+
+def test_weekday_range_and_sunday_as_seven():
+    # Weekdays at 09:00 starting Friday 2026-03-06
+    assert next_runs('0 9 * * 1-5', utc(2026, 3, 6, 10, 0), 2) == [utc(2026, 3, 9, 9, 0), utc(2026, 3, 10, 9, 0)]
+    assert next_runs('0 0 * * 7', utc(2026, 3, 4), 1) == next_runs('0 0 * * 0', utc(2026, 3, 4), 1)
+
+
+def test_restricted_day_fields_match_either():
+    # 13th of the month or any Friday
+    assert next_runs('0 0 13 * 5', utc(2026, 3, 1), 4) == [
+        utc(2026, 3, 6), utc(2026, 3, 13), utc(2026, 3, 20), utc(2026, 3, 27)]
+
+
+def test_month_field_skips_to_matching_months():
+    assert next_runs('0 0 1 1,7 *', utc(2026, 3, 4), 2) == [utc(2026, 7, 1), utc(2027, 1, 1)]
+
+
+def test_day_that_never_comes_in_a_month_is_skipped():
+    assert next_runs('0 0 31 * *', utc(2026, 3, 31, 1, 0), 2) == [utc(2026, 5, 31), utc(2026, 7, 31)]
+
+
+def test_expression_is_evaluated_in_the_scheduler_timezone():
+    schedule = CronSchedule('0 6 * * *', timezone='America/Los_Angeles')
+    assert schedule.next_after(utc(2026, 1, 15, 0, 0)) == utc(2026, 1, 15, 14, 0)  # PST
+    assert schedule.next_after(utc(2026, 7, 15, 0, 0)) == utc(2026, 7, 15, 13, 0)  # PDT
+
+
+@pytest.mark.parametrize('expression', [
+    '* * * *',          # too few fields
+    '* * * * * *',      # too many
+    '60 * * * *',       # minute out of range
+    '* 24 * * *',
+    '* * 0 * *',        # day-of-month starts at 1
+    '* * * 13 *',
+    '* * * * 8',
+    '5-1 * * * *',      # reversed range
+    '*/0 * * * *',      # zero step
+    'x * * * *',
+    '@yearly',          # unsupported alias
+])
+def test_invalid_cron_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_expression_that_never_matches():
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 30 2 *', timezone='UTC').next_after(utc(2026, 1, 1))
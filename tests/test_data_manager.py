@@ -0,0 +1,191 @@
+"""JSON DataManager: journal replay, snapshot compaction and the change-event file"""
+import json
+import os
+import threading
+
+import pytest
+
+from utils.data_manager import DataManager
+
+URLS = [f"https://store{i}.myshopify.com" for i in range(5)]
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    return str(tmp_path / 'stores.json')
+
+
+def open_manager(data_file, compact_every=None):
+    manager = DataManager(data_file)
+    if compact_every is not None:
+        manager.compact_min_entries = compact_every
+    return manager
+
+
+def close_manager(manager):
+    """Release the writer lock so another instance can take over the files"""
+    if manager._writer is not None:
+        manager._writer.release()
+        manager._writer = None
+
+
+def journal_lines(data_file):
+    with open(f"{data_file}.journal", encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def event_ids(data_file):
+    with open(f"{data_file}.events", encoding='utf-8') as f:
+        return [json.loads(line)['id'] for line in f]
+
+
+def test_journal_is_replayed_on_load(data_file):
+    manager = open_manager(data_file)
+    manager.load_urls(URLS)
+    manager.update_store_status(URLS[0], 'LIVE', 'America/New_York', 0.25, 200)
+    manager.update_store_status(URLS[1], 'DEAD', None, None, 404)
+    manager.update_store_status(URLS[1], 'LIVE', None, 0.5, 200)
+    close_manager(manager)
+
+    assert not os.path.exists(data_file)  # nothing compacted yet: everything is in the journal
+    assert len(journal_lines(data_file)) == 4
+
+    reloaded = open_manager(data_file)
+    assert reloaded.get_status_counts() == {'UNCHECKED': 3, 'LIVE': 2}
+    store = reloaded.get_store_details(URLS[1])
+    assert store['status'] == 'LIVE'
+    assert store['check_count'] == 2
+    assert store['first_dead_date'] is None
+    history = reloaded.get_check_history(URLS[1])
+    assert [entry['status'] for entry in history] == ['LIVE', 'DEAD']
+    assert history[0]['response_time'] == 0.5
+    close_manager(reloaded)
+
+
+def test_journal_is_folded_into_a_snapshot(data_file):
+    manager = open_manager(data_file, compact_every=3)
+    manager.load_urls(URLS)
+    for url in URLS:
+        manager.update_store_status(url, 'LIVE')
+    manager.update_store_status(URLS[0], 'DEAD')
+
+    # 7 journal entries > max(3, 5 stores): compacted once on the 6th
+    assert os.path.exists(data_file)
+    assert len(journal_lines(data_file)) == 1
+    close_manager(manager)
+
+    reloaded = open_manager(data_file)
+    assert reloaded.get_status_counts() == {'LIVE': 4, 'DEAD': 1}
+    assert len(reloaded.get_check_history(URLS[0])) == 2
+    close_manager(reloaded)
+
+
+def test_replaying_a_journal_already_in_the_snapshot_is_harmless(data_file):
+    manager = open_manager(data_file)
+    manager.load_urls(URLS[:2])
+    manager.update_store_status(URLS[0], 'DEAD')
+    manager.update_store_status(URLS[0], 'LIVE')
+    journal = journal_lines(data_file)
+    manager.save_to_file()
+    close_manager(manager)
+
+    # Crash between the snapshot rename and the journal truncation
+    with open(f"{data_file}.journal", 'w', encoding='utf-8') as f:
+        f.write('\n'.join(journal) + '\n')
+
+    reloaded = open_manager(data_file)
+    store = reloaded.get_store_details(URLS[0])
+    assert store['status'] == 'LIVE'
+    assert store['check_count'] == 2
+    assert len(reloaded.get_check_history(URLS[0])) == 2
+    close_manager(reloaded)
+
+
+def test_torn_journal_tail_is_dropped_and_folded(data_file):
+    manager = open_manager(data_file)
+    manager.load_urls(URLS[:2])
+    manager.update_store_status(URLS[0], 'DEAD')
+    close_manager(manager)
+
+    with open(f"{data_file}.journal", 'a', encoding='utf-8') as f:
+        f.write('{"op":"put","url":"https://store1.myshop')
+
+    reloaded = open_manager(data_file)
+    assert reloaded.get_status_counts() == {'DEAD': 1, 'UNCHECKED': 1}
+    # The damaged journal was folded into a snapshot, so new appends start clean
+    assert journal_lines(data_file) == []
+    reloaded.update_store_status(URLS[1], 'LIVE')
+    close_manager(reloaded)
+
+    again = open_manager(data_file)
+    assert again.get_status_counts() == {'DEAD': 1, 'LIVE': 1}
+    close_manager(again)
+
+
+def test_events_file_is_compacted_to_the_oldest_cursor(data_file):
+    manager = open_manager(data_file)
+    manager.load_urls(URLS)                       # events 1-5
+    for url in URLS:
+        manager.update_store_status(url, 'LIVE')  # events 6-10
+    manager.set_sync_cursor('notify:telegram', 8)
+    manager.set_sync_cursor('export:warehouse', 7)
+
+    manager.save_to_file()
+    assert event_ids(data_file) == [8, 9, 10]
+
+    manager.update_store_status(URLS[0], 'DEAD')  # event 11
+    changes = list(manager.iter_status_changes(7, 11))
+    assert [change['id'] for change in changes] == [11]
+    close_manager(manager)
+
+    # Ids carry on after a restart
+    reloaded = open_manager(data_file)
+    assert reloaded.get_last_event_id() == 11
+    reloaded.update_store_status(URLS[0], 'LIVE')
+    assert event_ids(data_file)[-1] == 12
+    close_manager(reloaded)
+
+
+def test_events_compaction_keeps_the_newest_event_without_cursors(data_file):
+    manager = open_manager(data_file)
+    manager.load_urls(URLS)
+    manager.save_to_file()
+    assert event_ids(data_file) == [5]
+    close_manager(manager)
+
+
+def test_reader_offset_survives_compaction_by_the_writer(data_file):
+    writer = open_manager(data_file)
+    writer.load_urls(URLS)
+    for url in URLS:
+        writer.update_store_status(url, 'LIVE')
+    reader = open_manager(data_file)  # a second process reading the same files
+    assert len(list(reader._iter_events(0, 10))) == 10
+
+    writer.set_sync_cursor('notify:dispatch', 9)
+    writer.save_to_file()
+    writer.update_store_status(URLS[0], 'DEAD')
+    writer.update_store_status(URLS[1], 'DEAD')
+
+    # The reader's saved offset points into the old, longer file
+    assert [event['id'] for event in reader._iter_events(10, 12)] == [11, 12]
+    close_manager(writer)
+
+
+def test_concurrent_readers_see_every_event(data_file):
+    manager = open_manager(data_file)
+    manager.load_urls([f"https://s{i}.myshopify.com" for i in range(300)])
+    results = []
+
+    def read():
+        for after_id in range(0, 300, 30):
+            ids = [event['id'] for event in manager._iter_events(after_id, after_id + 30)]
+            results.append(ids == list(range(after_id + 1, after_id + 31)))
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results and all(results)
+    close_manager(manager)
@@ -0,0 +1,153 @@
+"""ManagedConnectionPool: bounded checkout, timeouts and connection recycling (no database needed)"""
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions
+
+from utils.db_pool import ManagedConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.dead:
+            import psycopg2
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+
+class FakeInfo:
+    transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection: psycopg2.connect(dsn, connection_factory=FakeConnection)"""
+
+    opened = []
+
+    def __init__(self, dsn, *args, **kwargs):
+        self.dsn = dsn
+        self.closed = 0
+        self.dead = False
+        self.info = FakeInfo()
+        FakeConnection.opened.append(self)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture(autouse=True)
+def reset_opened():
+    FakeConnection.opened = []
+
+
+def make_pool(**kwargs):
+    options = dict(minconn=0, maxconn=2, checkout_timeout=1.0, max_idle_seconds=300.0,
+                   ping_after_seconds=30.0, connection_factory=FakeConnection)
+    options.update(kwargs)
+    return ManagedConnectionPool('dbname=test', **options)
+
+
+def test_minconn_connections_are_opened_up_front():
+    pool = make_pool(minconn=2)
+    assert len(FakeConnection.opened) == 2
+    assert pool.get_stats()['idle'] == 2
+
+
+def test_checkout_times_out_when_pool_is_exhausted():
+    pool = make_pool(maxconn=1)
+    conn = pool.getconn()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.1)
+    assert time.monotonic() - started >= 0.1
+
+    stats = pool.get_stats()
+    assert stats['timeouts'] == 1
+    assert stats['in_use'] == 1
+    assert stats['saturation'] == 1.0
+
+    pool.putconn(conn)
+    assert pool.getconn(timeout=0.1) is conn
+
+
+def test_waiting_checkout_gets_the_returned_connection():
+    pool = make_pool(maxconn=1)
+    conn = pool.getconn()
+    result = {}
+
+    def waiter():
+        result['conn'] = pool.getconn(timeout=5)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    deadline = time.monotonic() + 2
+    while pool.get_stats()['waiting'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.get_stats()['waiting'] == 1
+
+    pool.putconn(conn)
+    thread.join(timeout=5)
+    assert result['conn'] is conn
+    assert len(FakeConnection.opened) == 1
+
+
+def test_connection_idle_too_long_is_recycled():
+    pool = make_pool(max_idle_seconds=0.05)
+    first = pool.getconn()
+    pool.putconn(first)
+    time.sleep(0.1)
+
+    second = pool.getconn()
+    assert second is not first
+    assert first.closed
+    stats = pool.get_stats()
+    assert stats['recycled_idle'] == 1
+    assert stats['open'] == 1
+
+
+def test_recently_used_connection_is_reused_without_ping():
+    pool = make_pool(ping_after_seconds=30.0)
+    first = pool.getconn()
+    pool.putconn(first)
+    first.dead = True  # not pinged yet, so not noticed
+    assert pool.getconn() is first
+
+
+def test_dead_connection_is_replaced_after_ping():
+    pool = make_pool(ping_after_seconds=0.01)
+    first = pool.getconn()
+    pool.putconn(first)
+    first.dead = True
+    time.sleep(0.05)
+
+    second = pool.getconn()
+    assert second is not first
+    assert pool.get_stats()['replaced_stale'] == 1
+
+
+def test_closed_connection_is_discarded_on_return():
+    pool = make_pool(maxconn=1)
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+
+    stats = pool.get_stats()
+    assert stats['open'] == 0
+    assert stats['idle'] == 0
+    assert pool.getconn(timeout=0.1) is not conn
@@ -0,0 +1,268 @@
+"""Notification dispatcher: per-sink cursors, dead-lettering and the shared dispatch cursor"""
+import json
+import threading
+
+import pytest
+
+from utils.notifications import NotificationDispatcher, NotificationSink, TelegramSink
+from utils.sqlite_manager import SQLiteManager
+from utils.telegram_notifier import TelegramNotifier
+from utils.telegram_stub import TelegramStub
+
+URLS = [f"https://store{i}.myshopify.com" for i in range(3)]
+
+
+class RecordingSink(NotificationSink):
+    """In-memory sink; raises while fail is set"""
+
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.batches = []
+
+    def send(self, changes):
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        self.batches.append(list(changes))
+
+    @property
+    def urls(self):
+        return [change['url'] for batch in self.batches for change in batch]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteManager(str(tmp_path / 'stores.db'))
+    storage.load_urls(URLS)
+    for url in URLS:
+        storage.update_store_status(url, 'LIVE')  # first check, not a transition
+    return storage
+
+
+@pytest.fixture
+def dead_letter(tmp_path, monkeypatch):
+    path = tmp_path / 'failed.jsonl'
+    monkeypatch.setenv('NOTIFY_MAX_RETRIES', '0')
+    monkeypatch.setenv('NOTIFY_DEAD_LETTER', str(path))
+    return path
+
+
+def make_dispatcher(storage, *sinks):
+    dispatcher = NotificationDispatcher(list(sinks))
+    assert dispatcher.notify_new_events(storage) == 0  # first run only sets the cursor
+    return dispatcher
+
+
+def sink_position(storage, name):
+    """Where a sink resumes: its own cursor, or notify:dispatch until it saved one"""
+    saved = storage.get_sync_cursor(f"notify:{name}")
+    return storage.get_sync_cursor(NotificationDispatcher.NOTIFY_CURSOR) if saved is None else saved
+
+
+def transition(storage, status):
+    for url in URLS:
+        storage.update_store_status(url, status)
+
+
+def test_first_run_does_not_replay_old_changes(storage, dead_letter):
+    transition(storage, 'DEAD')
+    sink = RecordingSink('file')
+    dispatcher = make_dispatcher(storage, sink)
+
+    assert dispatcher.flush(5)
+    assert sink.batches == []
+    assert storage.get_sync_cursor(NotificationDispatcher.NOTIFY_CURSOR) == storage.get_last_event_id()
+
+
+def test_each_sink_gets_changes_and_saves_its_cursor(storage, dead_letter):
+    first, second = RecordingSink('file'), RecordingSink('webhook')
+    dispatcher = make_dispatcher(storage, first, second)
+    transition(storage, 'DEAD')
+
+    assert dispatcher.notify_new_events(storage) == len(URLS)
+    assert dispatcher.flush(5)
+
+    last_id = storage.get_last_event_id()
+    for sink in (first, second):
+        assert sink.urls == URLS
+        assert storage.get_sync_cursor(NotificationDispatcher.sink_cursor(sink)) == last_id
+    assert storage.get_sync_cursor(NotificationDispatcher.NOTIFY_CURSOR) == last_id
+
+
+def test_failed_batch_is_dead_lettered_and_the_sink_moves_on(storage, dead_letter):
+    healthy, failing = RecordingSink('file'), RecordingSink('webhook', fail=True)
+    dispatcher = make_dispatcher(storage, healthy, failing)
+    transition(storage, 'DEAD')
+
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+
+    (line,) = dead_letter.read_text(encoding='utf-8').splitlines()
+    entry = json.loads(line)
+    assert entry['sink'] == 'webhook'
+    assert 'webhook is down' in entry['error']
+    assert [change['url'] for change in entry['changes']] == URLS
+    assert dispatcher.get_stats()['webhook']['dead_lettered'] == len(URLS)
+    assert storage.get_sync_cursor('notify:webhook') == storage.get_last_event_id()
+
+
+def test_dispatch_cursor_is_the_oldest_sink_cursor(storage, tmp_path, monkeypatch):
+    # A dead-letter path that cannot be created: the failing sink keeps nothing and stays behind
+    (tmp_path / 'blocked').write_text('')
+    monkeypatch.setenv('NOTIFY_MAX_RETRIES', '0')
+    monkeypatch.setenv('NOTIFY_DEAD_LETTER', str(tmp_path / 'blocked' / 'failed.jsonl'))
+    healthy, failing = RecordingSink('file'), RecordingSink('webhook', fail=True)
+    dispatcher = make_dispatcher(storage, healthy, failing)
+    start = storage.get_last_event_id()
+    transition(storage, 'DEAD')
+
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+
+    assert sink_position(storage, 'file') == storage.get_last_event_id()
+    assert sink_position(storage, 'webhook') == start
+    assert storage.get_sync_cursor(NotificationDispatcher.NOTIFY_CURSOR) == start
+    assert dispatcher.get_stats()['webhook']['dropped'] == len(URLS)
+
+
+def test_range_is_redelivered_only_to_the_sink_that_missed_it(storage, tmp_path, monkeypatch):
+    (tmp_path / 'blocked').write_text('')
+    monkeypatch.setenv('NOTIFY_MAX_RETRIES', '0')
+    monkeypatch.setenv('NOTIFY_DEAD_LETTER', str(tmp_path / 'blocked' / 'failed.jsonl'))
+    healthy, failing = RecordingSink('file'), RecordingSink('webhook', fail=True)
+    dispatcher = make_dispatcher(storage, healthy, failing)
+    transition(storage, 'DEAD')
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+
+    failing.fail = False
+    transition(storage, 'LIVE')
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+
+    assert healthy.urls == URLS * 2
+    assert failing.urls == URLS * 2
+    assert [change['to_status'] for change in failing.batches[0]] == ['DEAD'] * 3 + ['LIVE'] * 3
+    last_id = storage.get_last_event_id()
+    assert storage.get_sync_cursor('notify:webhook') == last_id
+    assert storage.get_sync_cursor(NotificationDispatcher.NOTIFY_CURSOR) == last_id
+
+
+class BlockingSink(RecordingSink):
+    """Holds every send until released"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def send(self, changes):
+        self.entered.set()
+        assert self.release.wait(5)
+        super().send(changes)
+
+
+def test_cursor_only_moves_after_delivery(storage, dead_letter):
+    sink = BlockingSink('file')
+    dispatcher = make_dispatcher(storage, sink)
+    start = storage.get_last_event_id()
+    transition(storage, 'DEAD')
+
+    assert dispatcher.notify_new_events(storage) == len(URLS)
+    assert sink.entered.wait(5)
+    assert sink_position(storage, 'file') == start
+    assert storage.get_sync_cursor(NotificationDispatcher.NOTIFY_CURSOR) == start
+
+    sink.release.set()
+    assert dispatcher.flush(5)
+    assert storage.get_sync_cursor(NotificationDispatcher.NOTIFY_CURSOR) == storage.get_last_event_id()
+
+
+def test_other_dispatcher_waits_while_the_lock_is_held(storage, dead_letter):
+    sink = BlockingSink('file')
+    dispatcher = make_dispatcher(storage, sink)
+    transition(storage, 'DEAD')
+    dispatcher.notify_new_events(storage)
+    assert sink.entered.wait(5)
+
+    other = RecordingSink('file')
+    assert NotificationDispatcher([other]).notify_new_events(storage) == 0
+
+    sink.release.set()
+    assert dispatcher.flush(5)
+    assert sink.urls == URLS
+    assert other.batches == []
+
+
+def test_restarted_dispatcher_resends_what_was_not_delivered(storage, tmp_path, monkeypatch):
+    (tmp_path / 'blocked').write_text('')
+    monkeypatch.setenv('NOTIFY_MAX_RETRIES', '0')
+    monkeypatch.setenv('NOTIFY_DEAD_LETTER', str(tmp_path / 'blocked' / 'failed.jsonl'))
+    dispatcher = make_dispatcher(storage, RecordingSink('file', fail=True))
+    transition(storage, 'DEAD')
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+
+    # A new process: fresh dispatcher and sink, same database
+    sink = RecordingSink('file')
+    restarted = NotificationDispatcher([sink])
+    assert restarted.notify_new_events(storage) == len(URLS)
+    assert restarted.flush(5)
+    assert sink.urls == URLS
+    assert sink_position(storage, 'file') == storage.get_last_event_id()
+
+
+@pytest.fixture
+def telegram_stub(monkeypatch):
+    stub = TelegramStub()
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'stub-token')
+    monkeypatch.setenv('TELEGRAM_CHAT_ID', '12345')
+    monkeypatch.setenv('TELEGRAM_MIN_INTERVAL', '0')
+    monkeypatch.setenv('TELEGRAM_API_BASE', stub.start())
+    yield stub
+    stub.stop()
+
+
+def test_telegram_sink_delivers_through_the_bot_api(storage, dead_letter, telegram_stub):
+    dispatcher = make_dispatcher(storage, TelegramSink(TelegramNotifier()))
+    transition(storage, 'DEAD')
+
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+
+    (message,) = telegram_stub.messages
+    assert all(url in message['text'] for url in URLS)
+    assert sink_position(storage, 'telegram') == storage.get_last_event_id()
+
+
+def test_rejected_telegram_batch_is_dead_lettered(storage, dead_letter, telegram_stub):
+    telegram_stub.error_rate = 1.0
+    dispatcher = make_dispatcher(storage, TelegramSink(TelegramNotifier()))
+    transition(storage, 'DEAD')
+
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+
+    assert telegram_stub.messages == []
+    (line,) = dead_letter.read_text(encoding='utf-8').splitlines()
+    assert json.loads(line)['sink'] == 'telegram'
+
+
+def test_telegram_cursor_stays_back_when_the_batch_is_lost(storage, tmp_path, monkeypatch, telegram_stub):
+    (tmp_path / 'blocked').write_text('')
+    monkeypatch.setenv('NOTIFY_MAX_RETRIES', '0')
+    monkeypatch.setenv('NOTIFY_DEAD_LETTER', str(tmp_path / 'blocked' / 'failed.jsonl'))
+    telegram_stub.error_rate = 1.0
+    dispatcher = make_dispatcher(storage, TelegramSink(TelegramNotifier()))
+    start = storage.get_last_event_id()
+    transition(storage, 'DEAD')
+
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+    assert sink_position(storage, 'telegram') == start
+
+    telegram_stub.error_rate = 0.0
+    dispatcher.notify_new_events(storage)
+    assert dispatcher.flush(5)
+    assert len(telegram_stub.messages) == 1
+    assert sink_position(storage, 'telegram') == storage.get_last_event_id()
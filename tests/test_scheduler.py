@@ -0,0 +1,147 @@
+"""Process-level scheduler: persisted state, leader lock and overlap protection"""
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from utils.scheduler import CheckScheduler
+from utils.sqlite_manager import SQLiteManager
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCHEDULER_POLL_SECONDS', '0.05')
+    return SQLiteManager(str(tmp_path / 'stores.db'))
+
+
+@pytest.fixture
+def make_scheduler(storage):
+    schedulers = []
+
+    def make():
+        scheduler = CheckScheduler(storage)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+        scheduler.shutdown()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_full_pass_runs_on_start_and_its_outcome_is_persisted(storage, make_scheduler):
+    ran = threading.Event()
+    scheduler = make_scheduler()
+    scheduler.set_check_callback(ran.set)
+
+    assert scheduler.start()
+    assert ran.wait(5)
+    assert wait_for(lambda: scheduler.get_status()['last_status'] == 'ok')
+
+    # Another process (or a restart) sees the same schedule state
+    other = CheckScheduler(storage)
+    status = other.get_status()
+    assert status['running'] is True
+    assert status['in_progress'] is False
+    assert status['last_check'] is not None
+    assert status['next_check'] > status['last_check']
+    (run,) = storage.get_scheduler_state(CheckScheduler.JOB_NAME)['history']
+    assert run['status'] == 'ok'
+
+
+def test_start_twice_is_refused_and_stop_clears_next_run(storage, make_scheduler):
+    scheduler = make_scheduler()
+    scheduler.add_job('export', lambda: None, '0 6 * * *')
+
+    assert scheduler.start()
+    assert not make_scheduler().start()  # already enabled in the shared state
+    assert storage.get_scheduler_state('export')['next_run'] is not None
+
+    assert scheduler.stop()
+    assert scheduler.should_stop()
+    assert storage.get_scheduler_state('export').get('next_run') is None
+    assert not scheduler.get_status()['running']
+
+
+def test_only_one_scheduler_is_leader(make_scheduler):
+    first, second = make_scheduler(), make_scheduler()
+
+    assert first._is_leader()
+    assert not second._is_leader()
+    first.shutdown()
+    assert second._is_leader()
+
+
+def test_new_leader_marks_a_dead_leaders_run_interrupted(storage, make_scheduler):
+    scheduler = make_scheduler()
+    scheduler.add_job('recheck', lambda: None, 'every 30m')
+    storage.update_scheduler_state('recheck', {'in_progress': True})
+
+    assert scheduler._is_leader()
+    state = storage.get_scheduler_state('recheck')
+    assert state['in_progress'] is False
+    assert state['last_status'] == 'interrupted'
+
+
+def test_exclusive_pass_excludes_other_passes(make_scheduler):
+    first, second = make_scheduler(), make_scheduler()
+
+    with first.exclusive_pass() as acquired:
+        assert acquired
+        with first.exclusive_pass() as nested:
+            assert not nested
+        with second.exclusive_pass() as other_process:
+            assert not other_process
+    with second.exclusive_pass() as acquired:
+        assert acquired
+
+
+def test_due_job_is_skipped_while_its_previous_run_is_in_progress(storage, make_scheduler):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_job():
+        started.set()
+        release.wait(5)
+
+    scheduler = make_scheduler()
+    job = scheduler.add_job('recheck', slow_job, 'every 30m')
+    past = (scheduler._now() - timedelta(minutes=1)).isoformat()
+
+    storage.update_scheduler_state('recheck', {'next_run': past})
+    scheduler._dispatch(job)
+    assert started.wait(5)
+
+    storage.update_scheduler_state('recheck', {'next_run': past})
+    scheduler._dispatch(job)
+    release.set()
+    assert wait_for(lambda: job.running == 0)
+
+    statuses = [run['status'] for run in storage.get_scheduler_state('recheck')['history']]
+    assert sorted(statuses) == ['ok', 'skipped']
+
+
+def test_exclusive_job_is_skipped_while_another_pass_runs(storage, make_scheduler):
+    ran = threading.Event()
+    scheduler = make_scheduler()
+    scheduler.set_check_callback(ran.set)
+    job = scheduler.jobs[CheckScheduler.JOB_NAME]
+
+    with make_scheduler().exclusive_pass() as acquired:
+        assert acquired
+        with scheduler._jobs_lock:
+            job.running += 1
+        scheduler._run_job(job)
+
+    assert not ran.is_set()
+    (run,) = storage.get_scheduler_state(CheckScheduler.JOB_NAME)['history']
+    assert run['status'] == 'skipped'
@@ -0,0 +1,36 @@
+"""StoreRecord / HistoryRing: compact in-memory store records of the JSON backend"""
+import json
+
+from utils.store_record import HISTORY_LIMIT, HistoryRing, StoreRecord, to_epoch_us
+
+
+def test_response_times_round_trip_exactly_through_json():
+    record = StoreRecord()
+    record.add_history(to_epoch_us('2026-01-02T03:04:05.123456'), 'LIVE', 1.234567, 200)
+    record.add_history(to_epoch_us('2026-01-02T03:05:05'), 'DEAD', 0.1, 404)
+
+    restored = StoreRecord.from_dict(json.loads(json.dumps(record.to_dict())))
+    history = restored.history.to_list()
+    assert [entry['response_time'] for entry in history] == [1.234567, 0.1]
+    assert history[0]['timestamp'] == '2026-01-02T03:04:05.123456'
+    assert restored.to_export_row('https://a.myshopify.com').last_response_time == 0.1
+
+
+def test_unknown_response_time_and_status_code_stay_unknown():
+    ring = HistoryRing()
+    ring.append(1, 'DEAD')
+    assert ring.to_list()[0]['response_time'] is None
+    assert ring.last_result() == (None, None)
+
+
+def test_ring_keeps_the_newest_entries_in_order():
+    ring = HistoryRing()
+    for i in range(HISTORY_LIMIT):
+        assert ring.append(i, 'LIVE', float(i), 200) is None
+    dropped = ring.append(HISTORY_LIMIT, 'DEAD', 99.5, 404)
+
+    assert dropped[0] == 0
+    assert len(ring) == HISTORY_LIMIT
+    timestamps = [timestamp for timestamp, _ in ring.iter_raw()]
+    assert timestamps == list(range(1, HISTORY_LIMIT + 1))
+    assert ring.last_result() == (404, 99.5)
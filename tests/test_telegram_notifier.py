@@ -0,0 +1,174 @@
+"""Telegram message splitting, digest formatting and synchronous delivery"""
+import pytest
+
+from utils.telegram_notifier import (
+    TELEGRAM_MESSAGE_LIMIT, TelegramDeliveryError, TelegramNotifier, _DeliveryQueue, split_message
+)
+
+
+def test_short_message_is_one_chunk():
+    assert split_message("hello\nworld") == ["hello\nworld"]
+
+
+def test_message_of_exactly_the_limit_is_not_split():
+    text = "x" * TELEGRAM_MESSAGE_LIMIT
+    assert split_message(text) == [text]
+
+
+def test_one_character_over_the_limit_is_split():
+    text = "x" * (TELEGRAM_MESSAGE_LIMIT + 1)
+    chunks = split_message(text)
+    assert [len(chunk) for chunk in chunks] == [TELEGRAM_MESSAGE_LIMIT, 1]
+    assert "".join(chunks) == text
+
+
+def test_split_happens_on_line_boundaries():
+    line = "• https://store.myshopify.com\n"
+    text = line * 500
+    chunks = split_message(text)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= TELEGRAM_MESSAGE_LIMIT for chunk in chunks)
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_lines_filling_a_chunk_exactly_stay_together():
+    line = "a" * 2047 + "\n"  # two lines are exactly 4096 characters
+    chunks = split_message(line * 4)
+    assert chunks == [line * 2, line * 2]
+
+
+def test_overlong_line_is_hard_split_after_flushing_the_current_chunk():
+    text = "head\n" + "y" * (TELEGRAM_MESSAGE_LIMIT * 2 + 10) + "\ntail\n"
+    chunks = split_message(text)
+
+    assert chunks[0] == "head\n"
+    assert chunks[1] == "y" * TELEGRAM_MESSAGE_LIMIT
+    assert chunks[2] == "y" * TELEGRAM_MESSAGE_LIMIT
+    assert all(len(chunk) <= TELEGRAM_MESSAGE_LIMIT for chunk in chunks)
+    assert "".join(chunks) == text
+
+
+def test_custom_limit():
+    assert split_message("ab\ncd\nef\n", limit=6) == ["ab\ncd\n", "ef\n"]
+
+
+def test_digest_groups_changes_and_lists_each_store_once():
+    changes = [
+        {'url': 'https://a', 'from_status': 'LIVE', 'to_status': 'DEAD', 'changed_at': 't1'},
+        {'url': 'https://b', 'from_status': 'DEAD', 'to_status': 'LIVE', 'changed_at': 't2'},
+        {'url': 'https://c', 'from_status': 'LIVE', 'to_status': 'UNPAID', 'changed_at': 't3'},
+    ]
+    entries = TelegramNotifier.digest_entries(changes, ['https://a', 'https://d'])
+
+    assert [(entry[0], entry[1]) for entry in entries] == [
+        ('dead', 'https://a'), ('dead', 'https://d'), ('recovered', 'https://b'), ('unpaid', 'https://c')]
+
+
+@pytest.fixture
+def notifier(monkeypatch):
+    """Enabled notifier whose Bot API calls are recorded instead of sent"""
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'test-token')
+    monkeypatch.setenv('TELEGRAM_CHAT_ID', '12345')
+    notifier = TelegramNotifier(api_base='http://telegram.invalid')
+    notifier.calls = []
+    notifier.accept = True
+
+    def post(method, data, files=None, retry=True):
+        notifier.calls.append((method, data, retry))
+        return notifier.accept
+
+    monkeypatch.setattr(notifier.delivery, '_post', post)
+    return notifier
+
+
+def change(url, from_status, to_status):
+    return {'url': url, 'from_status': from_status, 'to_status': to_status, 'changed_at': 't'}
+
+
+def test_repeated_changes_are_merged_before_sending(notifier):
+    notifier.deliver_status_changes([
+        change('https://a', 'LIVE', 'DEAD'),
+        change('https://a', 'DEAD', 'UNPAID'),
+        change('https://b', 'LIVE', 'DEAD'),
+        change('https://b', 'DEAD', 'LIVE'),
+    ])
+
+    (method, data, retry), = notifier.calls
+    assert method == 'sendMessage'
+    assert retry is False
+    assert 'https://a' in data['text']
+    assert 'https://b' not in data['text']
+
+
+def test_changes_that_cancel_out_send_nothing(notifier):
+    notifier.deliver_status_changes([change('https://a', 'LIVE', 'DEAD'), change('https://a', 'DEAD', 'LIVE')])
+    assert notifier.calls == []
+
+
+def test_rejected_delivery_raises(notifier):
+    notifier.accept = False
+    with pytest.raises(TelegramDeliveryError):
+        notifier.deliver_status_changes([change('https://a', 'LIVE', 'DEAD')])
+
+
+def test_large_batch_is_sent_as_one_document(notifier):
+    changes = [change(f"https://s{i}", 'LIVE', 'DEAD') for i in range(TelegramNotifier.INLINE_MAX + 1)]
+    notifier.deliver_status_changes(changes)
+
+    assert [method for method, _, _ in notifier.calls] == ['sendDocument']
+
+
+def test_disabled_notifier_raises(monkeypatch):
+    monkeypatch.delenv('TELEGRAM_BOT_TOKEN', raising=False)
+    monkeypatch.delenv('TELEGRAM_CHAT_ID', raising=False)
+    with pytest.raises(TelegramDeliveryError):
+        TelegramNotifier().deliver_status_changes([change('https://a', 'LIVE', 'DEAD')])
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.text = str(self.body)
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """Answers Bot API posts with the queued responses, then 200"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        return self.responses.pop(0) if self.responses else FakeResponse(200)
+
+
+@pytest.fixture
+def delivery():
+    delivery = _DeliveryQueue('http://telegram.invalid', 'test-token', '12345')
+    delivery.min_interval = 0
+    delivery.max_retries = 3
+    return delivery
+
+
+def test_server_errors_are_not_retried_without_retry(delivery):
+    delivery.session = FakeSession(FakeResponse(502))
+    assert delivery.send("hello", retry=False) is False
+    assert delivery.session.posts == 1
+
+
+def test_rate_limit_is_waited_out_without_retry(delivery):
+    delivery.session = FakeSession(FakeResponse(429, {'parameters': {'retry_after': 0.01}}))
+    assert delivery.send("hello", retry=False) is True
+    assert delivery.session.posts == 2
+
+
+def test_send_changes_reports_failure(delivery):
+    delivery.session = FakeSession(FakeResponse(400))
+    assert delivery._send_changes([change('https://a', 'LIVE', 'DEAD')], []) is False
@@ -0,0 +1,97 @@
+import os
+import time
+from contextlib import nullcontext
+from typing import Callable, List, Optional
+from utils.link_checker import ShopifyChecker
+from utils.profiling import RunProfiler
+from utils.run_metrics import RunMetrics
+from utils.structured_log import get_logger
+
+# How often a running check pass pushes new status changes to the notification sinks
+NOTIFY_POLL_SECONDS = float(os.getenv('NOTIFY_POLL_SECONDS', '60'))
+
+pass_log = get_logger('shopify.pass')
+# One line per checked store only at LOG_LEVEL=DEBUG, sampled (LOG_SAMPLE_RATE)
+store_log = pass_log.sampled()
+
+
+def run_check_pass(data_manager, statuses: Optional[List[str]] = None, kind: str = 'pass',
+                   notifications=None, should_stop: Optional[Callable[[], bool]] = None,
+                   profile_mode: Optional[str] = None, profile_checks: Optional[int] = None) -> RunMetrics:
+    """
+    Check every store (or those with the given statuses) outside the UI:
+    DEAD results are rechecked once, and when a notification dispatcher is
+    given, status changes are pushed every NOTIFY_POLL_SECONDS. Progress
+    and the summary go to the run log and check_runs.
+
+    profile_mode ('cprofile' or 'sample', default PROFILE_MODE) profiles the
+    first profile_checks checks (default PROFILE_CHECKS, 0 = all of them),
+    see RunProfiler. Returns the finished run.
+    """
+    checker = ShopifyChecker()
+    if profile_mode is None:
+        profile_mode = os.getenv('PROFILE_MODE', '').strip().lower()
+    if profile_checks is None:
+        profile_checks = int(os.getenv('PROFILE_CHECKS', '0'))
+
+    # Stream stores instead of loading the whole table
+    if statuses:
+        counts = data_manager.get_status_counts()
+        total_urls = sum(counts.get(status, 0) for status in statuses)
+    else:
+        total_urls = data_manager.get_total_count()
+
+    # Per-store lines are sampled debug output; progress and the run summary come from RunMetrics
+    with RunMetrics(kind, total_urls, data_manager) as metrics:
+        profiler = None
+        if profile_mode and profile_mode != 'off':
+            profiler = RunProfiler(metrics.id, kind, profile_mode, profile_checks)
+            profiler.instrument(checker, 'check_store_status', '_analyze_response')
+            profiler.instrument(data_manager, 'update_store_status')
+
+        stopped = False
+        try:
+            for store in data_manager.iter_stores(statuses):
+                if should_stop and should_stop():
+                    pass_log.info('pass_stopped', kind=kind, checked=metrics.checked)
+                    stopped = True
+                    break
+                url = store.url
+                with profiler.check() if profiler else nullcontext():
+                    status, timezone_checked = checker.check_store_status(url)
+                    metrics.add_timings(checker.last_timings)
+                    first_status = status
+
+                    # If DEAD, do second check
+                    if status == "DEAD":
+                        with metrics.stage('delay'):
+                            time.sleep(1)
+                        status, timezone_checked = checker.check_store_status(url)
+                        metrics.add_timings(checker.last_timings)
+
+                    with metrics.stage('db_write'):
+                        data_manager.update_store_status(url, status, timezone_checked,
+                                                         checker.last_response_time, checker.last_status_code)
+                    if notifications:
+                        with metrics.stage('notify'):
+                            notifications.notify_new_events(data_manager, min_interval=NOTIFY_POLL_SECONDS)
+                metrics.record(status)
+                store_log.debug('store_checked', url=url, status=status, first_status=first_status,
+                                timezone=timezone_checked)
+                metrics.maybe_save()
+        finally:
+            if profiler:
+                metrics.profile = profiler.finish()
+
+        with metrics.stage('db_write'):
+            data_manager.flush()
+
+        # Queue every transition recorded since the last notification
+        if notifications:
+            with metrics.stage('notify'):
+                queued = notifications.notify_new_events(data_manager)
+            pass_log.info('notifications_queued', count=queued)
+
+        if stopped:
+            metrics.finish('stopped')
+    return metrics
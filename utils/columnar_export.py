@@ -0,0 +1,190 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+import pytz
+from utils.storage import EXPORT_STORE_COLUMNS, EXPORT_HISTORY_COLUMNS
+from utils.structured_log import get_logger
+
+log = get_logger('shopify.export')
+
+
+class ColumnarExporter:
+    """
+    Export stores and check_history as Parquet or Arrow IPC files for offline
+    analysis.
+
+    Rows are streamed from the storage backend in chunks (server-side cursors
+    on PostgreSQL) and written one record batch per chunk, so memory stays
+    bounded. Incremental exports continue from a watermark persisted in
+    <export_dir>/.columnar_state.json: the last exported history id, and the
+    last exported stores.updated_at. Each run stops at a point no later
+    commit can land behind: history at the backend's committed high-water
+    id, stores at rows older than COLUMNAR_SETTLE_SECONDS (default 60). Files
+    are written under a temporary name and renamed when complete. Requires
+    pyarrow (the 'columnar' extra).
+    """
+
+    FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+    def __init__(self, export_dir: str = "exports/columnar"):
+        self.export_dir = export_dir
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.state_file = os.path.join(self.export_dir, ".columnar_state.json")
+        self.settle_seconds = float(os.getenv('COLUMNAR_SETTLE_SECONDS', '60'))
+
+    @staticmethod
+    def _require_pyarrow():
+        """Import pyarrow lazily - it is only needed for columnar exports"""
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            import pyarrow.ipc
+            return pyarrow
+        except ImportError as e:
+            raise ImportError(
+                "Columnar export requires pyarrow. Install it with: pip install pyarrow "
+                "(or pip install '.[columnar]')"
+            ) from e
+
+    def _load_state(self) -> Dict[str, Any]:
+        """Read export watermarks"""
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        """Persist export watermarks atomically"""
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    @staticmethod
+    def _to_utc(value) -> Optional[datetime]:
+        """Normalize datetimes / ISO strings from any backend to aware UTC"""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if value.tzinfo is None:
+            value = pytz.UTC.localize(value)
+        return value.astimezone(pytz.UTC)
+
+    def _schemas(self, pa):
+        """Typed Arrow schemas for both tables"""
+        timestamp = pa.timestamp('us', tz='UTC')
+        status = pa.dictionary(pa.int16(), pa.string())
+        stores = pa.schema([
+            ('id', pa.int64()),
+            ('url', pa.string()),
+            ('status', status),
+            ('first_check', timestamp),
+            ('last_check', timestamp),
+            ('first_dead_date', timestamp),
+            ('check_count', pa.int32()),
+            ('timezone_checked', status),
+            ('created_at', timestamp),
+            ('updated_at', timestamp),
+        ])
+        history = pa.schema([
+            ('id', pa.int64()),
+            ('store_id', pa.int64()),
+            ('url', pa.string()),
+            ('status', status),
+            ('checked_at', timestamp),
+            ('response_time', pa.float64()),
+            ('status_code', pa.int16()),
+        ])
+        return stores, history
+
+    def _open_writer(self, pa, path: str, schema, fmt: str):
+        """Create a Parquet or Arrow IPC file writer"""
+        if fmt == 'parquet':
+            return pa.parquet.ParquetWriter(path, schema, compression='zstd')
+        return pa.ipc.new_file(path, schema)
+
+    def _write_chunks(self, pa, chunks, columns, schema, timestamp_columns, fmt: str, path: str):
+        """
+        Write row chunks as record batches to a temporary file, renamed to
+        path once complete (a failed export leaves no partial file).
+        Returns (rows written, last row) - last row drives the watermark.
+        """
+        tmp_path = f"{path}.tmp"
+        writer = None
+        rows_written = 0
+        last_row = None
+        try:
+            for rows in chunks:
+                data = {name: [] for name in columns}
+                for row in rows:
+                    for name, value in zip(columns, row):
+                        if name in timestamp_columns:
+                            value = self._to_utc(value)
+                        data[name].append(value)
+                batch = pa.RecordBatch.from_pydict(data, schema=schema)
+                if writer is None:
+                    writer = self._open_writer(pa, tmp_path, schema, fmt)
+                writer.write_batch(batch)
+                rows_written += len(rows)
+                last_row = rows[-1]
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(tmp_path, path)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return rows_written, last_row
+
+    def export(self, data_manager, table: str, fmt: str = 'parquet', incremental: bool = True,
+               chunk_size: int = 50000) -> Optional[str]:
+        """
+        Export 'stores' or 'check_history'.
+        With incremental=True only rows after the saved watermark are exported
+        and the watermark advances. Returns the file path, or None when there
+        were no new rows.
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown columnar format '{fmt}'. Use parquet or arrow.")
+        if table not in ('stores', 'check_history'):
+            raise ValueError(f"Unknown table '{table}'. Use stores or check_history.")
+
+        pa = self._require_pyarrow()
+        stores_schema, history_schema = self._schemas(pa)
+        state = self._load_state() if incremental else {}
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = "_incremental" if incremental and state.get(table) else ""
+        path = os.path.join(self.export_dir, f"{table}_{timestamp}{suffix}.{self.FORMATS[fmt]}")
+
+        if table == 'stores':
+            since = state.get('stores')
+            settled = datetime.now(pytz.UTC) - timedelta(seconds=self.settle_seconds)
+            chunks = data_manager.iter_store_chunks(
+                updated_since=self._to_utc(since) if since else None, chunk_size=chunk_size,
+                updated_before=settled if incremental else None)
+            rows, last_row = self._write_chunks(
+                pa, chunks, EXPORT_STORE_COLUMNS, stores_schema,
+                {'first_check', 'last_check', 'first_dead_date', 'created_at', 'updated_at'}, fmt, path)
+            if last_row:
+                state['stores'] = self._to_utc(last_row[EXPORT_STORE_COLUMNS.index('updated_at')]).isoformat()
+        else:
+            until_id = data_manager.get_history_high_water() if incremental else None
+            chunks = data_manager.iter_history_chunks(
+                after_id=state.get('check_history', 0), chunk_size=chunk_size, until_id=until_id)
+            rows, last_row = self._write_chunks(
+                pa, chunks, EXPORT_HISTORY_COLUMNS, history_schema, {'checked_at'}, fmt, path)
+            if last_row:
+                state['check_history'] = last_row[0]
+
+        if not rows:
+            return None
+
+        if incremental:
+            self._save_state(state)
+        log.info('columnar_exported', table=table, rows=rows, path=path, incremental=incremental)
+        return path
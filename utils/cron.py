@@ -0,0 +1,132 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Set
+import pytz
+
+# Timezone cron expressions are evaluated in (the app reports in Pacific time)
+SCHEDULER_TIMEZONE = os.getenv('SCHEDULER_TIMEZONE', 'America/Los_Angeles')
+
+_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+_INTERVAL = re.compile(r'^(?:every\s+)?(\d+)\s*(m|min|h|d)?$')
+_UNIT_MINUTES = {'m': 1, 'min': 1, 'h': 60, 'd': 1440}
+
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month
+    day-of-week (0 or 7 = Sunday). Fields accept *, lists (1,15), ranges
+    (1-5) and steps (*/30, 8-18/2); @hourly, @daily, @weekly and @monthly
+    are shorthands. As in cron, when both day fields are restricted a day
+    matching either one runs. Times are evaluated in the given timezone.
+    """
+
+    # (min, max) of each field
+    FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str, timezone: str = SCHEDULER_TIMEZONE):
+        self.expression = expression.strip()
+        self.timezone = pytz.timezone(timezone)
+        fields = _ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: '{expression}'")
+
+        parsed = [self._parse_field(text, low, high) for text, (low, high) in zip(fields, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse_field(text: str, low: int, high: int) -> Set[int]:
+        """Values matched by one field"""
+        values: Set[int] = set()
+        for part in text.split(','):
+            step = 1
+            if '/' in part:
+                part, step_text = part.split('/', 1)
+                step = int(step_text)
+                if step < 1:
+                    raise ValueError(f"Invalid step in cron field '{text}'")
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field '{text}' out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        """Day-of-month / day-of-week match with cron's OR rule"""
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return in_weekdays
+        if self._any_weekday:
+            return in_days
+        return in_days or in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """First matching minute strictly after moment (aware), as aware UTC"""
+        local = moment.astimezone(self.timezone).replace(tzinfo=None, second=0, microsecond=0)
+        candidate = local + timedelta(minutes=1)
+        limit = local.year + 5
+        # Skip whole months / days / hours that can't match instead of testing every minute
+        while candidate.year <= limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return self.timezone.localize(candidate).astimezone(pytz.UTC)
+        raise ValueError(f"Cron expression never matches: '{self.expression}'")
+
+    def __str__(self) -> str:
+        return self.expression
+
+
+class IntervalSchedule:
+    """Fixed interval between runs"""
+
+    def __init__(self, minutes: int):
+        if minutes < 1:
+            raise ValueError("Interval must be at least 1 minute")
+        self.minutes = minutes
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment plus the interval, as aware UTC"""
+        return (moment + timedelta(minutes=self.minutes)).astimezone(pytz.UTC)
+
+    def __str__(self) -> str:
+        return f"every {self.minutes}m"
+
+
+def parse_schedule(text: Optional[str]) -> Optional[object]:
+    """
+    Parse a job schedule: an interval ("every 30m", "2h", "1d", or plain
+    minutes), a cron expression ("0 6 * * *", "@daily"), or "off" / empty
+    for a disabled job (returns None).
+    """
+    text = (text or '').strip()
+    if not text or text.lower() in ('off', 'none', 'disabled'):
+        return None
+    match = _INTERVAL.match(text.lower())
+    if match:
+        return IntervalSchedule(int(match.group(1)) * _UNIT_MINUTES[match.group(2) or 'm'])
+    return CronSchedule(text)
+
@@ -1,193 +1,796 @@
+import bisect
 import json
 import os
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from utils.storage import StorageBackend, LeaderLock, CHECK_RUN_COLUMNS
+from utils.store_record import (
+    StoreRow, ExportRow, DeltaRow, StoreRecord, status_id, status_name, to_epoch_us, from_epoch_us, epoch_us_date
+)
+from utils.structured_log import get_logger
 
-class DataManager:
-    """Handle data persistence and management for store checking"""
+log = get_logger('shopify.storage')
+# Journal / event append failures repeat on every check until the disk recovers
+write_log = log.sampled(rate=1.0)
+
+# Serializes read-modify-write of scheduler state, cursor and check run files within the process
+_scheduler_file_lock = threading.Lock()
+
+# One DataManager per data file and process, see get_data_manager()
+_managers: Dict[str, 'DataManager'] = {}
+_managers_lock = threading.Lock()
+
+
+def get_data_manager(data_file: str) -> 'DataManager':
+    """
+    Get (or load) the process-wide DataManager for a data file. Instances
+    keep the stores, indexes and event ids in memory, so two of them on one
+    file would overwrite each other's journal and events.
+    """
+    path = os.path.abspath(data_file)
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = DataManager(data_file)
+            _managers[path] = manager
+        return manager
+
+
+class DataManager(StorageBackend):
+    """
+    Handle data persistence and management for store checking.
+
+    Storage is a JSON snapshot (data_file) plus an append-only JSON Lines
+    journal (data_file + '.journal'). Each change appends one line; the
+    journal is folded into a fresh snapshot (written to a temp file and
+    atomically renamed) once it grows past the number of stores, keeping
+    write cost amortized O(1) per change. Journal records carry absolute
+    values, so replaying a journal over a snapshot that already contains it
+    (crash between rename and truncate) is harmless.
+
+    Secondary indexes (status -> URLs, sorted dead dates, per-day timeline
+    counts) are maintained on every write so dashboard reads cost
+    O(result) instead of a scan over every store and history entry.
+
+    In memory each store is a StoreRecord (slots, epoch-int timestamps,
+    ring-buffer history); dicts are only built for the public API results.
+
+    Store change events (added / status changed / removed) are appended to
+    data_file + '.events' with increasing ids, and consumer watermarks are
+    kept in data_file + '.cursors.json'. Each snapshot also compacts the
+    events file down to the events after the oldest watermark.
+
+    Use get_data_manager() to share one instance per file within a process;
+    its methods are thread-safe. Only one process may write a data file: the
+    first write takes a lock file (data_file + '.writer.lock'), and writes
+    from other processes raise RuntimeError - use the SQLite or PostgreSQL
+    backend when several processes update stores.
+    """
     
     def __init__(self, data_file: str = "shopify_data.json"):
         self.data_file = data_file
-        self.data: Dict[str, Dict[str, Any]] = {}
+        self.journal_file = f"{data_file}.journal"
+        self.events_file = f"{data_file}.events"
+        self.cursors_file = f"{data_file}.cursors.json"
+        self.scheduler_file = f"{data_file}.scheduler.json"
+        self.runs_file = f"{data_file}.runs.json"
+        self.max_runs = int(os.getenv('JSON_MAX_CHECK_RUNS', '200'))
+        self.data: Dict[str, StoreRecord] = {}
+        self.compact_min_entries = int(os.getenv('JSON_COMPACT_EVERY', '5000'))
+        self._journal = None
+        self._journal_entries = 0
+        self._urls_by_status: Dict[str, set] = {}
+        self._dead_index: List[Tuple[int, str]] = []  # sorted (first_dead_date, url)
+        self._timeline: Dict[str, Dict[str, int]] = {}  # date -> status -> history entries
+        # Guards self.data, the indexes, the journal and event ids
+        self._lock = threading.RLock()
+        self._writer: Optional[LeaderLock] = None
         self.load_from_file()
+        self._last_event_id = self._recover_events()
+        # (event id, byte offset just past it) - lets readers skip already-consumed events;
+        # both guarded by _lock, the generation is bumped when the events file is compacted
+        self._event_seek: Tuple[int, int] = (0, 0)
+        self._events_generation = 0
+        # Data version: starts at the files' last modification, bumped on every change
+        self._changed_at = max(
+            (os.stat(path).st_mtime_ns for path in (self.data_file, self.journal_file) if os.path.exists(path)),
+            default=0
+        )
+
+    def _claim_writer(self, required: bool = True) -> bool:
+        """Take (once) the cross-process write lock on the data file"""
+        if self._writer is None:
+            lock = LeaderLock(self._lock_path('writer'))
+            if not lock.acquire():
+                if required:
+                    raise RuntimeError(
+                        f"{self.data_file} is being written by another process; "
+                        "use the sqlite or postgres backend for multi-process setups")
+                return False
+            self._writer = lock
+        return True
 
     def load_urls(self, urls: List[str]) -> None:
         """Load new URLs into the system"""
-        for url in urls:
-            url = url.strip()
-            if url and url not in self.data:
-                self.data[url] = {
-                    'status': 'UNCHECKED',
-                    'first_check': None,
-                    'last_check': None,
-                    'first_dead_date': None,
-                    'check_count': 0,
-                    'check_history': []
-                }
-        self.save_to_file()
+        with self._lock:
+            self._claim_writer()
+            added = []
+            for url in urls:
+                url = url.strip()
+                if url and url not in self.data:
+                    self._add_store(url)
+                    added.append(url)
+            if added:
+                self._append_journal({'op': 'add', 'urls': added})
+                self._log_events([('added', url, None, 'UNCHECKED') for url in added])
 
-    def update_store_status(self, url: str, status: str) -> None:
-        """Update store status with timestamp and history tracking"""
-        current_time = datetime.now().isoformat()
-        
-        if url not in self.data:
-            self.data[url] = {
-                'status': status,
-                'first_check': current_time,
-                'last_check': current_time,
-                'first_dead_date': None,
-                'check_count': 1,
-                'check_history': []
-            }
+    def _add_store(self, url: str) -> None:
+        """Insert an UNCHECKED store record"""
+        self.data[url] = StoreRecord()
+        self._index_store(url, self.data[url])
+
+    def _rebuild_indexes(self) -> None:
+        """Rebuild all secondary indexes from self.data"""
+        self._urls_by_status = {}
+        self._dead_index = []
+        self._timeline = {}
+        for url, record in self.data.items():
+            self._urls_by_status.setdefault(record.status, set()).add(url)
+            if record.status == 'DEAD' and record.first_dead_date:
+                self._dead_index.append((record.first_dead_date, url))
+            if record.history:
+                for timestamp, code in record.history.iter_raw():
+                    self._count_history(timestamp, code, 1)
+        self._dead_index.sort()
+
+    def _index_store(self, url: str, record: StoreRecord) -> None:
+        """Add a store's status and dead date to the indexes"""
+        self._urls_by_status.setdefault(record.status, set()).add(url)
+        if record.status == 'DEAD' and record.first_dead_date:
+            bisect.insort(self._dead_index, (record.first_dead_date, url))
+
+    def _unindex_store(self, url: str, record: StoreRecord) -> None:
+        """Remove a store's status and dead date from the indexes"""
+        urls = self._urls_by_status.get(record.status)
+        if urls is not None:
+            urls.discard(url)
+            if not urls:
+                del self._urls_by_status[record.status]
+        if record.status == 'DEAD' and record.first_dead_date:
+            key = (record.first_dead_date, url)
+            i = bisect.bisect_left(self._dead_index, key)
+            if i < len(self._dead_index) and self._dead_index[i] == key:
+                del self._dead_index[i]
+
+    def _count_history(self, timestamp: int, code: int, delta: int) -> None:
+        """Add (or remove, with delta=-1) a history entry from the timeline counters"""
+        date = epoch_us_date(timestamp)
+        status = status_name(code)
+        day = self._timeline.setdefault(date, {})
+        count = day.get(status, 0) + delta
+        if count > 0:
+            day[status] = count
         else:
-            old_status = self.data[url].get('status', 'UNCHECKED')
-            self.data[url]['status'] = status
-            self.data[url]['last_check'] = current_time
-            self.data[url]['check_count'] += 1
+            day.pop(status, None)
+            if not day:
+                del self._timeline[date]
+
+    def _append_history(self, record: StoreRecord, timestamp: int, status: str,
+                        response_time: float = None, status_code: int = None) -> None:
+        """Append a history entry; the ring keeps only the last 50"""
+        dropped = record.add_history(timestamp, status, response_time, status_code)
+        self._count_history(timestamp, status_id(status), 1)
+        if dropped:
+            self._count_history(dropped[0], dropped[1], -1)
+
+    def _drop_store(self, url: str) -> None:
+        """Remove a store and its index entries"""
+        record = self.data.pop(url)
+        self._unindex_store(url, record)
+        if record.history:
+            for timestamp, code in record.history.iter_raw():
+                self._count_history(timestamp, code, -1)
+
+    def update_store_status(self, url: str, status: str, timezone_checked: str = None, response_time: float = None, status_code: int = None) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Update store status with timestamp and history tracking.
+        Returns (None, previous_status) - JSON stores have no numeric ids.
+        """
+        with self._lock:
+            self._claim_writer()
+            current_time = datetime.now().isoformat()
+            now = to_epoch_us(current_time)
+            old_status = None
+        
+            record = self.data.get(url)
+            if record is None:
+                record = StoreRecord(status)
+                record.first_check = now
+                record.first_dead_date = now if status == 'DEAD' else None
+                self.data[url] = record
+            else:
+                self._unindex_store(url, record)
+                old_status = record.status
+                record.status = sys.intern(status)
             
-            # Set first check time if not set
-            if not self.data[url].get('first_check'):
-                self.data[url]['first_check'] = current_time
+                # Set first check time if not set
+                if not record.first_check:
+                    record.first_check = now
             
-            # Track first dead date
-            if status == 'DEAD' and old_status != 'DEAD':
-                self.data[url]['first_dead_date'] = current_time
-            elif status != 'DEAD' and old_status == 'DEAD':
-                # Store came back to life, clear dead date
-                self.data[url]['first_dead_date'] = None
+                # Track first dead date
+                if status == 'DEAD' and old_status != 'DEAD':
+                    record.first_dead_date = now
+                elif status != 'DEAD' and old_status == 'DEAD':
+                    # Store came back to life, clear dead date
+                    record.first_dead_date = None
         
-        # Add to history
-        self.data[url]['check_history'].append({
-            'timestamp': current_time,
-            'status': status
-        })
+            record.last_check = now
+            record.check_count += 1
+            record.timezone_checked = sys.intern(timezone_checked) if timezone_checked else None
+            self._index_store(url, record)
         
-        # Keep only last 50 history entries to prevent file bloat
-        if len(self.data[url]['check_history']) > 50:
-            self.data[url]['check_history'] = self.data[url]['check_history'][-50:]
+            # Add to history
+            self._append_history(record, now, status, response_time, status_code)
         
-        self.save_to_file()
+            self._append_journal({
+                'op': 'put',
+                'url': url,
+                'store': record.fields_dict(),
+                'history': {
+                    'timestamp': current_time,
+                    'status': status,
+                    'response_time': response_time,
+                    'status_code': status_code
+                }
+            })
+            if old_status is None:
+                self._log_events([('added', url, None, status)])
+            elif old_status != status:
+                self._log_events([('changed', url, old_status, status)])
+            return None, old_status
 
     def get_data(self) -> Dict[str, Dict[str, Any]]:
         """Get all data"""
-        return self.data
+        with self._lock:
+            return {url: record.to_dict() for url, record in self.data.items()}
+
+    def _urls_with_status(self, statuses: List[str]) -> List[str]:
+        """Sorted URLs having any of the statuses, from the status index"""
+        with self._lock:
+            urls = []
+            for status in set(statuses):
+                urls.extend(self._urls_by_status.get(status, ()))
+            urls.sort()
+            return urls
+
+    def _iter_rows(self, statuses: Optional[List[str]], batch_size: int, to_row: str) -> Iterator[tuple]:
+        """
+        Rows of the stores ordered by URL, built batch by batch under the lock
+        (stores removed since the URL list was taken are skipped)
+        """
+        with self._lock:
+            urls = self._urls_with_status(statuses) if statuses else sorted(self.data)
+        for start in range(0, len(urls), batch_size):
+            with self._lock:
+                rows = [getattr(self.data[url], to_row)(url)
+                        for url in urls[start:start + batch_size] if url in self.data]
+            yield from rows
+
+    def iter_stores(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[StoreRow]:
+        """Iterate stores ordered by URL as lightweight rows"""
+        return self._iter_rows(statuses, batch_size, 'to_row')
+
+    def iter_export_rows(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[ExportRow]:
+        """Iterate stores ordered by URL with their latest check result"""
+        return self._iter_rows(statuses, batch_size, 'to_export_row')
 
     def get_stores_by_status(self, status: str) -> List[str]:
         """Get list of URLs with specific status"""
-        return [url for url, data in self.data.items() if data.get('status') == status]
+        with self._lock:
+            return sorted(self._urls_by_status.get(status, ()))
 
     def get_status_counts(self) -> Dict[str, int]:
         """Get count of stores by status"""
-        counts = {}
-        for url, data in self.data.items():
-            status = data.get('status', 'UNCHECKED')
-            counts[status] = counts.get(status, 0) + 1
-        return counts
+        with self._lock:
+            return {status: len(urls) for status, urls in self._urls_by_status.items()}
 
     def get_total_count(self) -> int:
         """Get total number of stores"""
         return len(self.data)
 
-    def get_live_count(self) -> int:
-        """Get number of LIVE stores"""
-        return len(self.get_stores_by_status('LIVE'))
-
-    def get_dead_count(self) -> int:
-        """Get number of DEAD stores"""
-        return len(self.get_stores_by_status('DEAD'))
-
-    def get_unpaid_count(self) -> int:
-        """Get number of UNPAID stores"""
-        return len(self.get_stores_by_status('UNPAID'))
+    def get_data_version(self) -> str:
+        """Store count plus the time of the last journaled change"""
+        return f"{len(self.data)}:{self._changed_at}"
 
     def get_filtered_data(self, status_filters: List[str], search_term: str = "") -> Dict[str, Dict[str, Any]]:
         """Get filtered data based on status and search term"""
-        filtered = {}
+        with self._lock:
+            filtered = {}
+            search_term = search_term.lower() if search_term else ""
         
-        for url, data in self.data.items():
-            # Status filter
-            if data.get('status', 'UNCHECKED') not in status_filters:
-                continue
-            
-            # Search filter
-            if search_term and search_term.lower() not in url.lower():
-                continue
+            for url in self._urls_with_status(status_filters):
+                # Search filter
+                if search_term and search_term not in url.lower():
+                    continue
             
-            filtered[url] = data
+                filtered[url] = self.data[url].to_dict()
         
-        return filtered
+            return filtered
 
-    def get_timeline_data(self) -> List[Dict[str, Any]]:
-        """Get timeline data for charts"""
-        timeline = {}
+    def get_timeline_data(self, days: int = None) -> List[Dict[str, Any]]:
+        """Get timeline data for charts with optional date filtering"""
+        with self._lock:
+            cutoff = (datetime.now() - timedelta(days=days)).date().isoformat() if days else None
         
-        for url, data in self.data.items():
-            for history_entry in data.get('check_history', []):
-                date = history_entry['timestamp'][:10]  # Extract date part
-                status = history_entry['status']
-                
-                if date not in timeline:
-                    timeline[date] = {}
-                
-                timeline[date][status] = timeline[date].get(status, 0) + 1
-        
-        # Convert to list format for charts
-        timeline_list = []
-        for date, status_counts in sorted(timeline.items()):
-            for status, count in status_counts.items():
-                timeline_list.append({
-                    'date': date,
-                    'status': status,
-                    'count': count
-                })
+            # Convert the maintained per-day counters to list format for charts
+            timeline_list = []
+            for date, status_counts in sorted(self._timeline.items()):
+                if cutoff and date < cutoff:
+                    continue
+                for status, count in sorted(status_counts.items()):
+                    timeline_list.append({
+                        'date': date,
+                        'status': status,
+                        'count': count
+                    })
         
-        return timeline_list
+            return timeline_list
 
     def get_dead_stores_with_dates(self) -> Dict[str, str]:
         """Get DEAD stores with their first dead dates"""
-        dead_stores = {}
-        for url, data in self.data.items():
-            if data.get('status') == 'DEAD' and data.get('first_dead_date'):
-                dead_date = data['first_dead_date'][:10]  # Extract date part
-                dead_stores[url] = dead_date
-        return dead_stores
+        with self._lock:
+            # Newest first, like the database backends
+            return {url: epoch_us_date(dead_date) for dead_date, url in reversed(self._dead_index)}
 
-    def save_to_file(self) -> bool:
-        """Save data to JSON file"""
+    def _iter_dead_dates(self) -> Iterator[Tuple[str, List[str]]]:
+        """(dead_date, urls) groups from the dead index, newest date first"""
+        group_date = None
+        group: List[str] = []
+        for dead_date, url in reversed(self._dead_index):
+            date = epoch_us_date(dead_date)
+            if date != group_date:
+                if group:
+                    yield group_date, group
+                group_date, group = date, []
+            group.append(url)
+        if group:
+            yield group_date, group
+
+    def iter_dead_stores(self, batch_size: int = 2000) -> Iterator[Tuple[str, str, int]]:
+        """Stream DEAD stores as (dead_date, url, check_count), newest date first"""
+        with self._lock:
+            groups = list(self._iter_dead_dates())
+        for date, urls in groups:
+            with self._lock:
+                rows = [(date, url, self.data[url].check_count or 0) for url in sorted(urls) if url in self.data]
+            yield from rows
+
+    def get_dead_date_counts(self) -> Dict[str, int]:
+        """Number of DEAD stores per dead date, newest date first"""
+        with self._lock:
+            return {date: len(urls) for date, urls in self._iter_dead_dates()}
+
+    def _recover_events(self) -> int:
+        """Id of the last complete event; a torn trailing line from a crash is cut off"""
+        if not os.path.exists(self.events_file):
+            return 0
+        last_id = 0
+        good_size = 0
+        with open(self.events_file, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete line")
+                    last_id = json.loads(line)['id']
+                except (ValueError, KeyError):
+                    break
+                good_size += len(line)
+        if good_size < os.path.getsize(self.events_file) and self._claim_writer(required=False):
+            with open(self.events_file, 'r+b') as f:
+                f.truncate(good_size)
+        return last_id
+
+    def _log_events(self, events: List[Tuple[str, str, Optional[str], Optional[str]]]) -> None:
+        """Append (event, url, old_status, new_status) change events"""
+        if not events:
+            return
+        timestamp = datetime.now().isoformat()
+        lines = []
+        for event, url, old_status, new_status in events:
+            self._last_event_id += 1
+            lines.append(json.dumps({
+                'id': self._last_event_id,
+                'event': event,
+                'url': url,
+                'old_status': old_status,
+                'new_status': new_status,
+                'timestamp': timestamp
+            }, ensure_ascii=False, separators=(',', ':')) + '\n')
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-            return True
+            with open(self.events_file, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
         except Exception as e:
-            print(f"Error saving data: {e}")
-            return False
+            write_log.error('events_write_failed', path=self.events_file, error=str(e))
+
+    def _iter_events(self, after_id: int = 0, until_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Change events with after_id < id <= until_id, oldest first.
+        Reading resumes from the offset of the last event a previous call
+        consumed, so polling consumers pay for new events only. The saved
+        offset is checked against the event found there, since the events
+        file may have been compacted (by this or the writing process) since.
+        """
+        if not os.path.exists(self.events_file):
+            return
+        with self._lock:
+            if until_id is None:
+                until_id = self._last_event_id
+            seek_id, offset = self._event_seek
+            generation = self._events_generation
+        if seek_id > after_id:
+            seek_id, offset = 0, 0
+
+        consumed = None
+        try:
+            with open(self.events_file, 'rb') as f:
+                if offset:
+                    f.seek(offset)
+                    line = f.readline()
+                    try:
+                        resumable = json.loads(line)['id'] == seek_id + 1 if line else until_id <= seek_id
+                    except (ValueError, KeyError):
+                        resumable = False
+                    if not resumable:
+                        offset = 0
+                    f.seek(offset)
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        return
+                    if event['id'] > until_id:
+                        return
+                    offset += len(line)
+                    consumed = (event['id'], offset)
+                    if event['id'] > after_id:
+                        yield event
+        finally:
+            if consumed is not None:
+                with self._lock:
+                    if self._events_generation == generation and consumed[0] > self._event_seek[0]:
+                        self._event_seek = consumed
+
+    def _compact_events(self) -> None:
+        """
+        Rewrite the events file without the events every consumer has read
+        (ids up to the oldest sync cursor). The newest event is always kept
+        so ids carry on after a restart.
+        """
+        if not os.path.exists(self.events_file) or not self._last_event_id:
+            return
+        positions = []
+        if os.path.exists(self.cursors_file):
+            with open(self.cursors_file, 'r', encoding='utf-8') as f:
+                positions = list(json.load(f).values())
+        keep_from = min(min(positions, default=self._last_event_id) + 1, self._last_event_id)
+
+        with open(self.events_file, 'rb') as f:
+            first = f.readline()
+            try:
+                if json.loads(first)['id'] >= keep_from:
+                    return
+            except (ValueError, KeyError):
+                return
+            tmp_file = f"{self.events_file}.tmp"
+            with open(tmp_file, 'wb') as out:
+                f.seek(0)
+                for line in f:
+                    try:
+                        if json.loads(line)['id'] < keep_from:
+                            continue
+                    except (ValueError, KeyError):
+                        break
+                    out.write(line)
+                out.flush()
+                os.fsync(out.fileno())
+        os.replace(tmp_file, self.events_file)
+        self._event_seek = (0, 0)
+        self._events_generation += 1
+
+    def get_last_event_id(self) -> int:
+        """Id of the newest store change event"""
+        return self._last_event_id
+
+    def iter_store_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[DeltaRow]:
+        """Net change per store over events (after_id, until_id], ordered by URL"""
+        is_new: Dict[str, bool] = {}
+        for event in self._iter_events(after_id, until_id):
+            is_new.setdefault(event['url'], event['event'] == 'added')
+
+        for url in sorted(is_new):
+            with self._lock:
+                record = self.data.get(url)
+                row = record.to_export_row(url) if record is not None else None
+            if row is None:
+                if not is_new[url]:
+                    yield DeltaRow('removed', url, *([None] * (len(DeltaRow._fields) - 2)))
+            else:
+                yield DeltaRow('added' if is_new[url] else 'changed', *row)
+
+    def iter_status_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[Dict[str, Any]]:
+        """Status transitions from change events (after_id, until_id], oldest first"""
+        for event in self._iter_events(after_id, until_id):
+            if event['event'] == 'changed' and event['old_status'] != 'UNCHECKED':
+                yield {
+                    'id': event['id'],
+                    'url': event['url'],
+                    'from_status': event['old_status'],
+                    'to_status': event['new_status'],
+                    'changed_at': event['timestamp']
+                }
+
+    def get_sync_cursor(self, name: str) -> Optional[int]:
+        """Saved change-event watermark of a consumer, None if it never ran"""
+        if not os.path.exists(self.cursors_file):
+            return None
+        with open(self.cursors_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get(name)
+
+    def set_sync_cursor(self, name: str, position: int) -> None:
+        """Save a consumer's change-event watermark"""
+        with _scheduler_file_lock:
+            cursors = {}
+            if os.path.exists(self.cursors_file):
+                with open(self.cursors_file, 'r', encoding='utf-8') as f:
+                    cursors = json.load(f)
+            cursors[name] = position
+            tmp_file = f"{self.cursors_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cursors, f, indent=2)
+            os.replace(tmp_file, self.cursors_file)
+
+    def _load_scheduler_states(self) -> Dict[str, Dict[str, Any]]:
+        """All persisted scheduled job states"""
+        if not os.path.exists(self.scheduler_file):
+            return {}
+        with open(self.scheduler_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_scheduler_state(self, name: str) -> Dict[str, Any]:
+        """Persisted state of a scheduled job ({} if it never ran)"""
+        return self._load_scheduler_states().get(name, {})
+
+    def update_scheduler_state(self, name: str, changes: Dict[str, Any]) -> None:
+        """Merge changes into a scheduled job's persisted state"""
+        with _scheduler_file_lock:
+            states = self._load_scheduler_states()
+            states.setdefault(name, {}).update(changes)
+            tmp_file = f"{self.scheduler_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(states, f, indent=2)
+            os.replace(tmp_file, self.scheduler_file)
+
+    def _load_check_runs(self) -> List[Dict[str, Any]]:
+        """All kept check run summaries, oldest first"""
+        if not os.path.exists(self.runs_file):
+            return []
+        with open(self.runs_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_check_run(self, run: Dict[str, Any]) -> None:
+        """Insert or replace a check run summary, keeping the newest JSON_MAX_CHECK_RUNS"""
+        with _scheduler_file_lock:
+            runs = [existing for existing in self._load_check_runs() if existing['id'] != run['id']]
+            runs.append({column: run.get(column) for column in CHECK_RUN_COLUMNS})
+            runs.sort(key=lambda existing: existing['started_at'])
+            tmp_file = f"{self.runs_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(runs[-self.max_runs:], f, indent=2)
+            os.replace(tmp_file, self.runs_file)
+
+    def get_check_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent check run summaries, newest first"""
+        return self._load_check_runs()[::-1][:limit]
+
+    def _lock_path(self, name: str) -> str:
+        """Leader lock file next to the data file"""
+        return f"{self.data_file}.{name}.lock"
+
+    def _append_journal(self, entry: Dict[str, Any]) -> None:
+        """Append one change to the journal, compacting when it gets long"""
+        self._changed_at = time.time_ns()
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._journal.flush()
+            self._journal_entries += 1
+        except Exception as e:
+            write_log.error('journal_write_failed', path=self.journal_file, error=str(e))
+            return
+
+        if self._journal_entries > max(self.compact_min_entries, len(self.data)):
+            self.save_to_file()
+
+    def _apply_journal_entry(self, entry: Dict[str, Any]) -> None:
+        """Apply one journal record to self.data (idempotent)"""
+        op = entry.get('op')
+        if op == 'add':
+            for url in entry['urls']:
+                if url not in self.data:
+                    self._add_store(url)
+        elif op == 'put':
+            url = entry['url']
+            if url not in self.data:
+                self._add_store(url)
+            record = self.data[url]
+            self._unindex_store(url, record)
+            record.update_fields(entry['store'])
+            self._index_store(url, record)
+            history = entry['history']
+            timestamp = to_epoch_us(history['timestamp'])
+            last = record.history.last() if record.history else None
+            # History is appended in time order: anything not newer is already there
+            if last is None or timestamp > last[0]:
+                self._append_history(record, timestamp, history['status'],
+                                     history.get('response_time'), history.get('status_code'))
+        elif op == 'remove':
+            for url in entry['urls']:
+                if url in self.data:
+                    self._drop_store(url)
+        elif op == 'clear':
+            self.data = {}
+            self._rebuild_indexes()
+
+    def save_to_file(self) -> bool:
+        """Write a compact snapshot atomically and truncate the journal"""
+        with self._lock:
+            tmp_file = f"{self.data_file}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    # Stream one store at a time rather than building the whole dict
+                    f.write('{')
+                    for i, (url, record) in enumerate(self.data.items()):
+                        if i:
+                            f.write(',')
+                        f.write(json.dumps(url, ensure_ascii=False))
+                        f.write(':')
+                        f.write(json.dumps(record.to_dict(), ensure_ascii=False, separators=(',', ':')))
+                    f.write('}')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.data_file)
+
+                # Snapshot now holds everything in the journal
+                if self._journal is not None:
+                    self._journal.close()
+                self._journal = open(self.journal_file, 'w', encoding='utf-8')
+                self._journal_entries = 0
+            except Exception as e:
+                log.exception('snapshot_save_failed', path=self.data_file, error=str(e))
+                return False
+
+            if self._claim_writer(required=False):
+                try:
+                    self._compact_events()
+                except Exception as e:
+                    log.exception('events_compaction_failed', path=self.events_file, error=str(e))
+            return True
 
     def load_from_file(self) -> bool:
-        """Load data from JSON file"""
+        """Load the snapshot and replay the journal on top of it"""
         try:
+            self.data = {}
+            loaded = False
             if os.path.exists(self.data_file):
                 with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-                return True
-            return False
+                    raw = json.load(f)
+                self.data = {url: StoreRecord.from_dict(data) for url, data in raw.items()}
+                del raw
+                loaded = True
+            self._rebuild_indexes()
+
+            self._journal_entries = 0
+            torn = False
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # Torn write from a crash - everything after it is incomplete
+                            torn = True
+                            break
+                        self._apply_journal_entry(entry)
+                        self._journal_entries += 1
+                loaded = True
+
+            # Fold a damaged journal into a snapshot so new appends start clean
+            # (a torn tail in another process's file may still be being written)
+            if torn and self._claim_writer(required=False):
+                self.save_to_file()
+            return loaded
         except Exception as e:
-            print(f"Error loading data: {e}")
+            log.exception('data_load_failed', path=self.data_file, error=str(e))
             self.data = {}
+            self._rebuild_indexes()
             return False
 
     def clear_all_data(self) -> None:
         """Clear all data"""
-        self.data = {}
-        self.save_to_file()
+        with self._lock:
+            self._claim_writer()
+            self._log_events([('removed', url, record.status, None) for url, record in self.data.items()])
+            self.data = {}
+            self._rebuild_indexes()
+            self._append_journal({'op': 'clear'})
 
     def remove_store(self, url: str) -> bool:
         """Remove a specific store from data"""
-        if url in self.data:
-            del self.data[url]
-            self.save_to_file()
-            return True
-        return False
+        with self._lock:
+            self._claim_writer()
+            if url in self.data:
+                status = self.data[url].status
+                self._drop_store(url)
+                self._append_journal({'op': 'remove', 'urls': [url]})
+                self._log_events([('removed', url, status, None)])
+                return True
+            return False
+
+    def bulk_delete_by_status(self, statuses: List[str]) -> int:
+        """Bulk delete stores by status"""
+        with self._lock:
+            self._claim_writer()
+            urls = self._urls_with_status(statuses)
+            events = [('removed', url, self.data[url].status, None) for url in urls]
+            for url in urls:
+                self._drop_store(url)
+            if urls:
+                self._append_journal({'op': 'remove', 'urls': urls})
+                self._log_events(events)
+            return len(urls)
 
     def get_store_details(self, url: str) -> Optional[Dict[str, Any]]:
         """Get detailed information for a specific store"""
-        return self.data.get(url)
+        with self._lock:
+            record = self.data.get(url)
+            return record.to_dict() if record else None
+
+    def get_check_history(self, url: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get check history for a specific store"""
+        with self._lock:
+            record = self.data.get(url)
+            if not record or not record.history:
+                return []
+            return list(reversed(record.history.to_list()[-limit:]))
+
+    def _get_changes_since(self, since: datetime) -> List[Dict[str, Any]]:
+        """Status transitions in the retained history newer than since"""
+        with self._lock:
+            cutoff = to_epoch_us(since.isoformat())
+            changes = []
+            for url, record in self.data.items():
+                if not record.history:
+                    continue
+                history = list(record.history.iter_raw())
+                for (_, prev_code), (timestamp, code) in zip(history, history[1:]):
+                    if code != prev_code and timestamp >= cutoff:
+                        changes.append({
+                            'url': url,
+                            'from_status': status_name(prev_code),
+                            'to_status': status_name(code),
+                            'changed_at': from_epoch_us(timestamp)
+                        })
+            changes.sort(key=lambda c: c['changed_at'], reverse=True)
+            return changes
+
+    def get_status_changes(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Get stores that changed status in the last N days"""
+        return self._get_changes_since(datetime.now() - timedelta(days=days))
+
+    def get_latest_changes(self, minutes: int = 60) -> List[Dict[str, Any]]:
+        """Get status changes from the last N minutes"""
+        return self._get_changes_since(datetime.now() - timedelta(minutes=minutes))
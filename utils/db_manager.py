@@ -1,15 +1,157 @@
 import psycopg2
-from psycopg2 import pool
+from psycopg2 import extensions
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Tuple
 import os
+import hashlib
 import json
+import re
+import threading
+import uuid
 import pytz
+from utils.db_pool import get_pool
+from utils.storage import StorageBackend, CHECK_RUN_COLUMNS, CHECK_RUN_JSON_COLUMNS
+from utils.store_record import StoreRow, ExportRow, DeltaRow
+from utils.structured_log import get_logger
+
+log = get_logger('shopify.db')
+
+
+# Hot-path statements, PREPAREd once per pooled connection and re-executed
+# by name. Parameters use PostgreSQL's positional $n syntax.
+PREPARED_STATEMENTS = {
+    # One round trip per check: lock and read the previous status, upsert the
+    # store (first_dead_date transitions computed from the existing row),
+    # append history, log an added / changed event when the status moved,
+    # and return the store id with the previous status. 'added' comes from
+    # the upsert itself (xmax = 0 on insert), not from prev: two workers
+    # inserting the same new URL both find no previous row, but only one
+    # inserts it. The other logs 'changed' with no old status, which deltas
+    # pick up and notifications skip.
+    'store_check_upsert': '''
+        WITH prev AS (
+            SELECT status FROM stores WHERE url = $1 FOR UPDATE
+        ),
+        upsert AS (
+            INSERT INTO stores AS s (url, status, first_check, last_check, check_count,
+                                     timezone_checked, first_dead_date, updated_at)
+            VALUES ($1, $2, $3, $3, 1, $4, CASE WHEN $2 = 'DEAD' THEN $3 END, $3)
+            ON CONFLICT (url) DO UPDATE
+            SET status = EXCLUDED.status,
+                last_check = EXCLUDED.last_check,
+                check_count = s.check_count + 1,
+                updated_at = EXCLUDED.updated_at,
+                timezone_checked = EXCLUDED.timezone_checked,
+                first_check = COALESCE(s.first_check, EXCLUDED.last_check),
+                first_dead_date = CASE
+                    WHEN EXCLUDED.status = 'DEAD' AND s.status != 'DEAD' THEN EXCLUDED.last_check
+                    WHEN EXCLUDED.status != 'DEAD' AND s.status = 'DEAD' THEN NULL
+                    ELSE s.first_dead_date
+                END
+            RETURNING id, (xmax = 0) AS inserted
+        ),
+        history AS (
+            INSERT INTO check_history (store_id, status, checked_at, response_time, status_code)
+            SELECT id, $2, $3, $5, $6 FROM upsert
+        ),
+        event AS (
+            INSERT INTO store_events (store_id, url, event, old_status, new_status)
+            SELECT upsert.id, $1, CASE WHEN upsert.inserted THEN 'added' ELSE 'changed' END,
+                   CASE WHEN upsert.inserted THEN NULL ELSE prev.status END, $2
+            FROM upsert
+            LEFT JOIN prev ON TRUE
+            WHERE upsert.inserted OR prev.status IS DISTINCT FROM $2
+        )
+        SELECT upsert.id, CASE WHEN upsert.inserted THEN NULL ELSE prev.status END
+        FROM upsert
+        LEFT JOIN prev ON TRUE
+    ''',
+    'status_counts': '''
+        SELECT status, COUNT(*) as count
+        FROM stores
+        GROUP BY status
+    ''',
+    'total_count': '''
+        SELECT COUNT(*) FROM stores
+    ''',
+    'stores_by_status': '''
+        SELECT url FROM stores WHERE status = $1 ORDER BY url
+    ''',
+}
+
+
+class PreparedConnection(extensions.connection):
+    """Connection that remembers which statements were PREPAREd on it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+class AdvisoryLock:
+    """
+    PostgreSQL session-level advisory lock, held on its own connection
+    (outside the pool) until release() or until that connection dies.
+    """
+
+    def __init__(self, database_url: str, name: str):
+        self.database_url = database_url
+        self.name = name
+        # Advisory locks take a bigint key: first 8 bytes of the name's hash
+        self.key = int.from_bytes(hashlib.sha1(name.encode('utf-8')).digest()[:8], 'big', signed=True)
+        self._conn = None
+
+    def acquire(self) -> bool:
+        """Take the lock if no other session holds it"""
+        conn = psycopg2.connect(self.database_url)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_try_advisory_lock(%s)', (self.key,))
+            acquired = cur.fetchone()[0]
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def is_held(self) -> bool:
+        """Whether the lock's session is still alive (the lock dies with it)"""
+        if self._conn is None or self._conn.closed:
+            return False
+        try:
+            with self._conn.cursor() as cur:
+                cur.execute('''
+                    SELECT 1 FROM pg_locks
+                    WHERE locktype = 'advisory' AND pid = pg_backend_pid() AND granted
+                      AND objsubid = 1 AND ((classid::bigint << 32) | objid::bigint) = %s
+                ''', (self.key,))
+                return cur.fetchone() is not None
+        except psycopg2.Error:
+            return False
+
+    def release(self) -> None:
+        """Unlock and close the lock's connection"""
+        if self._conn is None:
+            return
+        try:
+            if not self._conn.closed:
+                with self._conn.cursor() as cur:
+                    cur.execute('SELECT pg_advisory_unlock(%s)', (self.key,))
+        except psycopg2.Error:
+            pass
+        finally:
+            self._conn.close()
+            self._conn = None
+
 
-class DatabaseManager:
+class DatabaseManager(StorageBackend):
     """Handle PostgreSQL database operations for store monitoring"""
 
-    def __init__(self):
+    # database_url -> pg_trgm available, for schemas already initialized in this process
+    _schema_ready: Dict[str, bool] = {}
+    _schema_lock = threading.Lock()
+
+    def __init__(self, use_prepared: Optional[bool] = None):
         self.database_url = os.getenv('DATABASE_URL')
         if not self.database_url:
             raise ValueError(
@@ -17,14 +159,21 @@ class DatabaseManager:
                 "Please ensure PostgreSQL database is configured."
             )
 
-        # Create connection pool for better performance
-        self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1,  # minconn
-            10,  # maxconn
-            self.database_url
-        )
+        # Server-side prepared statements for hot paths (DB_USE_PREPARED=false to disable)
+        if use_prepared is None:
+            use_prepared = os.getenv('DB_USE_PREPARED', 'true').lower() == 'true'
+        self.use_prepared = use_prepared
 
-        self.init_database()
+        # One thread-safe pool per process, shared by every DatabaseManager
+        # (UI sessions, scheduler runs, scripts)
+        self.connection_pool = get_pool(self.database_url, connection_factory=PreparedConnection)
+
+        # Schema setup only needs to run once per process
+        with DatabaseManager._schema_lock:
+            if self.database_url not in DatabaseManager._schema_ready:
+                self.init_database()
+                DatabaseManager._schema_ready[self.database_url] = self.url_trgm_enabled
+            self.url_trgm_enabled = DatabaseManager._schema_ready[self.database_url]
 
     def get_connection(self):
         """Get a database connection from pool"""
@@ -34,6 +183,47 @@ class DatabaseManager:
         """Return connection to pool"""
         self.connection_pool.putconn(conn)
 
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool metrics (wait time, saturation, churn)"""
+        return self.connection_pool.get_stats()
+
+    def _execute_prepared(self, conn, cur, name: str, params: tuple = ()) -> None:
+        """
+        Execute a statement from PREPARED_STATEMENTS.
+        The statement is PREPAREd the first time it is used on a connection
+        and afterwards only EXECUTE name (...) is sent, skipping re-parsing
+        and re-planning. With use_prepared off the SQL text is sent as-is.
+        """
+        sql = PREPARED_STATEMENTS[name]
+
+        if not self.use_prepared:
+            cur.execute(re.sub(r'\$(\d+)', r'%(p\1)s', sql),
+                        {f'p{i}': value for i, value in enumerate(params, 1)})
+            return
+
+        if name not in conn.prepared_statements:
+            cur.execute(f'PREPARE {name} AS {sql}')
+            conn.prepared_statements.add(name)
+
+        if params:
+            placeholders = ', '.join(['%s'] * len(params))
+            cur.execute(f'EXECUTE {name} ({placeholders})', params)
+        else:
+            cur.execute(f'EXECUTE {name}')
+
+    def _reset_prepared(self, conn) -> None:
+        """Drop prepared statements after a failed transaction so they are re-created cleanly"""
+        if conn.closed:
+            return
+        try:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute('DEALLOCATE ALL')
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+        conn.prepared_statements.clear()
+
     def init_database(self):
         """Initialize database tables"""
         conn = None
@@ -70,6 +260,63 @@ class DatabaseManager:
                 )
             ''')
 
+            # Change log: one row per added / status-changed / removed store,
+            # written in the same statement as the change. No FK so removals
+            # outlive their store row.
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS store_events (
+                    id BIGSERIAL PRIMARY KEY,
+                    store_id INTEGER,
+                    url TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    old_status TEXT,
+                    new_status TEXT,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Named watermarks (last processed store_events id) of consumers
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS sync_cursors (
+                    name TEXT PRIMARY KEY,
+                    position BIGINT NOT NULL,
+                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Persisted state of scheduled jobs (schedule, last run), one JSON document per job
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS scheduler_state (
+                    name TEXT PRIMARY KEY,
+                    state JSONB NOT NULL DEFAULT '{}',
+                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # One summary per check pass (throughput, per-stage timings), see RunMetrics
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS check_runs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                    finished_at TIMESTAMP WITH TIME ZONE,
+                    total INTEGER,
+                    checked INTEGER,
+                    status_counts JSONB,
+                    stage_seconds JSONB,
+                    urls_per_second FLOAT,
+                    error TEXT,
+                    profile JSONB
+                )
+            ''')
+            cur.execute('''
+                ALTER TABLE check_runs ADD COLUMN IF NOT EXISTS profile JSONB
+            ''')
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_check_runs_started_at ON check_runs(started_at DESC)
+            ''')
+
             # Create index for faster queries
             cur.execute('''
                 CREATE INDEX IF NOT EXISTS idx_stores_status ON stores(status)
@@ -83,14 +330,91 @@ class DatabaseManager:
             cur.execute('''
                 CREATE INDEX IF NOT EXISTS idx_check_history_checked_at ON check_history(checked_at)
             ''')
+            # Latest check per store (LATERAL lookup in iter_export_rows)
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_check_history_store_checked_at
+                ON check_history(store_id, checked_at DESC)
+            ''')
+            # Serves the dead-stores export (date desc, url) without a sort
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stores_dead_date
+                ON stores (((first_dead_date AT TIME ZONE 'America/Los_Angeles')::date) DESC, url)
+                WHERE status = 'DEAD'
+            ''')
+
+            conn.commit()
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+        self.url_trgm_enabled = self._init_url_search_indexes()
+
+    def _init_url_search_indexes(self) -> bool:
+        """
+        Create indexes for URL search.
+        Uses a pg_trgm GIN index (serves ILIKE '%term%') when the extension
+        can be enabled, otherwise falls back to prefix and reverse-domain
+        btree indexes. Returns True when trigram search is available.
+        """
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            try:
+                cur.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                cur.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_stores_url_trgm
+                    ON stores USING gin (url gin_trgm_ops)
+                ''')
+                conn.commit()
+                return True
+            except psycopg2.Error as e:
+                # Extension not installed or no privilege to create it
+                conn.rollback()
+                log.warning('pg_trgm_unavailable', fallback='prefix_indexes', error=str(e))
 
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stores_url_lower_prefix
+                ON stores (lower(url) text_pattern_ops)
+            ''')
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stores_url_lower_reverse
+                ON stores (reverse(lower(url)) text_pattern_ops)
+            ''')
             conn.commit()
+            return False
         finally:
             if cur:
                 cur.close()
             if conn:
                 self.return_connection(conn)
 
+    @staticmethod
+    def _escape_like(term: str) -> str:
+        """Escape LIKE wildcards so user input matches literally"""
+        return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def _url_search_clause(self, search_term: str) -> tuple:
+        """Build the WHERE fragment and params for a URL search term"""
+        raw_term = search_term.strip().lower()
+        term = self._escape_like(raw_term)
+
+        if self.url_trgm_enabled:
+            # Served by idx_stores_url_trgm
+            return ' AND url ILIKE %s', [f'%{term}%']
+
+        # Without pg_trgm a leading wildcard can't use an index, so match the
+        # start of the host (with or without scheme) or the end of the domain
+        return (
+            ' AND (lower(url) LIKE %s OR lower(url) LIKE %s OR lower(url) LIKE %s'
+            ' OR reverse(lower(url)) LIKE %s)',
+            [f'{term}%', f'http://{term}%', f'https://{term}%', f'{self._escape_like(raw_term[::-1])}%']
+        )
+
     def load_urls(self, urls: List[str]) -> None:
         """Load new URLs into the database (optimized bulk insert)"""
         conn = None
@@ -109,9 +433,14 @@ class DatabaseManager:
                 execute_values(
                     cur,
                     '''
-                    INSERT INTO stores (url, status, check_count)
-                    VALUES %s
-                    ON CONFLICT (url) DO NOTHING
+                    WITH inserted AS (
+                        INSERT INTO stores (url, status, check_count)
+                        VALUES %s
+                        ON CONFLICT (url) DO NOTHING
+                        RETURNING id, url
+                    )
+                    INSERT INTO store_events (store_id, url, event, new_status)
+                    SELECT id, url, 'added', 'UNCHECKED' FROM inserted
                     ''',
                     clean_urls,
                     template="(%s, 'UNCHECKED', 0)"
@@ -136,8 +465,13 @@ class DatabaseManager:
         pacific_tz = self.get_timezone()
         return utc_now.astimezone(pacific_tz)
 
-    def update_store_status(self, url: str, status: str, timezone_checked: str = None, response_time: float = None, status_code: int = None) -> None:
-        """Update store status with timestamp and history tracking"""
+    def update_store_status(self, url: str, status: str, timezone_checked: str = None, response_time: float = None, status_code: int = None) -> Tuple[int, Optional[str]]:
+        """
+        Update store status with timestamp and history tracking.
+        Runs as a single statement, so concurrent writers can't race between
+        reading the previous status and writing the new one.
+        Returns (store_id, previous_status); previous_status is None for new stores.
+        """
         conn = None
         cur = None
         try:
@@ -147,46 +481,16 @@ class DatabaseManager:
             # Get current time in Pacific timezone
             current_time = self.get_current_time()
 
-            # Get previous status
-            cur.execute('SELECT status FROM stores WHERE url = %s', (url,))
-            result = cur.fetchone()
-            previous_status = result[0] if result else None
-
-            # Update store
-            cur.execute('''
-                UPDATE stores
-                SET status = %s,
-                    last_check = %s,
-                    check_count = check_count + 1,
-                    updated_at = %s,
-                    timezone_checked = %s,
-                    first_check = COALESCE(first_check, %s),
-                    first_dead_date = CASE
-                        WHEN %s = 'DEAD' AND %s != 'DEAD' THEN %s
-                        WHEN %s != 'DEAD' AND %s = 'DEAD' THEN NULL
-                        ELSE first_dead_date
-                    END
-                WHERE url = %s
-            ''', (status, current_time, current_time, timezone_checked, current_time,
-                  status, previous_status, current_time,
-                  status, previous_status, url))
-
-            # If the store didn't exist, insert it
-            if not result:
-                cur.execute('''
-                    INSERT INTO stores (url, status, first_check, last_check, check_count, timezone_checked, first_dead_date)
-                    VALUES (%s, %s, %s, %s, 1, %s, %s)
-                ''', (url, status, current_time, current_time, timezone_checked,
-                      current_time if status == 'DEAD' else None))
-
-
-            # Add to history
-            cur.execute('''
-                INSERT INTO check_history (store_id, status, checked_at, response_time, status_code)
-                VALUES ((SELECT id FROM stores WHERE url = %s), %s, %s, %s, %s)
-            ''', (url, status, current_time, response_time, status_code))
+            self._execute_prepared(conn, cur, 'store_check_upsert', (
+                url, status, current_time, timezone_checked, response_time, status_code))
+            store_id, previous_status = cur.fetchone()
 
             conn.commit()
+            return store_id, previous_status
+        except psycopg2.Error:
+            if conn:
+                self._reset_prepared(conn)
+            raise
         finally:
             if cur:
                 cur.close()
@@ -226,6 +530,355 @@ class DatabaseManager:
             if conn:
                 self.return_connection(conn)
 
+    def _stream_chunks(self, query: str, params: list, chunk_size: int) -> Iterator[List[tuple]]:
+        """
+        Run a query through a named (server-side) cursor and yield lists of
+        up to chunk_size rows. The cursor is declared WITH HOLD and the
+        transaction committed right away, so a long-running consumer (e.g. a
+        check pass) doesn't keep a transaction open.
+        """
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor(name=f'stream_{uuid.uuid4().hex}', withhold=True)
+            cur.itersize = chunk_size
+
+            cur.execute(query, params)
+            conn.commit()
+
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                conn.commit()
+                self.return_connection(conn)
+
+    def iter_stores(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[StoreRow]:
+        """Stream stores ordered by URL without loading the whole table"""
+        query = '''
+            SELECT url, status, first_check, last_check, first_dead_date, check_count, timezone_checked
+            FROM stores
+        '''
+        params = []
+        if statuses:
+            query += ' WHERE status = ANY(%s)'
+            params.append(list(statuses))
+        query += ' ORDER BY url'
+
+        for rows in self._stream_chunks(query, params, batch_size):
+            for row in rows:
+                yield StoreRow(*row)
+
+    def iter_export_rows(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[ExportRow]:
+        """Stream stores ordered by URL with the status code and response time of their latest check"""
+        query = '''
+            SELECT s.url, s.status, s.first_check, s.last_check, s.first_dead_date, s.check_count,
+                   s.timezone_checked, lc.status_code, lc.response_time
+            FROM stores s
+            LEFT JOIN LATERAL (
+                SELECT ch.status_code, ch.response_time
+                FROM check_history ch
+                WHERE ch.store_id = s.id
+                ORDER BY ch.checked_at DESC
+                LIMIT 1
+            ) lc ON TRUE
+        '''
+        params = []
+        if statuses:
+            query += ' WHERE s.status = ANY(%s)'
+            params.append(list(statuses))
+        query += ' ORDER BY s.url'
+
+        for rows in self._stream_chunks(query, params, batch_size):
+            for row in rows:
+                yield ExportRow(*row)
+
+    def get_last_event_id(self) -> int:
+        """
+        Id of the newest store change event.
+        Briefly takes a SHARE lock on store_events so no writer still holds an
+        uncommitted lower id - everything up to the returned id is visible.
+        """
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute('LOCK TABLE store_events IN SHARE MODE')
+            cur.execute('SELECT COALESCE(MAX(id), 0) FROM store_events')
+            last_id = cur.fetchone()[0]
+            conn.commit()
+            return last_id
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+    def iter_store_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[DeltaRow]:
+        """
+        Net change per store over events (after_id, until_id], ordered by URL.
+        A store whose first event in the range is 'added' is new to the
+        consumer; if it is gone again it is skipped entirely.
+        """
+        query = '''
+            WITH changed AS (
+                SELECT url, (ARRAY_AGG(event ORDER BY id))[1] = 'added' AS is_new
+                FROM store_events
+                WHERE id > %s AND id <= %s
+                GROUP BY url
+            )
+            SELECT CASE WHEN s.id IS NULL THEN 'removed' WHEN c.is_new THEN 'added' ELSE 'changed' END,
+                   c.url, s.status, s.first_check, s.last_check, s.first_dead_date, s.check_count,
+                   s.timezone_checked, lc.status_code, lc.response_time
+            FROM changed c
+            LEFT JOIN stores s ON s.url = c.url
+            LEFT JOIN LATERAL (
+                SELECT ch.status_code, ch.response_time
+                FROM check_history ch
+                WHERE ch.store_id = s.id
+                ORDER BY ch.checked_at DESC
+                LIMIT 1
+            ) lc ON TRUE
+            WHERE s.id IS NOT NULL OR NOT c.is_new
+            ORDER BY c.url
+        '''
+        for rows in self._stream_chunks(query, [after_id, until_id], batch_size):
+            for row in rows:
+                yield DeltaRow(*row)
+
+    def iter_status_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[Dict[str, Any]]:
+        """
+        Status transitions from change events (after_id, until_id], oldest first.
+        The first check of a loaded store (UNCHECKED -> status) is not a transition.
+        """
+        query = '''
+            SELECT id, url, old_status, new_status, created_at
+            FROM store_events
+            WHERE id > %s AND id <= %s
+              AND event = 'changed' AND old_status <> 'UNCHECKED'
+            ORDER BY id
+        '''
+        for rows in self._stream_chunks(query, [after_id, until_id], batch_size):
+            for event_id, url, old_status, new_status, created_at in rows:
+                yield {
+                    'id': event_id,
+                    'url': url,
+                    'from_status': old_status,
+                    'to_status': new_status,
+                    'changed_at': created_at.isoformat()
+                }
+
+    def get_sync_cursor(self, name: str) -> Optional[int]:
+        """Saved change-event watermark of a consumer, None if it never ran"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute('SELECT position FROM sync_cursors WHERE name = %s', (name,))
+            row = cur.fetchone()
+            return row[0] if row else None
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+    def set_sync_cursor(self, name: str, position: int) -> None:
+        """Save a consumer's change-event watermark"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute('''
+                INSERT INTO sync_cursors (name, position, updated_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE
+                SET position = EXCLUDED.position, updated_at = EXCLUDED.updated_at
+            ''', (name, position))
+            conn.commit()
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+    def get_scheduler_state(self, name: str) -> Dict[str, Any]:
+        """Persisted state of a scheduled job ({} if it never ran)"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute('SELECT state FROM scheduler_state WHERE name = %s', (name,))
+            row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else {}
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+    def update_scheduler_state(self, name: str, changes: Dict[str, Any]) -> None:
+        """Merge changes into a scheduled job's persisted state (top-level keys, atomically)"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute('''
+                INSERT INTO scheduler_state (name, state, updated_at)
+                VALUES (%s, %s::jsonb, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE
+                SET state = scheduler_state.state || EXCLUDED.state, updated_at = EXCLUDED.updated_at
+            ''', (name, json.dumps(changes)))
+            conn.commit()
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+    def save_check_run(self, run: Dict[str, Any]) -> None:
+        """Insert or replace a check run summary, keyed by its id"""
+        values = tuple(
+            json.dumps(run.get(column)) if column in CHECK_RUN_JSON_COLUMNS else run.get(column)
+            for column in CHECK_RUN_COLUMNS
+        )
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in CHECK_RUN_COLUMNS[1:])
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute(f'''
+                INSERT INTO check_runs ({', '.join(CHECK_RUN_COLUMNS)})
+                VALUES ({', '.join(['%s'] * len(CHECK_RUN_COLUMNS))})
+                ON CONFLICT (id) DO UPDATE SET {updates}
+            ''', values)
+            conn.commit()
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+    def get_check_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent check run summaries, newest first"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute(f'''
+                SELECT {', '.join(CHECK_RUN_COLUMNS)} FROM check_runs
+                ORDER BY started_at DESC
+                LIMIT %s
+            ''', (limit,))
+            rows = cur.fetchall()
+            conn.commit()
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
+        runs = []
+        for row in rows:
+            run = dict(zip(CHECK_RUN_COLUMNS, row))
+            for column in ('started_at', 'finished_at'):
+                if run[column]:
+                    run[column] = run[column].isoformat()
+            run['status_counts'] = run['status_counts'] or {}
+            run['stage_seconds'] = run['stage_seconds'] or {}
+            runs.append(run)
+        return runs
+
+    def acquire_leader_lock(self, name: str) -> Optional['AdvisoryLock']:
+        """
+        Try to take a session-level advisory lock on a dedicated connection,
+        so only one process across all hosts sharing the database holds it.
+        """
+        lock = AdvisoryLock(self.database_url, name)
+        return lock if lock.acquire() else None
+
+    def iter_store_chunks(self, updated_since: Optional[datetime] = None, chunk_size: int = 10000,
+                          updated_before: Optional[datetime] = None) -> Iterator[List[tuple]]:
+        """
+        Stream full store rows in chunks, ordered by updated_at, for columnar export.
+        Row layout: EXPORT_STORE_COLUMNS.
+        """
+        query = '''
+            SELECT id, url, status, first_check, last_check, first_dead_date, check_count,
+                   timezone_checked, created_at, updated_at
+            FROM stores
+        '''
+        conditions = []
+        params = []
+        if updated_since:
+            conditions.append('updated_at > %s')
+            params.append(updated_since)
+        if updated_before:
+            conditions.append('updated_at <= %s')
+            params.append(updated_before)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY updated_at, id'
+        return self._stream_chunks(query, params, chunk_size)
+
+    def iter_history_chunks(self, after_id: int = 0, chunk_size: int = 50000,
+                            until_id: Optional[int] = None) -> Iterator[List[tuple]]:
+        """
+        Stream check history rows with after_id < id <= until_id in chunks, ordered by id.
+        Row layout: EXPORT_HISTORY_COLUMNS.
+        """
+        return self._stream_chunks('''
+            SELECT ch.id, ch.store_id, s.url, ch.status, ch.checked_at, ch.response_time, ch.status_code
+            FROM check_history ch
+            JOIN stores s ON s.id = ch.store_id
+            WHERE ch.id > %s AND ch.id <= %s
+            ORDER BY ch.id
+        ''', [after_id, until_id if until_id is not None else 2 ** 63 - 1], chunk_size)
+
+    def get_history_high_water(self) -> int:
+        """
+        Newest check history id with every lower id committed.
+        Briefly takes a SHARE lock on check_history, which waits out writers
+        still holding an uncommitted (lower) id, like get_last_event_id().
+        """
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute('LOCK TABLE check_history IN SHARE MODE')
+            cur.execute('SELECT COALESCE(MAX(id), 0) FROM check_history')
+            high_water = cur.fetchone()[0]
+            conn.commit()
+            return high_water
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
     def get_stores_by_status(self, status: str) -> List[str]:
         """Get list of URLs with specific status"""
         conn = None
@@ -234,8 +887,12 @@ class DatabaseManager:
             conn = self.get_connection()
             cur = conn.cursor()
 
-            cur.execute('SELECT url FROM stores WHERE status = %s ORDER BY url', (status,))
+            self._execute_prepared(conn, cur, 'stores_by_status', (status,))
             return [row[0] for row in cur.fetchall()]
+        except psycopg2.Error:
+            if conn:
+                self._reset_prepared(conn)
+            raise
         finally:
             if cur:
                 cur.close()
@@ -250,17 +907,17 @@ class DatabaseManager:
             conn = self.get_connection()
             cur = conn.cursor()
 
-            cur.execute('''
-                SELECT status, COUNT(*) as count
-                FROM stores
-                GROUP BY status
-            ''')
+            self._execute_prepared(conn, cur, 'status_counts')
 
             counts = {}
             for status, count in cur.fetchall():
                 counts[status] = count
 
             return counts
+        except psycopg2.Error:
+            if conn:
+                self._reset_prepared(conn)
+            raise
         finally:
             if cur:
                 cur.close()
@@ -275,25 +932,34 @@ class DatabaseManager:
             conn = self.get_connection()
             cur = conn.cursor()
 
-            cur.execute('SELECT COUNT(*) FROM stores')
+            self._execute_prepared(conn, cur, 'total_count')
             return cur.fetchone()[0]
+        except psycopg2.Error:
+            if conn:
+                self._reset_prepared(conn)
+            raise
         finally:
             if cur:
                 cur.close()
             if conn:
                 self.return_connection(conn)
 
-    def get_live_count(self) -> int:
-        """Get number of LIVE stores"""
-        return len(self.get_stores_by_status('LIVE'))
-
-    def get_dead_count(self) -> int:
-        """Get number of DEAD stores"""
-        return len(self.get_stores_by_status('DEAD'))
+    def get_data_version(self) -> str:
+        """Row count plus latest updated_at - changes on every insert, check and delete"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
 
-    def get_unpaid_count(self) -> int:
-        """Get number of UNPAID stores"""
-        return len(self.get_stores_by_status('UNPAID'))
+            cur.execute('SELECT COUNT(*), MAX(updated_at) FROM stores')
+            count, last_updated = cur.fetchone()
+            return f"{count}:{last_updated.isoformat() if last_updated else ''}"
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
 
     def get_filtered_data(self, status_filters: List[str], search_term: str = "") -> Dict[str, Dict[str, Any]]:
         """Get filtered data based on status and search term"""
@@ -310,9 +976,10 @@ class DatabaseManager:
             '''
             params = [status_filters]
 
-            if search_term:
-                query += ' AND url ILIKE %s'
-                params.append(f'%{search_term}%')
+            if search_term and search_term.strip():
+                clause, search_params = self._url_search_clause(search_term)
+                query += clause
+                params.extend(search_params)
 
             query += ' ORDER BY url'
 
@@ -417,6 +1084,41 @@ class DatabaseManager:
             if conn:
                 self.return_connection(conn)
 
+    def iter_dead_stores(self, batch_size: int = 2000) -> Iterator[Tuple[str, str, int]]:
+        """Stream DEAD stores as (dead_date, url, check_count), newest Pacific date first"""
+        query = '''
+            SELECT (first_dead_date AT TIME ZONE 'America/Los_Angeles')::date, url, check_count
+            FROM stores
+            WHERE status = 'DEAD' AND first_dead_date IS NOT NULL
+            ORDER BY (first_dead_date AT TIME ZONE 'America/Los_Angeles')::date DESC, url
+        '''
+        for rows in self._stream_chunks(query, [], batch_size):
+            for dead_date, url, check_count in rows:
+                yield dead_date.isoformat(), url, check_count or 0
+
+    def get_dead_date_counts(self) -> Dict[str, int]:
+        """Number of DEAD stores per Pacific dead date, newest date first"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+
+            cur.execute('''
+                SELECT (first_dead_date AT TIME ZONE 'America/Los_Angeles')::date AS dead_date, COUNT(*)
+                FROM stores
+                WHERE status = 'DEAD' AND first_dead_date IS NOT NULL
+                GROUP BY dead_date
+                ORDER BY dead_date DESC
+            ''')
+
+            return {dead_date.isoformat(): count for dead_date, count in cur.fetchall()}
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
     def get_store_details(self, url: str) -> Optional[Dict[str, Any]]:
         """Get detailed information for a specific store"""
         conn = None
@@ -483,6 +1185,40 @@ class DatabaseManager:
             if conn:
                 self.return_connection(conn)
 
+    # Delete stores and log a 'removed' event per row; rowcount = stores deleted
+    _DELETE_WITH_EVENTS = '''
+        WITH deleted AS (
+            DELETE FROM stores WHERE {where} RETURNING id, url, status
+        )
+        INSERT INTO store_events (store_id, url, event, old_status)
+        SELECT id, url, 'removed', status FROM deleted
+    '''
+
+    def compact_history(self, keep_days: int) -> int:
+        """Delete check history older than keep_days, keeping each store's latest check"""
+        conn = None
+        cur = None
+        try:
+            conn = self.get_connection()
+            cur = conn.cursor()
+            cur.execute('''
+                DELETE FROM check_history h
+                WHERE h.checked_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                  AND EXISTS (
+                      SELECT 1 FROM check_history newer
+                      WHERE newer.store_id = h.store_id
+                        AND newer.checked_at > h.checked_at
+                  )
+            ''', (keep_days,))
+            deleted = cur.rowcount
+            conn.commit()
+            return deleted
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                self.return_connection(conn)
+
     def clear_all_data(self) -> None:
         """Clear all data"""
         conn = None
@@ -491,7 +1227,7 @@ class DatabaseManager:
             conn = self.get_connection()
             cur = conn.cursor()
             cur.execute('DELETE FROM check_history')
-            cur.execute('DELETE FROM stores')
+            cur.execute(self._DELETE_WITH_EVENTS.format(where='TRUE'))
             conn.commit()
         finally:
             if cur:
@@ -506,7 +1242,7 @@ class DatabaseManager:
         try:
             conn = self.get_connection()
             cur = conn.cursor()
-            cur.execute('DELETE FROM stores WHERE url = %s', (url,))
+            cur.execute(self._DELETE_WITH_EVENTS.format(where='url = %s'), (url,))
             deleted = cur.rowcount > 0
             conn.commit()
             return deleted
@@ -523,7 +1259,7 @@ class DatabaseManager:
         try:
             conn = self.get_connection()
             cur = conn.cursor()
-            cur.execute('DELETE FROM stores WHERE status = ANY(%s)', (statuses,))
+            cur.execute(self._DELETE_WITH_EVENTS.format(where='status = ANY(%s)'), (statuses,))
             deleted_count = cur.rowcount
             conn.commit()
             return deleted_count
@@ -627,8 +1363,3 @@ class DatabaseManager:
                 cur.close()
             if conn:
                 self.return_connection(conn)
-
-    def get_newly_dead_stores(self, minutes: int = 60) -> List[str]:
-        """Get stores that became DEAD in the last N minutes"""
-        changes = self.get_latest_changes(minutes)
-        return [c['url'] for c in changes if c['to_status'] == 'DEAD']
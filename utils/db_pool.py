@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from utils.metrics import REGISTRY, Counter, Gauge
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+class ManagedConnectionPool:
+    """
+    Thread-safe, bounded PostgreSQL connection pool.
+
+    - at most maxconn connections are open; callers wait up to
+      checkout_timeout seconds for one to be returned
+    - connections idle longer than max_idle_seconds are closed and replaced
+    - connections idle longer than ping_after_seconds are pinged with
+      SELECT 1 before being handed out, so connections killed by a Postgres
+      restart are replaced instead of failing the caller
+    """
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 checkout_timeout: float = 30.0, max_idle_seconds: float = 300.0,
+                 ping_after_seconds: float = 30.0, connection_factory=None):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.ping_after_seconds = ping_after_seconds
+        self.connection_factory = connection_factory
+
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, last_used) - used LIFO
+        self._in_use: Dict[int, Any] = {}
+        self._opened = 0
+        self._closed = False
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._peak_in_use = 0
+        self._waiting = 0
+        self._replaced_stale = 0
+        self._recycled_idle = 0
+
+        for _ in range(minconn):
+            self._opened += 1
+            try:
+                self._idle.append((self._connect(), time.monotonic()))
+            except Exception:
+                self._opened -= 1
+                raise
+
+    def _connect(self):
+        """Open a new connection"""
+        if self.connection_factory:
+            return psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        return psycopg2.connect(self.dsn)
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        """Close a connection, ignoring errors from already broken ones"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn) -> bool:
+        """Pre-ping a connection"""
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a connection, waiting up to timeout seconds for a free slot"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+        last_used = None
+
+        with self._cond:
+            if self._closed:
+                raise PoolError("connection pool is closed")
+
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._opened < self.maxconn:
+                    self._opened += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"no database connection available within {timeout:.1f}s "
+                        f"({self.maxconn} in use)")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        # Connect / validate outside the lock so slow network calls don't block other threads
+        try:
+            if conn is not None:
+                idle_for = time.monotonic() - last_used
+                if conn.closed or idle_for > self.max_idle_seconds:
+                    self._close_quietly(conn)
+                    conn = self._connect()
+                    self._recycled_idle += 1
+                elif idle_for > self.ping_after_seconds and not self._is_alive(conn):
+                    self._close_quietly(conn)
+                    conn = self._connect()
+                    self._replaced_stale += 1
+            else:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._in_use[id(conn)] = conn
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._peak_in_use = max(self._peak_in_use, len(self._in_use))
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """Return a connection to the pool (or discard it if broken)"""
+        with self._cond:
+            if self._in_use.pop(id(conn), None) is None:
+                raise PoolError("trying to put unkeyed connection")
+
+        discard = close or self._closed or conn.closed
+        if not discard:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            if discard:
+                self._opened -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        """Close all idle connections and refuse new checkouts"""
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+                self._opened -= 1
+            self._idle = []
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool usage metrics: wait times, saturation and connection churn"""
+        with self._cond:
+            in_use = len(self._in_use)
+            return {
+                'maxconn': self.maxconn,
+                'open': self._opened,
+                'in_use': in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'saturation': in_use / self.maxconn if self.maxconn else 0.0,
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': (self._total_wait / self._checkouts * 1000) if self._checkouts else 0.0,
+                'max_wait_ms': self._max_wait * 1000,
+                'replaced_stale': self._replaced_stale,
+                'recycled_idle': self._recycled_idle
+            }
+
+
+_pools: Dict[str, ManagedConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str, connection_factory=None) -> ManagedConnectionPool:
+    """
+    Get the process-wide pool for a DSN, creating it on first use.
+    Sized and tuned via DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_MAX_IDLE and
+    DB_POOL_PING_AFTER.
+    """
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = ManagedConnectionPool(
+                dsn,
+                minconn=1,
+                maxconn=int(os.getenv('DB_POOL_MAX', '10')),
+                checkout_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                max_idle_seconds=float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+                ping_after_seconds=float(os.getenv('DB_POOL_PING_AFTER', '30')),
+                connection_factory=connection_factory
+            )
+            _pools[dsn] = pool
+        return pool
+
+
+def _pool_label(dsn: str) -> str:
+    """host/dbname of a DSN, so metric labels never carry credentials"""
+    try:
+        params = extensions.parse_dsn(dsn)
+    except psycopg2.ProgrammingError:
+        return 'unknown'
+    return f"{params.get('host', 'localhost')}/{params.get('dbname', '')}"
+
+
+def _collect_pool_stats() -> List[Any]:
+    """Metrics collector: usage of every connection pool in this process (get_stats())"""
+    gauges = {
+        'maxconn': Gauge('shopify_db_pool_max_connections', 'Connection pool size limit', ['pool']),
+        'open': Gauge('shopify_db_pool_open_connections', 'Connections open in the pool', ['pool']),
+        'in_use': Gauge('shopify_db_pool_in_use_connections', 'Connections checked out', ['pool']),
+        'idle': Gauge('shopify_db_pool_idle_connections', 'Connections idle in the pool', ['pool']),
+        'waiting': Gauge('shopify_db_pool_waiting_threads', 'Threads waiting for a connection', ['pool']),
+        'saturation': Gauge('shopify_db_pool_saturation', 'Share of maxconn checked out (0-1)', ['pool']),
+        'avg_wait_ms': Gauge('shopify_db_pool_avg_wait_milliseconds', 'Average checkout wait', ['pool']),
+        'max_wait_ms': Gauge('shopify_db_pool_max_wait_milliseconds', 'Longest checkout wait', ['pool'])
+    }
+    counters = {
+        'checkouts': Counter('shopify_db_pool_checkouts_total', 'Connections checked out', ['pool']),
+        'timeouts': Counter('shopify_db_pool_timeouts_total', 'Checkouts that timed out', ['pool']),
+        'replaced_stale': Counter('shopify_db_pool_replaced_stale_total',
+                                  'Dead connections replaced at checkout', ['pool']),
+        'recycled_idle': Counter('shopify_db_pool_recycled_idle_total',
+                                 'Connections closed after idling too long', ['pool'])
+    }
+    with _pools_lock:
+        pools = list(_pools.items())
+    for dsn, pool in pools:
+        label = _pool_label(dsn)
+        stats = pool.get_stats()
+        for key, gauge in gauges.items():
+            gauge.set(stats[key], pool=label)
+        for key, counter in counters.items():
+            counter.inc(stats[key], pool=label)
+    return list(gauges.values()) + list(counters.values())
+
+
+REGISTRY.add_collector(_collect_pool_stats)
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+from utils.export_manager import ExportManager
+from utils.structured_log import get_logger
+
+log = get_logger('shopify.export')
+
+
+class ExportJob:
+    """State of one background export; updated by the worker, read by the UI"""
+
+    def __init__(self, kind: str, params: Dict[str, Any], cache_key: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind  # 'report' (text export types) or 'records' (csv / jsonl)
+        self.params = params
+        self.cache_key = cache_key
+        self.status = 'queued'  # queued -> running -> done | failed
+        self.rows_done = 0
+        self.rows_total = 0
+        self.filename: Optional[str] = None
+        self.error: Optional[str] = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    @property
+    def progress(self) -> float:
+        """Fraction complete, 0.0 - 1.0"""
+        if self.status == 'done':
+            return 1.0
+        if not self.rows_total:
+            return 0.0
+        return min(self.rows_done / self.rows_total, 1.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'rows_done': self.rows_done,
+            'rows_total': self.rows_total,
+            'filename': self.filename,
+            'error': self.error,
+            'cached': self.cached
+        }
+
+
+class ExportJobManager:
+    """
+    Run exports on a background worker thread instead of inside the
+    Streamlit request.
+
+    Finished files are cached by (export parameters, storage data version),
+    so asking again for the same export while the data is unchanged returns
+    the existing file immediately. After each job, files in the export dir
+    older than EXPORT_MAX_AGE_HOURS are deleted, then the oldest ones until
+    the dir is under EXPORT_MAX_TOTAL_MB.
+    """
+
+    MAX_FINISHED_JOBS = 50
+
+    def __init__(self, export_manager: Optional[ExportManager] = None):
+        self.export_manager = export_manager or ExportManager()
+        self.export_dir = self.export_manager.export_dir
+        self.cache_file = os.path.join(self.export_dir, ".export_cache.json")
+        self.max_age_seconds = float(os.getenv('EXPORT_MAX_AGE_HOURS', '24')) * 3600
+        self.max_total_bytes = float(os.getenv('EXPORT_MAX_TOTAL_MB', '500')) * 1024 * 1024
+        self.jobs: Dict[str, ExportJob] = {}
+        self._cache = self._load_cache()  # cache key -> filename
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit_report(self, data_manager, export_type: str, compress: bool = False) -> ExportJob:
+        """Queue a text report export ("All Data", "DEAD Only", ...)"""
+        return self._submit(data_manager, 'report', {'export_type': export_type, 'compress': compress})
+
+    def submit_records(self, data_manager, fmt: str = 'csv', fields: Optional[List[str]] = None,
+                       statuses: Optional[List[str]] = None, compress: bool = False) -> ExportJob:
+        """Queue a CSV / JSON Lines export"""
+        return self._submit(data_manager, 'records', {
+            'fmt': fmt,
+            'fields': list(fields) if fields else None,
+            'statuses': sorted(statuses) if statuses else None,
+            'compress': compress
+        })
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """Look up a job by id"""
+        return self.jobs.get(job_id)
+
+    def _submit(self, data_manager, kind: str, params: Dict[str, Any]) -> ExportJob:
+        """Return a cached or in-flight job for the same export, or queue a new one"""
+        version = data_manager.get_data_version()
+        cache_key = hashlib.sha1(
+            json.dumps([kind, params, version], sort_keys=True).encode('utf-8')
+        ).hexdigest()[:16]
+
+        with self._lock:
+            for existing in self.jobs.values():
+                if existing.cache_key == cache_key and not existing.finished:
+                    return existing
+
+            job = ExportJob(kind, params, cache_key)
+            filename = self._cache.get(cache_key)
+            if filename and os.path.exists(filename):
+                job.status = 'done'
+                job.filename = filename
+                job.cached = True
+                job.finished_at = time.time()
+                os.utime(filename)  # recently used files are evicted last
+                self.jobs[job.id] = job
+                return job
+
+            self.jobs[job.id] = job
+            self._queue.put((job, data_manager))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, daemon=True)
+                self._worker.start()
+        return job
+
+    def _run_worker(self):
+        """Worker loop - runs one export at a time"""
+        while True:
+            job, data_manager = self._queue.get()
+            try:
+                self._run_job(job, data_manager)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job: ExportJob, data_manager):
+        """Run one export and record the result"""
+        job.status = 'running'
+
+        def progress(done: int, total: int):
+            job.rows_done = done
+            job.rows_total = total
+
+        try:
+            if job.kind == 'report':
+                filename = self.export_manager.export_data(
+                    data_manager, job.params['export_type'],
+                    compress=job.params['compress'], progress=progress)
+                if not filename:
+                    raise ValueError(f"Unknown export type: {job.params['export_type']}")
+            else:
+                filename = self.export_manager.export_records(
+                    data_manager, fmt=job.params['fmt'], fields=job.params['fields'],
+                    statuses=job.params['statuses'], compress=job.params['compress'],
+                    progress=progress)
+
+            # Tag the file with its cache key so same-second exports never collide
+            directory, name = os.path.split(filename)
+            stem, ext = name.split('.', 1)
+            tagged = os.path.join(directory, f"{stem}_{job.cache_key[:8]}.{ext}")
+            os.replace(filename, tagged)
+
+            with self._lock:
+                self._cache[job.cache_key] = tagged
+                self._save_cache()
+            job.filename = tagged
+            job.status = 'done'
+            log.info('export_job_finished', job=job.id, kind=job.kind, filename=tagged,
+                     rows=job.rows_done, seconds=round(time.time() - job.created_at, 1))
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            log.exception('export_job_failed', job=job.id, kind=job.kind, error=str(e))
+        finally:
+            job.finished_at = time.time()
+            self.evict(keep=job.filename)
+            self._prune_jobs()
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Delete old export files: anything older than the max age, then the
+        least recently used until the dir fits the size budget.
+        Returns the number of files removed.
+        """
+        files = []
+        for entry in os.scandir(self.export_dir):
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            if keep and os.path.abspath(entry.path) == os.path.abspath(keep):
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+
+        keep_size = os.path.getsize(keep) if keep and os.path.exists(keep) else 0
+        total = keep_size + sum(size for _, size, _ in files)
+        cutoff = time.time() - self.max_age_seconds
+        removed = 0
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.max_total_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+                total -= size
+            except OSError as e:
+                log.warning('export_evict_failed', path=path, error=str(e))
+
+        if removed:
+            with self._lock:
+                self._cache = {key: filename for key, filename in self._cache.items() if os.path.exists(filename)}
+                self._save_cache()
+            log.info('exports_evicted', removed=removed)
+        return removed
+
+    def _prune_jobs(self):
+        """Forget the oldest finished jobs"""
+        with self._lock:
+            finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at)
+            for job in finished[:-self.MAX_FINISHED_JOBS]:
+                del self.jobs[job.id]
+
+    def _load_cache(self) -> Dict[str, str]:
+        """Read the artifact cache index"""
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning('export_cache_load_failed', path=self.cache_file, error=str(e))
+            return {}
+
+    def _save_cache(self):
+        """Persist the artifact cache index atomically (lock held)"""
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._cache, f, indent=2)
+        os.replace(tmp_file, self.cache_file)
+
+
+_job_manager: Optional[ExportJobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_export_job_manager() -> ExportJobManager:
+    """Process-wide export job manager, shared by every Streamlit session"""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = ExportJobManager()
+        return _job_manager
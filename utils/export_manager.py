@@ -1,6 +1,55 @@
+import csv
+import gzip
+import io
+import json
 import os
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Iterator, Optional, TextIO, Tuple
+from utils.store_record import DeltaRow
+from utils.structured_log import get_logger
+
+log = get_logger('shopify.export')
+
+# Write buffer for export files; rows are streamed, never collected in memory
+EXPORT_BUFFER_SIZE = 1024 * 1024
+
+# Columns available to the CSV / JSON Lines exports, in default order
+RECORD_FIELDS = [
+    'url', 'status', 'last_check', 'first_dead_date', 'check_count',
+    'timezone_checked', 'last_status_code', 'last_response_time', 'first_check'
+]
+DEFAULT_RECORD_FIELDS = RECORD_FIELDS[:8]
+RECORD_FORMATS = {'csv': 'csv', 'jsonl': 'jsonl'}
+
+# Rows between progress callbacks
+PROGRESS_EVERY = 1000
+
+# progress(rows_done, rows_total)
+ProgressCallback = Callable[[int, int], None]
+
+
+class _RowCounter:
+    """Counts rows streamed through track() and reports (done, total) to a progress callback"""
+
+    def __init__(self, progress: Optional[ProgressCallback], total: int):
+        self.progress = progress
+        self.total = total
+        self.done = 0
+
+    def track(self, rows: Iterator) -> Iterator:
+        """Pass rows through unchanged, counting them"""
+        for row in rows:
+            yield row
+            self.done += 1
+            if self.progress and self.done % PROGRESS_EVERY == 0:
+                self.progress(self.done, max(self.total, self.done))
+
+    def finish(self) -> None:
+        """Report the final count"""
+        if self.progress:
+            self.progress(self.done, self.done)
+
 
 class ExportManager:
     """Handle data export functionality"""
@@ -10,29 +59,52 @@ class ExportManager:
         if not os.path.exists(self.export_dir):
             os.makedirs(self.export_dir)
 
-    def export_data(self, data_manager, export_type: str) -> str:
+    def export_data(self, data_manager, export_type: str, compress: bool = False,
+                    progress: Optional[ProgressCallback] = None) -> str:
         """
         Export data based on type
-        Returns filename of exported file
+        Returns filename of exported file (.txt.gz when compress is set)
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         if export_type == "All Data":
-            return self._export_all_data(data_manager, timestamp)
+            return self._export_all_data(data_manager, timestamp, compress, progress)
         elif export_type == "LIVE Only":
-            return self._export_by_status(data_manager, "LIVE", timestamp)
+            return self._export_by_status(data_manager, "LIVE", timestamp, compress, progress)
         elif export_type == "DEAD Only":
-            return self._export_dead_stores(data_manager, timestamp)
+            return self._export_dead_stores(data_manager, timestamp, compress, progress)
         elif export_type == "UNPAID Only":
-            return self._export_by_status(data_manager, "UNPAID", timestamp)
+            return self._export_by_status(data_manager, "UNPAID", timestamp, compress, progress)
         
         return None
 
-    def _export_all_data(self, data_manager, timestamp: str) -> str:
+    @contextmanager
+    def _open_export(self, name: str, compress: bool, directory: Optional[str] = None) -> Iterator[Tuple[str, TextIO]]:
+        """
+        Open an export file for buffered text writing, gzipped if requested.
+        A failed export removes its partial file.
+        """
+        filename = os.path.join(self.export_dir if directory is None else directory, name)
+        if compress:
+            filename += ".gz"
+            raw = gzip.open(filename, 'wb', compresslevel=6)
+            f = io.TextIOWrapper(io.BufferedWriter(raw, EXPORT_BUFFER_SIZE), encoding='utf-8', newline='')
+        else:
+            f = open(filename, 'w', encoding='utf-8', newline='', buffering=EXPORT_BUFFER_SIZE)
+        try:
+            with f:
+                yield filename, f
+        except BaseException:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            raise
+
+    def _export_all_data(self, data_manager, timestamp: str, compress: bool = False,
+                         progress: Optional[ProgressCallback] = None) -> str:
         """Export all data with full details"""
-        filename = os.path.join(self.export_dir, f"all_stores_{timestamp}.txt")
-        
-        with open(filename, 'w', encoding='utf-8') as f:
+        with self._open_export(f"all_stores_{timestamp}.txt", compress) as (filename, f):
             f.write("SHOPIFY STORE MONITORING REPORT\n")
             f.write("=" * 50 + "\n")
             f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
@@ -48,84 +120,219 @@ class ExportManager:
                 f.write(f"{status}: {count} ({percentage:.1f}%)\n")
             f.write("\n")
             
-            # Detailed listing
-            data = data_manager.get_data()
-            for status in ["LIVE", "DEAD", "UNPAID", "UNCHECKED"]:
-                stores = [url for url, store_data in data.items() if store_data.get('status') == status]
-                if stores:
-                    f.write(f"\n{status} STORES ({len(stores)}):\n")
-                    f.write("-" * 30 + "\n")
-                    for url in sorted(stores):
-                        store_data = data[url]
-                        f.write(f"{url}")
-                        if store_data.get('last_check'):
-                            f.write(f" (Last check: {store_data['last_check'][:19]})")
-                        if status == "DEAD" and store_data.get('first_dead_date'):
-                            f.write(f" (Dead since: {store_data['first_dead_date'][:10]})")
-                        f.write("\n")
+            # Detailed listing: one ordered streaming query per status
+            statuses = ["LIVE", "DEAD", "UNPAID", "UNCHECKED"]
+            counter = _RowCounter(progress, sum(status_counts.get(status, 0) for status in statuses))
+            for status in statuses:
+                if not status_counts.get(status):
+                    continue
+                f.write(f"\n{status} STORES ({status_counts[status]}):\n")
+                f.write("-" * 30 + "\n")
+                stores = counter.track(data_manager.iter_stores(statuses=[status]))
+                f.writelines(self._detail_lines(stores, status))
         
+        counter.finish()
         return filename
 
-    def _export_by_status(self, data_manager, status: str, timestamp: str) -> str:
+    def _detail_lines(self, stores, status: str) -> Iterator[str]:
+        """Report lines for the full export"""
+        for store in stores:
+            line = store.url
+            if store.last_check:
+                line += f" (Last check: {self._format_timestamp(store.last_check, 19)})"
+            if status == "DEAD" and store.first_dead_date:
+                line += f" (Dead since: {self._format_timestamp(store.first_dead_date, 10)})"
+            yield line + "\n"
+
+    def _export_by_status(self, data_manager, status: str, timestamp: str, compress: bool = False,
+                          progress: Optional[ProgressCallback] = None) -> str:
         """Export stores by specific status"""
-        filename = os.path.join(self.export_dir, f"{status.lower()}_stores_{timestamp}.txt")
-        
-        stores = data_manager.get_stores_by_status(status)
-        data = data_manager.get_data()
+        total = data_manager.get_status_counts().get(status, 0)
+        counter = _RowCounter(progress, total)
         
-        with open(filename, 'w', encoding='utf-8') as f:
+        with self._open_export(f"{status.lower()}_stores_{timestamp}.txt", compress) as (filename, f):
             f.write(f"{status} SHOPIFY STORES\n")
             f.write("=" * 30 + "\n")
             f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total {status} stores: {len(stores)}\n\n")
+            f.write(f"Total {status} stores: {total}\n\n")
             
-            for url in sorted(stores):
-                store_data = data[url]
-                f.write(f"{url}")
-                if store_data.get('last_check'):
-                    f.write(f" (Checked: {store_data['last_check'][:19]})")
-                f.write("\n")
+            f.writelines(
+                f"{store.url} (Checked: {self._format_timestamp(store.last_check, 19)})\n"
+                if store.last_check else f"{store.url}\n"
+                for store in counter.track(data_manager.iter_stores(statuses=[status]))
+            )
         
+        counter.finish()
         return filename
 
-    def _export_dead_stores(self, data_manager, timestamp: str) -> str:
+    def _export_dead_stores(self, data_manager, timestamp: str, compress: bool = False,
+                            progress: Optional[ProgressCallback] = None) -> str:
         """Export DEAD stores with death dates"""
-        filename = os.path.join(self.export_dir, f"dead_stores_{timestamp}.txt")
-        
-        dead_stores = data_manager.get_dead_stores_with_dates()
-        data = data_manager.get_data()
+        # Per-date counts up front so group headers can be written while streaming
+        date_counts = data_manager.get_dead_date_counts()
+        # Two passes: grouped listing, then URLs only
+        counter = _RowCounter(progress, 2 * sum(date_counts.values()))
         
-        with open(filename, 'w', encoding='utf-8') as f:
+        with self._open_export(f"dead_stores_{timestamp}.txt", compress) as (filename, f):
             f.write("DEAD SHOPIFY STORES\n")
             f.write("=" * 30 + "\n")
             f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total DEAD stores: {len(dead_stores)}\n\n")
+            f.write(f"Total DEAD stores: {sum(date_counts.values())}\n\n")
             
-            # Group by death date
-            by_date = {}
-            for url, death_date in dead_stores.items():
-                if death_date not in by_date:
-                    by_date[death_date] = []
-                by_date[death_date].append(url)
-            
-            for death_date in sorted(by_date.keys(), reverse=True):
-                f.write(f"\nDied on {death_date} ({len(by_date[death_date])} stores):\n")
-                f.write("-" * 40 + "\n")
-                for url in sorted(by_date[death_date]):
-                    store_data = data[url]
-                    f.write(f"{url}")
-                    if store_data.get('check_count', 0) > 1:
-                        f.write(f" (Checked {store_data['check_count']} times)")
-                    f.write("\n")
+            # Grouped by death date, streamed in (date desc, url) order
+            f.writelines(self._dead_lines(counter.track(data_manager.iter_dead_stores()), date_counts))
             
             # Also list URLs only for easy copying
             f.write(f"\n\nURLs ONLY (for easy copying):\n")
             f.write("-" * 30 + "\n")
-            for url in sorted(dead_stores.keys()):
-                f.write(f"{url}\n")
+            f.writelines(
+                f"{store.url}\n"
+                for store in counter.track(data_manager.iter_stores(statuses=["DEAD"]))
+                if store.first_dead_date
+            )
         
+        counter.finish()
         return filename
 
+    @staticmethod
+    def _dead_lines(dead_stores, date_counts: Dict[str, int]) -> Iterator[str]:
+        """Report lines for the DEAD export, with a header per death date"""
+        current_date = None
+        for death_date, url, check_count in dead_stores:
+            if death_date != current_date:
+                current_date = death_date
+                yield f"\nDied on {death_date} ({date_counts.get(death_date, 0)} stores):\n"
+                yield "-" * 40 + "\n"
+            if check_count > 1:
+                yield f"{url} (Checked {check_count} times)\n"
+            else:
+                yield f"{url}\n"
+
+    def export_records(self, data_manager, fmt: str = "csv", fields: Optional[List[str]] = None,
+                       statuses: Optional[List[str]] = None, compress: bool = False,
+                       filename: Optional[str] = None, progress: Optional[ProgressCallback] = None) -> str:
+        """
+        Export stores as CSV or JSON Lines with the chosen fields.
+        Writes to filename when given, otherwise to a timestamped file in
+        the export dir. Returns the filename.
+        """
+        fields = self._check_record_args(fmt, fields)
+        with self._open_record_file("stores", fmt, compress, filename) as (filename, f):
+            self.write_records(f, data_manager, fmt, fields, statuses, progress)
+        return filename
+
+    def export_delta(self, data_manager, fmt: str = "jsonl", fields: Optional[List[str]] = None,
+                     cursor: str = "default", compress: bool = False,
+                     filename: Optional[str] = None) -> Optional[str]:
+        """
+        Export only the stores added, changed or removed since the previous
+        delta export with the same cursor name, with a leading 'change'
+        column. The first run for a cursor exports every store as 'added'.
+        The watermark (last store change event id) is saved only once the
+        file is complete. Returns the filename, or None if nothing changed.
+        """
+        fields = self._check_record_args(fmt, fields)
+        cursor_name = f"export:{cursor}"
+        after_id = data_manager.get_sync_cursor(cursor_name)
+        # Captured before reading: later changes are picked up by the next run
+        until_id = data_manager.get_last_event_id()
+
+        if after_id is None:
+            changes = (DeltaRow('added', *row) for row in data_manager.iter_export_rows())
+        elif until_id <= after_id:
+            return None
+        else:
+            changes = data_manager.iter_store_changes(after_id, until_id)
+
+        columns = ['change'] + fields
+        with self._open_record_file("stores_delta", fmt, compress, filename) as (filename, f):
+            count = self._write_rows(f, fmt, columns, (self._values(row, columns) for row in changes))
+
+        data_manager.set_sync_cursor(cursor_name, until_id)
+        log.info('delta_exported', cursor=cursor, stores=count, after_event=after_id or 0, until_event=until_id,
+                 filename=filename)
+        return filename
+
+    @staticmethod
+    def _check_record_args(fmt: str, fields: Optional[List[str]]) -> List[str]:
+        """Validate format and field names for CSV / JSON Lines exports"""
+        if fmt not in RECORD_FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}'. Use csv or jsonl.")
+        fields = list(fields or DEFAULT_RECORD_FIELDS)
+        unknown = [field for field in fields if field not in RECORD_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown export fields: {', '.join(unknown)}. Available: {', '.join(RECORD_FIELDS)}")
+        return fields
+
+    def _open_record_file(self, prefix: str, fmt: str, compress: bool, filename: Optional[str] = None):
+        """Open the given path (.gz compresses) or a timestamped file in the export dir"""
+        if filename:
+            if filename.endswith('.gz'):
+                filename, compress = filename[:-3], True
+            return self._open_export(filename, compress, directory='')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return self._open_export(f"{prefix}_{timestamp}.{RECORD_FORMATS[fmt]}", compress)
+
+    def write_records(self, f: TextIO, data_manager, fmt: str, fields: List[str],
+                      statuses: Optional[List[str]] = None, progress: Optional[ProgressCallback] = None) -> int:
+        """Stream records to an open text file. Returns the number of rows written"""
+        rows = self.iter_records(data_manager, fields, statuses)
+        if progress:
+            counts = data_manager.get_status_counts()
+            total = sum(counts.get(status, 0) for status in statuses) if statuses else sum(counts.values())
+            counter = _RowCounter(progress, total)
+            rows = counter.track(rows)
+        count = self._write_rows(f, fmt, fields, rows)
+        if progress:
+            counter.finish()
+        return count
+
+    @staticmethod
+    def _write_rows(f: TextIO, fmt: str, columns: List[str], rows: Iterator[List[Any]]) -> int:
+        """Write a header (CSV) and rows as CSV or JSON Lines. Returns the row count"""
+        count = 0
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def iter_records(self, data_manager, fields: List[str],
+                     statuses: Optional[List[str]] = None) -> Iterator[List[Any]]:
+        """Yield one list of field values per store, ordered by URL"""
+        # The latest-check join is only paid for when those columns are asked for
+        if any(field.startswith('last_') and field != 'last_check' for field in fields):
+            stores = data_manager.iter_export_rows(statuses=statuses)
+        else:
+            stores = data_manager.iter_stores(statuses=statuses)
+
+        for store in stores:
+            yield self._values(store, fields)
+
+    @staticmethod
+    def _values(store, fields: List[str]) -> List[Any]:
+        """Field values of a store row, timestamps as ISO strings"""
+        row = []
+        for field in fields:
+            value = getattr(store, field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            row.append(value)
+        return row
+
+    @staticmethod
+    def _format_timestamp(value, length: int) -> str:
+        """Format a datetime or ISO string timestamp, truncated to length"""
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return value[:length]
+
     def export_simple_list(self, urls: List[str], filename_prefix: str) -> str:
         """Export simple list of URLs"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -136,3 +343,13 @@ class ExportManager:
                 f.write(f"{url}\n")
         
         return filename
+
+    def export_columnar(self, data_manager, table: str = "check_history", fmt: str = "parquet",
+                        incremental: bool = True) -> str:
+        """
+        Export stores or check_history as Parquet/Arrow for analytics.
+        Returns the filename, or None when there is nothing new to export.
+        """
+        from utils.columnar_export import ColumnarExporter
+        exporter = ColumnarExporter(os.path.join(self.export_dir, "columnar"))
+        return exporter.export(data_manager, table, fmt=fmt, incremental=incremental)
@@ -35,6 +35,18 @@ TRANSLATIONS = {
         'interval': 'Khoảng thời gian (phút):',
         'scheduler_running': '✅ Đang chạy - Kiểm tra tiếp theo lúc {time}',
         'scheduler_stopped': '⏸️ Lịch đã dừng',
+        'check_in_progress': '⏳ Một lượt kiểm tra khác đang chạy, vui lòng đợi',
+        'scheduled_jobs': '📋 Các Tác Vụ Theo Lịch',
+        'job_next_run': 'Lần chạy tới',
+        'job_last_run': 'Lần chạy trước',
+        'recent_runs': '📈 Các Lượt Kiểm Tra Gần Đây',
+        'run_started': 'Bắt đầu',
+        'run_kind': 'Loại',
+        'run_checked': 'Đã kiểm tra',
+        'run_duration': 'Thời gian',
+        'run_slowest_stage': 'Tốn thời gian nhất',
+        'run_profile': 'Báo cáo profile',
+        'no_runs': 'Chưa có lượt kiểm tra nào',
 
         # Telegram
         'telegram': '📱 Thông Báo Telegram',
@@ -53,8 +65,15 @@ TRANSLATIONS = {
         'dead_only': 'Chỉ DEAD',
         'unpaid_only': 'Chỉ UNPAID',
         'download_export': 'Tải Xuất Dữ Liệu',
+        'export_gzip': 'Nén gzip (.gz)',
+        'csv_export': 'CSV',
+        'jsonl_export': 'JSON Lines',
+        'export_fields': 'Cột xuất:',
         'exporting': '📤 Đang xuất dữ liệu...',
         'export_success': '✅ Xuất dữ liệu thành công: {type}',
+        'export_cached': '⚡ Dữ liệu không đổi - dùng lại file đã xuất: {type}',
+        'export_progress': '📤 Đang xuất... {done:,}/{total:,}',
+        'export_failed': '❌ Xuất dữ liệu thất bại: {error}',
 
         # Delete
         'delete_links': '🗑️ Xóa Links',
@@ -179,6 +198,18 @@ TRANSLATIONS = {
         'interval': 'Interval (min):',
         'scheduler_running': '✅ Running - Next check at {time}',
         'scheduler_stopped': '⏸️ Scheduler stopped',
+        'check_in_progress': '⏳ Another check pass is already running, please wait',
+        'scheduled_jobs': '📋 Scheduled Jobs',
+        'job_next_run': 'Next run',
+        'job_last_run': 'Last run',
+        'recent_runs': '📈 Recent Check Runs',
+        'run_started': 'Started',
+        'run_kind': 'Kind',
+        'run_checked': 'Checked',
+        'run_duration': 'Duration',
+        'run_slowest_stage': 'Slowest stage',
+        'run_profile': 'Profile report',
+        'no_runs': 'No check runs yet',
 
         # Telegram
         'telegram': '📱 Telegram Notifications',
@@ -197,8 +228,15 @@ TRANSLATIONS = {
         'dead_only': 'DEAD Only',
         'unpaid_only': 'UNPAID Only',
         'download_export': 'Download Export',
+        'export_gzip': 'Compress with gzip (.gz)',
+        'csv_export': 'CSV',
+        'jsonl_export': 'JSON Lines',
+        'export_fields': 'Columns:',
         'exporting': '📤 Exporting data...',
         'export_success': '✅ Export successful: {type}',
+        'export_cached': '⚡ Data unchanged - reusing the previous export: {type}',
+        'export_progress': '📤 Exporting... {done:,}/{total:,}',
+        'export_failed': '❌ Export failed: {error}',
 
         # Delete
         'delete_links': '🗑️ Delete Links',
@@ -2,10 +2,18 @@ import requests
 import time
 import random
 import os
-from typing import Dict, Any, List, Optional
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
 from urllib.parse import urlparse
 from datetime import datetime
 import pytz
+from utils.metrics import CHECKS, CHECK_REQUEST_SECONDS, PROXY_FAILURES
+from utils.structured_log import get_logger
+
+_log = get_logger('shopify.checker')
+# Per-check lines: sampled debug output, and errors at most LOG_MAX_PER_SECOND
+_sampled_log = _log.sampled()
+_error_log = _log.sampled(rate=1.0)
 
 class ShopifyChecker:
     """Handle Shopify store status checking with proxy support (HTTP/HTTPS/SOCKS5) and enhanced reliability"""
@@ -29,6 +37,12 @@ class ShopifyChecker:
         })
         self.timeout = 10
         self.retry_delay = 2
+
+        # Seconds per stage (delay, connect, read, classify) of the last check, for RunMetrics
+        self.last_timings: Dict[str, float] = {}
+        # Final HTTP status (None without a response) and request seconds of the last check
+        self.last_status_code: Optional[int] = None
+        self.last_response_time: Optional[float] = None
         
         # Proxy configuration
         self.proxies_list = self._load_proxies()
@@ -219,24 +233,21 @@ class ShopifyChecker:
             'Accept-Language': language_map.get(random_tz_name, 'en-US,en;q=0.9')
         })
         
-        # Debug log to verify randomization
-        print(f"🎲 Random TZ: {random_tz_name} | Local: {hour}:00 | ", end="")
-        
         # Determine delay based on this random timezone's local time
         if 9 <= hour <= 17:
             # Peak business hours in this timezone
-            multiplier = random.uniform(2.0, 2.5)
-            print(f"Peak Hours → {multiplier:.2f}x delay")
-            return multiplier
+            period, multiplier = 'peak', random.uniform(2.0, 2.5)
         elif hour < 8 or hour > 22:
             # Off-peak hours (night/early morning)
-            print(f"Off-Peak → 1.0x delay")
-            return 1.0
+            period, multiplier = 'off_peak', 1.0
         else:
             # Normal hours
-            multiplier = random.uniform(1.3, 1.7)
-            print(f"Normal Hours → {multiplier:.2f}x delay")
-            return multiplier
+            period, multiplier = 'normal', random.uniform(1.3, 1.7)
+
+        # Sampled debug log to verify randomization
+        _sampled_log.debug('delay_timezone', timezone=random_tz_name, local_hour=hour,
+                           period=period, multiplier=round(multiplier, 2))
+        return multiplier
     
     def _get_last_checked_timezone(self) -> str:
         """Get the timezone that was used for the last check"""
@@ -267,13 +278,37 @@ class ShopifyChecker:
         
         time.sleep(final_delay)
 
+    @contextmanager
+    def _timed(self, stage: str) -> Iterator[None]:
+        """Add the time spent in a block to last_timings, even if it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last_timings[stage] += time.perf_counter() - started
+
     def check_store_status(self, url: str) -> tuple[str, str]:
         """
         Check the status of a Shopify store with proxy support (HTTP/HTTPS/SOCKS5)
         Returns: (status, timezone_checked) tuple
         status: LIVE, DEAD, UNPAID, or UNKNOWN
         timezone_checked: US timezone used for this check
+        Time spent per stage is left in last_timings, the HTTP status and
+        request time (connect + read) in last_status_code / last_response_time.
         """
+        status, checked_timezone = self._check_store_status(url)
+        CHECKS.inc(verdict=status.split(' ')[0])
+        request_seconds = self.last_timings['connect'] + self.last_timings['read']
+        self.last_response_time = round(request_seconds, 3) if request_seconds else None
+        if request_seconds:
+            CHECK_REQUEST_SECONDS.observe(request_seconds)
+        return status, checked_timezone
+
+    def _check_store_status(self, url: str) -> tuple[str, str]:
+        """One check (see check_store_status), without metrics"""
+        self.last_timings = {'delay': 0.0, 'connect': 0.0, 'read': 0.0, 'classify': 0.0}
+        self.last_status_code = None
+        checked_timezone = None
         try:
             # Ensure URL has proper format
             if not url.startswith('http'):
@@ -283,71 +318,46 @@ class ShopifyChecker:
             proxy = self._get_next_proxy()
             
             # Random delay BEFORE making request (this also randomly picks timezone)
-            self._random_delay()
+            with self._timed('delay'):
+                self._random_delay()
             
             # Get the timezone that was just used for delay calculation
             checked_timezone = self._get_last_checked_timezone()
             
-            # Make request with timeout and optional proxy
-            response = self.session.get(
-                url, 
-                timeout=self.timeout,
-                proxies=proxy,
-                allow_redirects=True
-            )
-            html_content = response.text.lower()
-            status_code = response.status_code
-            
-            # Check response status and content
-            if status_code == 200:
-                # Check for specific Shopify messages
-                unpaid_indicators = [
-                    "sorry, this store is currently unavailable",
-                    "this store is unavailable", 
-                    "store is temporarily unavailable",
-                    "this shop is currently unavailable"
-                ]
-                
-                if any(indicator in html_content for indicator in unpaid_indicators):
-                    return ("UNPAID", checked_timezone)
-                
-                # Check if it's a valid Shopify store page
-                shopify_indicators = [
-                    "shopify",
-                    "powered by shopify",
-                    "cdn.shopify.com",
-                    "shop.js"
-                ]
-                
-                if any(indicator in html_content for indicator in shopify_indicators):
-                    return ("LIVE", checked_timezone)
-                else:
-                    # Might be a redirect or different content
-                    return ("LIVE", checked_timezone)
+            # Make request with timeout and optional proxy; streamed so the
+            # header wait (connect) and body download (read) are timed apart
+            with self._timed('connect'):
+                response = self.session.get(
+                    url, 
+                    timeout=self.timeout,
+                    proxies=proxy,
+                    allow_redirects=True,
+                    stream=True
+                )
+            self.last_status_code = response.status_code
+            try:
+                with self._timed('read'):
+                    response.content  # downloads and caches the body
+            finally:
+                response.close()
             
-            elif status_code == 404:
-                return ("DEAD", checked_timezone)
-            elif status_code == 403:
-                return ("UNPAID", checked_timezone)
-            elif status_code >= 500:
-                # Server error - might be temporary
-                return ("UNKNOWN", checked_timezone)
-            else:
-                return (f"UNKNOWN ({status_code})", checked_timezone)
+            with self._timed('classify'):
+                return (self._analyze_response(response), checked_timezone)
                 
         except requests.exceptions.ProxyError as e:
             # Proxy failed - return UNKNOWN instead of DEAD
-            print(f"⚠️ Proxy error for {url[:50]}: {e}")
+            _error_log.warning('proxy_error', url=url, error=str(e))
+            PROXY_FAILURES.inc()
             return ("UNKNOWN (Proxy Failed)", checked_timezone)
         except requests.exceptions.Timeout:
             return ("DEAD", checked_timezone)
         except requests.exceptions.ConnectionError:
             return ("DEAD", checked_timezone)
         except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")
+            _error_log.warning('request_error', url=url, error=str(e))
             return ("DEAD", checked_timezone)
         except Exception as e:
-            print(f"Unknown error: {e}")
+            _error_log.warning('check_error', url=url, error=repr(e))
             return ("UNKNOWN", checked_timezone)
     
     def _analyze_response(self, response) -> str:
@@ -0,0 +1,321 @@
+import math
+import os
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Callable, Tuple
+import pytz
+from utils.structured_log import get_logger
+
+log = get_logger('shopify.metrics')
+# Collector failures repeat on every scrape; rate-limit them
+scrape_log = log.sampled(rate=1.0)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    """Label value escaped for the text exposition format"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    """Named metric with optional labels; values are kept per label combination"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Export unlabelled metrics as zero before their first event
+            self._values[()] = self._zero()
+
+    def _zero(self) -> Any:
+        return 0.0
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def samples(self) -> Iterator[str]:
+        """Sample lines in the text format"""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{self._labels(key)} {_format_value(value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets (cumulative, plus _sum and _count)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames)
+
+    def _zero(self) -> Any:
+        return [0] * len(self.buckets), 0.0
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or self._zero()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in values:
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{self._labels(key, {'le': _format_value(bound)})} {count}"
+            yield f"{self.name}_sum{self._labels(key)} {_format_value(total)}"
+            yield f"{self.name}_count{self._labels(key)} {counts[-1]}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics plus collectors: callables returning metrics
+    built fresh at scrape time (e.g. gauges read from storage).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                scrape_log.warning('collector_failed', collector=getattr(collector, '__name__', repr(collector)),
+                                   error=str(e))
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Instrumented where the work happens (checker, run metrics, notification sinks)
+CHECKS = REGISTRY.counter('shopify_checks_total', 'Store checks by verdict', ['verdict'])
+CHECK_REQUEST_SECONDS = REGISTRY.histogram(
+    'shopify_check_request_seconds', 'HTTP request time of a store check (connect and body read)',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0))
+PROXY_FAILURES = REGISTRY.counter('shopify_proxy_failures_total', 'Store checks that failed on the proxy')
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    'shopify_db_write_seconds', 'Time to record one check result in storage',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+NOTIFICATIONS_DELIVERED = REGISTRY.counter(
+    'shopify_notifications_delivered_total', 'Status changes delivered, by sink', ['sink'])
+NOTIFICATION_FAILURES = REGISTRY.counter(
+    'shopify_notification_failures_total', 'Failed notification delivery attempts, by sink', ['sink'])
+NOTIFICATIONS_DEAD_LETTERED = REGISTRY.counter(
+    'shopify_notifications_dead_lettered_total',
+    'Status changes saved to the dead-letter file after exhausting retries, by sink', ['sink'])
+NOTIFICATIONS_DROPPED = REGISTRY.counter(
+    'shopify_notifications_dropped_total',
+    'Status changes neither delivered nor dead-lettered (sent again on the next poll), by sink', ['sink'])
+
+
+def storage_collector(storage) -> Callable[[], List[_Metric]]:
+    """
+    Collector of gauges read from storage at scrape time: stores by status,
+    scheduler lag and job timings, and throughput / ETA of the latest runs.
+    Works in any process, so a standalone exporter sees the same values.
+    """
+
+    def collect_storage() -> List[_Metric]:
+        now = datetime.now(pytz.UTC)
+        stores = Gauge('shopify_stores', 'Stores by current status', ['status'])
+        for status, count in storage.get_status_counts().items():
+            stores.set(count, status=status)
+
+        scheduler = storage.get_scheduler_state('scheduler')
+        enabled = Gauge('shopify_scheduler_enabled', 'Whether scheduled jobs are enabled')
+        enabled.set(1 if scheduler.get('enabled') else 0)
+        lag = Gauge('shopify_scheduler_lag_seconds', 'How long a due job has waited to start', ['job'])
+        next_run = Gauge('shopify_scheduler_next_run_seconds', 'Seconds until the next run of a job', ['job'])
+        running = Gauge('shopify_scheduler_job_running_seconds', 'Run time of the job in progress (0 if idle)', ['job'])
+        duration = Gauge('shopify_scheduler_job_last_duration_seconds', 'Duration of the last finished run', ['job'])
+        success = Gauge('shopify_scheduler_job_last_success', '1 if the last finished run succeeded', ['job'])
+        for job in scheduler.get('jobs') or []:
+            state = storage.get_scheduler_state(job)
+            due = datetime.fromisoformat(state['next_run']) if state.get('next_run') else None
+            if scheduler.get('enabled') and due:
+                lag.set(max((now - due).total_seconds(), 0.0), job=job)
+                next_run.set((due - now).total_seconds(), job=job)
+            started = state.get('last_started')
+            in_progress = state.get('in_progress') and started
+            running.set((now - datetime.fromisoformat(started)).total_seconds() if in_progress else 0.0, job=job)
+            if state.get('last_duration_seconds') is not None:
+                duration.set(state['last_duration_seconds'], job=job)
+            if state.get('last_status'):
+                success.set(1 if state['last_status'] == 'ok' else 0, job=job)
+
+        throughput = Gauge('shopify_check_run_urls_per_second', 'Throughput of the latest run, by kind', ['kind'])
+        eta = Gauge('shopify_check_run_eta_seconds', 'Estimated time left of a running pass, by kind', ['kind'])
+        seen = set()
+        for run in storage.get_check_runs(50):
+            if run['kind'] in seen:
+                continue
+            seen.add(run['kind'])
+            rate = run['urls_per_second'] or 0.0
+            throughput.set(rate, kind=run['kind'])
+            if run['status'] == 'running' and rate:
+                eta.set(max((run['total'] or 0) - (run['checked'] or 0), 0) / rate, kind=run['kind'])
+
+        return [stores, enabled, lag, next_run, running, duration, success, throughput, eta]
+
+    return collect_storage
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Serve a registry on /metrics in the Prometheus text format"""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 9108, registry: MetricsRegistry = REGISTRY):
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> 'MetricsServer':
+        """Serve from a daemon thread"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name='metrics-server')
+        self.thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve from the calling thread (standalone exporter)"""
+        self.httpd.serve_forever()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_server: Optional[MetricsServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(storage=None) -> Optional[MetricsServer]:
+    """
+    Start the process-wide exporter thread on METRICS_PORT (disabled when
+    unset), with storage gauges from the given backend (the one the app
+    writes through) or else the configured one.
+    """
+    global _server
+    port = os.getenv('METRICS_PORT')
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            if storage is None:
+                from utils.storage import get_storage_backend
+                storage = get_storage_backend()
+            try:
+                _server = MetricsServer(os.getenv('METRICS_HOST', '0.0.0.0'), int(port)).start()
+            except OSError as e:
+                log.warning('exporter_not_started', port=port, error=str(e))
+                return None
+            REGISTRY.add_collector(storage_collector(storage))
+            log.info('exporter_listening', url=_server.url)
+        return _server
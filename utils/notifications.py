@@ -0,0 +1,452 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import requests
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional
+from utils.metrics import (
+    REGISTRY, Gauge, NOTIFICATIONS_DELIVERED, NOTIFICATION_FAILURES, NOTIFICATIONS_DEAD_LETTERED,
+    NOTIFICATIONS_DROPPED
+)
+from utils.structured_log import get_logger
+from utils.telegram_notifier import TelegramNotifier
+
+log = get_logger('shopify.notify')
+# Per-batch events (dispatches, retries), rate-limited so a flood of small batches can't flood the log
+batch_log = log.sampled(rate=1.0)
+
+
+class NotificationSink(ABC):
+    """Destination for store status changes ({'url', 'from_status', 'to_status', 'changed_at'})"""
+
+    name = 'sink'
+
+    @abstractmethod
+    def send(self, changes: List[Dict[str, Any]]) -> None:
+        """Deliver a batch of changes; raise to have the dispatcher retry it"""
+
+    def flush(self, timeout: float) -> bool:
+        """Wait for anything the sink buffers internally"""
+        return True
+
+
+class TelegramSink(NotificationSink):
+    """
+    Telegram chat. Batches are sent synchronously (not through the
+    notifier's coalescing queue), so a batch only counts as delivered once
+    Telegram accepted it; failures raise for the dispatcher to retry or
+    dead-letter.
+    """
+
+    name = 'telegram'
+
+    def __init__(self, notifier: Optional[TelegramNotifier] = None):
+        self.notifier = notifier or TelegramNotifier()
+
+    def send(self, changes: List[Dict[str, Any]]) -> None:
+        self.notifier.deliver_status_changes(changes)
+
+
+class WebhookSink(NotificationSink):
+    """POST each batch as JSON ({"changes": [...], "sent_at": ...}) to an HTTP endpoint"""
+
+    name = 'webhook'
+
+    def __init__(self, url: str, timeout: float = 10.0, token: Optional[str] = None):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def send(self, changes: List[Dict[str, Any]]) -> None:
+        response = self.session.post(self.url, json={
+            'changes': changes,
+            'sent_at': datetime.now().isoformat()
+        }, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class JsonlFileSink(NotificationSink):
+    """Append one JSON line per change to a local file"""
+
+    name = 'file'
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def send(self, changes: List[Dict[str, Any]]) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(change, ensure_ascii=False, default=str) + '\n' for change in changes)
+
+
+class _SinkWorker:
+    """
+    Queue and thread for one sink. Queued batches are merged up to
+    max_batch changes per send; a failed send is retried with exponential
+    backoff, blocking only this sink. A batch still failing after
+    max_retries goes to the dead_letter file (one JSON line per batch).
+    After each batch on_done gets the change-event id it covers and whether
+    it was delivered or dead-lettered.
+    """
+
+    def __init__(self, sink: NotificationSink, max_retries: int, max_batch: int,
+                 on_done: Optional[Callable[['_SinkWorker', int, bool], None]] = None,
+                 dead_letter: Optional[str] = None):
+        self.sink = sink
+        self.max_retries = max_retries
+        self.max_batch = max_batch
+        self.on_done = on_done
+        self.dead_letter = dead_letter
+        self.queue: "queue.Queue" = queue.Queue()
+        self.stats = {'delivered': 0, 'batches': 0, 'retries': 0, 'dead_lettered': 0, 'dropped': 0}
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"notify-{sink.name}")
+        self._thread.start()
+
+    def put(self, changes: List[Dict[str, Any]], until_id: Optional[int] = None) -> None:
+        """Queue a batch covering change events up to until_id; returns immediately"""
+        self.queue.put((changes, until_id))
+
+    def _take_batch(self) -> tuple:
+        """
+        Block for one queued batch, then merge whatever else is waiting.
+        Returns (changes, newest until_id, queue items)
+        """
+        changes, until_id = self.queue.get()
+        changes = list(changes)
+        taken = 1
+        while len(changes) < self.max_batch:
+            try:
+                more, more_until = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            changes.extend(more)
+            until_id = more_until if more_until is not None else until_id
+            taken += 1
+        return changes, until_id, taken
+
+    def _run(self):
+        while True:
+            changes, until_id, taken = self._take_batch()
+            try:
+                delivered = self._deliver(changes) if changes else True
+                if self.on_done and until_id is not None:
+                    self.on_done(self, until_id, delivered)
+            except Exception as e:
+                log.exception('sink_worker_error', sink=self.sink.name, error=str(e))
+            finally:
+                for _ in range(taken):
+                    self.queue.task_done()
+
+    def _deliver(self, changes: List[Dict[str, Any]]) -> bool:
+        """Send with retries, then dead-letter; False if the batch could not be kept anywhere"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.send(changes)
+                self.stats['delivered'] += len(changes)
+                self.stats['batches'] += 1
+                NOTIFICATIONS_DELIVERED.inc(len(changes), sink=self.sink.name)
+                return True
+            except Exception as e:
+                NOTIFICATION_FAILURES.inc(sink=self.sink.name)
+                if attempt == self.max_retries:
+                    return self._write_dead_letter(changes, e)
+                delay = min(2 ** attempt, 60) + random.uniform(0, 0.5)
+                self.stats['retries'] += 1
+                batch_log.warning('sink_retry', sink=self.sink.name, error=str(e), attempt=attempt + 1,
+                                  delay_seconds=round(delay, 1))
+                time.sleep(delay)
+        return False
+
+    def _write_dead_letter(self, changes: List[Dict[str, Any]], error: Exception) -> bool:
+        """Append a batch the sink rejected to the dead-letter file; False if that fails too"""
+        if self.dead_letter:
+            try:
+                directory = os.path.dirname(self.dead_letter)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.dead_letter, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({
+                        'sink': self.sink.name,
+                        'failed_at': datetime.now().isoformat(),
+                        'error': str(error),
+                        'changes': changes
+                    }, ensure_ascii=False, default=str) + '\n')
+                log.error('sink_dead_lettered', sink=self.sink.name, count=len(changes), error=str(error),
+                          path=self.dead_letter)
+                self.stats['dead_lettered'] += len(changes)
+                NOTIFICATIONS_DEAD_LETTERED.inc(len(changes), sink=self.sink.name)
+                return True
+            except OSError as e:
+                log.error('dead_letter_write_failed', sink=self.sink.name, path=self.dead_letter, error=str(e))
+        log.error('sink_dropped', sink=self.sink.name, count=len(changes), error=str(error))
+        self.stats['dropped'] += len(changes)
+        NOTIFICATIONS_DROPPED.inc(len(changes), sink=self.sink.name)
+        return False
+
+    def join(self, timeout: float) -> bool:
+        """Wait until the queue is drained; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return self.sink.flush(max(deadline - time.monotonic(), 0))
+
+
+class NotificationDispatcher:
+    """
+    Fan store status changes out to every configured sink.
+
+    Each sink has its own queue and worker thread, so a slow or failing sink
+    never delays the others or the check loop. notify_new_events() reads new
+    transitions from the store change log and dispatches them to all sinks.
+    Every sink has its own persisted cursor (notify:<sink>), moved only past
+    transitions it delivered or dead-lettered, so a restart resends to each
+    sink exactly what it is missing. Only one process at a time (the holder
+    of NOTIFY_LOCK) reads the log, so a second app process never doubles a
+    range.
+    """
+
+    # Change-event watermark every sink has reached (see StorageBackend.get_sync_cursor)
+    NOTIFY_CURSOR = 'notify:dispatch'
+    # Leader lock held while this process has transitions in flight
+    NOTIFY_LOCK = 'notify'
+
+    def __init__(self, sinks: List[NotificationSink]):
+        max_retries = int(os.getenv('NOTIFY_MAX_RETRIES', '5'))
+        max_batch = int(os.getenv('NOTIFY_MAX_BATCH', '1000'))
+        dead_letter = os.getenv('NOTIFY_DEAD_LETTER', 'notifications.failed.jsonl')
+        self.workers = [_SinkWorker(sink, max_retries, max_batch, self._on_delivered, dead_letter)
+                        for sink in sinks]
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        # While the claim is held: storage it came from, newest queued event,
+        # each sink's saved cursor and newest finished event, sinks with a lost batch
+        self._claim = None
+        self._storage = None
+        self._queued_until: Optional[int] = None
+        self._saved: Dict[_SinkWorker, int] = {}
+        self._done_until: Dict[_SinkWorker, int] = {}
+        self._failed: set = set()
+
+    @property
+    def sinks(self) -> List[NotificationSink]:
+        """Configured sinks, in dispatch order"""
+        return [worker.sink for worker in self.workers]
+
+    @staticmethod
+    def sink_cursor(sink: NotificationSink) -> str:
+        """Sync cursor name of one sink's delivered position"""
+        return f"notify:{sink.name}"
+
+    def dispatch(self, changes: List[Dict[str, Any]], until_id: Optional[int] = None) -> None:
+        """
+        Queue a batch of changes (covering change events up to until_id) for
+        every sink, minus changes a sink already has
+        """
+        if not changes and until_id is None:
+            return
+        for worker in self.workers:
+            start = self._saved.get(worker) if until_id is not None else None
+            pending = [change for change in changes if change['id'] > start] if start is not None else changes
+            worker.put(pending, until_id)
+
+    def _take_claim(self, data_manager) -> bool:
+        """Hold NOTIFY_LOCK (caller holds _lock); False if another process is dispatching"""
+        if self._claim is not None:
+            if self._claim.is_held():
+                return True
+            log.warning('notify_lock_lost')
+            self._drop_claim()
+        claim = data_manager.acquire_leader_lock(self.NOTIFY_LOCK)
+        if claim is None:
+            return False
+        self._claim = claim
+        self._storage = data_manager
+        return True
+
+    def _drop_claim(self) -> None:
+        """Release NOTIFY_LOCK and forget the in-flight range (caller holds _lock)"""
+        if self._claim is not None:
+            self._claim.release()
+        self._claim = None
+        self._storage = None
+        self._queued_until = None
+        self._saved = {}
+        self._done_until = {}
+        self._failed = set()
+
+    def _load_cursors(self, storage) -> Optional[int]:
+        """
+        Read each sink's saved cursor (a new sink starts at notify:dispatch)
+        and return the oldest, where reading the log resumes; None if
+        notifications never ran
+        """
+        common = storage.get_sync_cursor(self.NOTIFY_CURSOR)
+        if common is None:
+            return None
+        for worker in self.workers:
+            saved = storage.get_sync_cursor(self.sink_cursor(worker.sink))
+            self._saved[worker] = common if saved is None else saved
+        self._done_until = dict(self._saved)
+        return min(self._saved.values())
+
+    def notify_new_events(self, data_manager, min_interval: float = 0, batch_size: int = 1000) -> int:
+        """
+        Dispatch every status transition recorded in the store change log
+        since the last call. Each sink's cursor advances as it delivers, so
+        transitions still queued when the process dies, or that a sink
+        failed to take, are sent again to that sink only.
+
+        Cost is proportional to the number of new events, and nothing is
+        missed however long a check pass takes. The first call only sets the
+        cursor, so enabling notifications doesn't replay old history. With
+        min_interval, calls within that many seconds of the previous poll
+        return immediately, so this can be called per checked store. While
+        another process is dispatching this returns 0 and leaves the new
+        events to it (it reads the log again once its sinks catch up).
+        Returns the number of transitions dispatched.
+        """
+        if not self.workers:
+            return 0
+        now = time.monotonic()
+        if min_interval and now - self._last_poll < min_interval:
+            return 0
+        self._last_poll = now
+
+        with self._lock:
+            if not self._take_claim(data_manager):
+                return 0
+            storage = self._storage
+            position = self._queued_until
+            if position is None:
+                position = self._load_cursors(storage)
+            until_id = storage.get_last_event_id()
+            if position is None:
+                storage.set_sync_cursor(self.NOTIFY_CURSOR, until_id)
+                log.info('notifications_started', after_event=until_id)
+                self._drop_claim()
+                return 0
+            if until_id <= position:
+                if self._queued_until is None:
+                    self._drop_claim()
+                return 0
+            self._queued_until = until_id
+
+            dispatched = 0
+            batch = []
+            for change in storage.iter_status_changes(position, until_id, batch_size):
+                batch.append(change)
+                if len(batch) >= batch_size:
+                    self.dispatch(batch, change['id'])
+                    dispatched += len(batch)
+                    batch = []
+            # The last batch (possibly empty) carries until_id, so skipped non-transition events are covered
+            self.dispatch(batch, until_id)
+            dispatched += len(batch)
+
+        if dispatched:
+            batch_log.info('notifications_dispatched', count=dispatched, first_event=position + 1,
+                           last_event=until_id, sinks=','.join(sink.name for sink in self.sinks))
+        return dispatched
+
+    def _on_delivered(self, worker: _SinkWorker, until_id: int, delivered: bool) -> None:
+        """
+        A sink finished the batch up to until_id: save its cursor, and
+        notify:dispatch as the position every sink has reached. A batch
+        that could not even be dead-lettered stops that sink's cursor, so
+        the sink gets the range again on the next claim.
+        """
+        caught_up = False
+        with self._lock:
+            if self._claim is None or worker not in self._done_until:
+                return
+            self._done_until[worker] = max(self._done_until[worker], until_id)
+            if not delivered:
+                self._failed.add(worker)
+            elif worker not in self._failed and until_id > self._saved[worker]:
+                self._storage.set_sync_cursor(self.sink_cursor(worker.sink), until_id)
+                self._saved[worker] = until_id
+                self._storage.set_sync_cursor(self.NOTIFY_CURSOR, min(self._saved.values()))
+            if min(self._done_until.values()) >= self._queued_until:
+                storage = self._storage
+                caught_up = not self._failed
+                self._drop_claim()
+        if caught_up:
+            # Pick up events other processes recorded while we held the lock
+            self.notify_new_events(storage)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait for every sink to deliver its queue; False if any timed out"""
+        deadline = time.monotonic() + timeout
+        drained = True
+        for worker in self.workers:
+            drained = worker.join(max(deadline - time.monotonic(), 0)) and drained
+        return drained
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-sink delivery counters"""
+        return {
+            worker.sink.name: dict(worker.stats, pending=worker.queue.unfinished_tasks)
+            for worker in self.workers
+        }
+
+
+def build_sinks() -> List[NotificationSink]:
+    """
+    Sinks named in NOTIFY_SINKS (comma-separated: telegram, webhook, file;
+    default telegram). Sinks missing their configuration are skipped.
+    """
+    sinks: List[NotificationSink] = []
+    for name in os.getenv('NOTIFY_SINKS', 'telegram').split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name == 'telegram':
+            notifier = TelegramNotifier()
+            if notifier.enabled:
+                sinks.append(TelegramSink(notifier))
+        elif name == 'webhook':
+            url = os.getenv('NOTIFY_WEBHOOK_URL')
+            if url:
+                sinks.append(WebhookSink(url, token=os.getenv('NOTIFY_WEBHOOK_TOKEN')))
+            else:
+                log.warning('sink_disabled', sink='webhook', reason='NOTIFY_WEBHOOK_URL not set')
+        elif name == 'file':
+            sinks.append(JsonlFileSink(os.getenv('NOTIFY_FILE', 'notifications.jsonl')))
+        else:
+            log.warning('sink_unknown', sink=name)
+    return sinks
+
+
+_dispatcher: Optional[NotificationDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_notification_dispatcher() -> NotificationDispatcher:
+    """Process-wide dispatcher, shared by the scheduler thread and every Streamlit session"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher(build_sinks())
+        return _dispatcher
+
+
+def _collect_queue_depth() -> List[Gauge]:
+    """Metrics collector: changes waiting in each sink's queue"""
+    depth = Gauge('shopify_notification_queue_depth', 'Notification batches waiting per sink', ['sink'])
+    if _dispatcher is not None:
+        for worker in _dispatcher.workers:
+            depth.set(worker.queue.unfinished_tasks, sink=worker.sink.name)
+    return [depth]
+
+
+REGISTRY.add_collector(_collect_queue_depth)
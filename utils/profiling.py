@@ -0,0 +1,224 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, Optional, Iterator, Callable
+from utils.structured_log import get_logger
+
+PROFILE_MODES = ('cprofile', 'sample')
+# Rows of the cProfile / sampler tables in the text report
+PROFILE_REPORT_LINES = int(os.getenv('PROFILE_REPORT_LINES', '40'))
+
+log = get_logger('shopify.profile')
+
+
+class FunctionStats:
+    """Calls and wall / CPU seconds of one instrumented function"""
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.max_wall = 0.0
+
+    def add(self, wall: float, cpu: float) -> None:
+        self.calls += 1
+        self.wall += wall
+        self.cpu += cpu
+        self.max_wall = max(self.max_wall, wall)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'wall_seconds': round(self.wall, 4),
+            'cpu_seconds': round(self.cpu, 4),
+            'max_wall_seconds': round(self.max_wall, 4)
+        }
+
+
+class RunProfiler:
+    """
+    Profile of one check pass, taken over its first max_checks checks
+    (0 = every check) so production runs only pay for a sample.
+
+    Modes: 'cprofile' (deterministic, every Python call) or 'sample' (the
+    checking thread's stack every PROFILE_SAMPLE_INTERVAL seconds, cheap
+    enough for long runs; shows where wall time goes, network waits
+    included). Functions passed to instrument() also get wall and CPU
+    totals. finish() writes PROFILE_DIR/<run id>.txt, plus <run id>.prof
+    (pstats / snakeviz) or <run id>.folded (flame graph input), and returns
+    the summary stored with the run in check_runs.
+    """
+
+    def __init__(self, run_id: str, kind: str, mode: str, max_checks: int = 0,
+                 directory: Optional[str] = None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'. Use {' or '.join(PROFILE_MODES)}.")
+        self.run_id = run_id
+        self.kind = kind
+        self.mode = mode
+        self.max_checks = max_checks
+        self.directory = directory or os.getenv('PROFILE_DIR', 'profiles')
+        self.interval = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+        self.checks = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.functions: Dict[str, FunctionStats] = {}
+        self._active = False
+        self._thread_id: Optional[int] = None
+        self._cprofile = cProfile.Profile() if mode == 'cprofile' else None
+        self._stacks: Counter = Counter()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._patched = []
+
+    @contextmanager
+    def check(self) -> Iterator[None]:
+        """Profile the block (one store's checks and write) while the sample isn't full"""
+        if self._active or (self.max_checks and self.checks >= self.max_checks):
+            yield
+            return
+        self.checks += 1
+        self._thread_id = threading.get_ident()
+        self._start_collector()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        self._active = True
+        try:
+            yield
+        finally:
+            self._active = False
+            if self._cprofile:
+                self._cprofile.disable()
+            self.wall += time.perf_counter() - wall
+            self.cpu += time.thread_time() - cpu
+
+    def _start_collector(self) -> None:
+        """Enable cProfile for this check, or make sure the sampler thread runs"""
+        if self._cprofile:
+            try:
+                self._cprofile.enable()
+                return
+            except ValueError as e:
+                # Another profiler owns the interpreter's profiling hook
+                log.warning('cprofile_unavailable', error=str(e), fallback='sample')
+                self._cprofile = None
+                self.mode = 'sample'
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True, name='profile-sampler')
+            self._sampler.start()
+
+    def _sample_loop(self) -> None:
+        """Count the checking thread's stacks (root first) while a check is profiled"""
+        while not self._stop.wait(self.interval):
+            if not self._active:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self._stacks[tuple(reversed(stack))] += 1
+
+    def instrument(self, obj: Any, *names: str) -> None:
+        """Time obj.<name>() calls made in profiled checks (wall and CPU), until finish()"""
+        for name in names:
+            label = f"{type(obj).__name__}.{name}"
+            self._patched.append((obj, name, obj.__dict__.get(name)))
+            setattr(obj, name, self._timed(self.functions.setdefault(label, FunctionStats()), getattr(obj, name)))
+
+    def _timed(self, stats: FunctionStats, func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self._active or threading.get_ident() != self._thread_id:
+                return func(*args, **kwargs)
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add(time.perf_counter() - wall, time.thread_time() - cpu)
+        return wrapper
+
+    def report(self) -> str:
+        """Text report: function timings, then the cProfile or sampler tables"""
+        lines = [
+            f"Profile of run {self.run_id} ({self.kind}): {self.mode}, {self.checks} checks, "
+            f"{self.wall:.2f}s wall, {self.cpu:.2f}s CPU",
+            '',
+            f"{'function':<40}{'calls':>8}{'wall s':>11}{'wall avg':>11}{'wall max':>11}{'cpu s':>11}{'cpu avg':>11}"
+        ]
+        for label, stats in self.functions.items():
+            calls = stats.calls or 1
+            lines.append(f"{label:<40}{stats.calls:>8}{stats.wall:>11.3f}{stats.wall / calls:>11.4f}"
+                         f"{stats.max_wall:>11.4f}{stats.cpu:>11.3f}{stats.cpu / calls:>11.4f}")
+        lines.append('')
+
+        if not self.checks:
+            lines.append('No checks profiled')
+        elif self._cprofile:
+            buffer = io.StringIO()
+            stats = pstats.Stats(self._cprofile, stream=buffer)
+            stats.sort_stats('cumulative').print_stats(PROFILE_REPORT_LINES)
+            stats.sort_stats('tottime').print_stats(PROFILE_REPORT_LINES)
+            lines.append(buffer.getvalue())
+        else:
+            total = sum(self._stacks.values())
+            own: Counter = Counter()
+            inclusive: Counter = Counter()
+            for stack, count in self._stacks.items():
+                own[stack[-1]] += count
+                for frame in set(stack):
+                    inclusive[frame] += count
+            lines.append(f"{total} samples every {self.interval * 1000:g} ms")
+            for title, counter in (('Own time (leaf frame)', own), ('Inclusive time', inclusive)):
+                lines.extend(['', f"{title}:"])
+                for frame, count in counter.most_common(PROFILE_REPORT_LINES):
+                    lines.append(f"{count / total * 100:>7.1f}% {count:>8}  {frame}")
+        return '\n'.join(lines) + '\n'
+
+    def finish(self) -> Dict[str, Any]:
+        """Stop profiling, write the report files and return the run's profile summary"""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        for obj, name, previous in reversed(self._patched):
+            if previous is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, previous)
+        self._patched = []
+
+        summary = {
+            'mode': self.mode,
+            'checks': self.checks,
+            'wall_seconds': round(self.wall, 3),
+            'cpu_seconds': round(self.cpu, 3),
+            'functions': {label: stats.to_dict() for label, stats in self.functions.items()},
+            'report': None,
+            'data': None
+        }
+        base = os.path.join(self.directory, self.run_id)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+                f.write(self.report())
+            summary['report'] = f"{base}.txt"
+            if self._cprofile:
+                self._cprofile.dump_stats(f"{base}.prof")
+                summary['data'] = f"{base}.prof"
+            else:
+                with open(f"{base}.folded", 'w', encoding='utf-8') as f:
+                    for stack, count in self._stacks.most_common():
+                        f.write(f"{';'.join(stack)} {count}\n")
+                summary['data'] = f"{base}.folded"
+        except OSError as e:
+            log.warning('profile_write_failed', error=str(e))
+        log.info('profile_written', mode=self.mode, checks=self.checks, report=summary['report'])
+        return summary
@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator
+import pytz
+from utils.metrics import DB_WRITE_SECONDS
+from utils.structured_log import get_logger, set_run_id, reset_run_id
+
+log = get_logger('shopify.run')
+
+# Where a check pass spends its time, in pass order
+STAGES = ['delay', 'connect', 'read', 'classify', 'db_write', 'notify']
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Seconds as '1h 05m', '4m 10s' or '12s'"""
+    if seconds is None:
+        return '-'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class RunMetrics:
+    """
+    Throughput, ETA and per-stage timings of one check pass.
+
+    Stages: delay (random and recheck sleeps), connect (request until the
+    response headers: DNS, connect, TLS, redirects and server time), read
+    (body download), classify (status detection), db_write and notify;
+    whatever is left of the wall time is reported as 'other'. The run
+    summary is saved to the check_runs table when the run starts, every
+    RUN_METRICS_SAVE_SECONDS while it runs, and when it ends. Use as a
+    context manager: the run ends 'ok', 'error' on an exception, or
+    'stopped' if the script is interrupted or finish('stopped') was called.
+    Inside the context every log line carries the run id as run_id.
+    """
+
+    def __init__(self, kind: str, total: int, storage=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.total = total
+        self.storage = storage
+        self.save_seconds = float(os.getenv('RUN_METRICS_SAVE_SECONDS', '30'))
+        self.progress_seconds = float(os.getenv('LOG_PROGRESS_SECONDS', '30'))
+        self.started_at = datetime.now(pytz.UTC)
+        self.finished_at: Optional[datetime] = None
+        self.status = 'running'
+        self.error: Optional[str] = None
+        # Profile summary of the run (RunProfiler.finish), if it was profiled
+        self.profile: Optional[Dict[str, Any]] = None
+        self.checked = 0
+        self.status_counts: Counter = Counter()
+        self.stage_seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self._started = time.perf_counter()
+        self._ended: Optional[float] = None
+        self._saved_at = 0.0
+        self._logged_at = time.monotonic()
+        self._log_token = None
+
+    def __enter__(self) -> 'RunMetrics':
+        self._log_token = set_run_id(self.id)
+        log.info('run_started', kind=self.kind, total=self.total)
+        self.save()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        try:
+            if exc_type is None:
+                self.finish('ok')
+            elif issubclass(exc_type, Exception):
+                self.finish('error', str(exc))
+            else:
+                self.finish('stopped')
+        finally:
+            if self._log_token is not None:
+                reset_run_id(self._log_token)
+                self._log_token = None
+        return False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block as part of a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stage_seconds[name] += elapsed
+            if name == 'db_write':
+                DB_WRITE_SECONDS.observe(elapsed)
+
+    def add_timings(self, timings: Dict[str, float]) -> None:
+        """Add stage timings measured elsewhere (ShopifyChecker.last_timings)"""
+        for name, seconds in timings.items():
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def record(self, status: str) -> None:
+        """Count one checked store"""
+        self.checked += 1
+        self.status_counts[status] += 1
+
+    @property
+    def elapsed(self) -> float:
+        """Wall time of the run so far, in seconds"""
+        return (self._ended or time.perf_counter()) - self._started
+
+    @property
+    def urls_per_second(self) -> float:
+        """Stores checked per second"""
+        elapsed = self.elapsed
+        return self.checked / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Estimated seconds until the remaining stores are checked (None before the first one)"""
+        rate = self.urls_per_second
+        if not rate:
+            return None
+        return max(self.total - self.checked, 0) / rate
+
+    def stage_breakdown(self) -> Dict[str, float]:
+        """Seconds per stage, plus 'other' for untracked time"""
+        breakdown = {name: round(seconds, 3) for name, seconds in self.stage_seconds.items()}
+        breakdown['other'] = round(max(self.elapsed - sum(self.stage_seconds.values()), 0.0), 3)
+        return breakdown
+
+    def format_progress(self) -> str:
+        """One-line throughput, ETA and the biggest stages, for progress displays"""
+        elapsed = self.elapsed
+        top = sorted(self.stage_breakdown().items(), key=lambda item: item[1], reverse=True)[:3]
+        shares = ' · '.join(f"{name} {seconds / elapsed * 100:.0f}%" for name, seconds in top if seconds) \
+            if elapsed > 0 else ''
+        line = f"⚡ {self.urls_per_second * 60:.1f} URLs/min · ⏱️ {format_duration(elapsed)} · ETA {format_duration(self.eta_seconds)}"
+        return f"{line} · {shares}" if shares else line
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Run summary, as stored in check_runs"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'total': self.total,
+            'checked': self.checked,
+            'status_counts': dict(self.status_counts),
+            'stage_seconds': self.stage_breakdown(),
+            'urls_per_second': round(self.urls_per_second, 4),
+            'error': self.error,
+            'profile': self.profile
+        }
+
+    def save(self) -> None:
+        """Persist the summary; a failure is logged, never raised into the pass"""
+        self._saved_at = time.monotonic()
+        if self.storage is None:
+            return
+        try:
+            self.storage.save_check_run(self.to_dict())
+        except Exception as e:
+            log.warning('run_save_failed', error=str(e))
+
+    def maybe_save(self) -> None:
+        """
+        Persist the summary if the last save is older than
+        RUN_METRICS_SAVE_SECONDS, and log progress every LOG_PROGRESS_SECONDS
+        """
+        now = time.monotonic()
+        if now - self._logged_at >= self.progress_seconds:
+            self._logged_at = now
+            log.info('run_progress', kind=self.kind, checked=self.checked, total=self.total,
+                     urls_per_minute=round(self.urls_per_second * 60, 1),
+                     eta_seconds=round(self.eta_seconds) if self.eta_seconds is not None else None,
+                     status_counts=dict(self.status_counts))
+        if now - self._saved_at >= self.save_seconds:
+            self.save()
+
+    def finish(self, status: str = 'ok', error: Optional[str] = None) -> None:
+        """End the run and persist its final summary (only the first call counts)"""
+        if self._ended is not None:
+            return
+        self._ended = time.perf_counter()
+        self.finished_at = datetime.now(pytz.UTC)
+        self.status = status
+        self.error = error
+        self.save()
+        log.info('run_finished', kind=self.kind, status=status, checked=self.checked, total=self.total,
+                 seconds=round(self.elapsed, 1), urls_per_minute=round(self.urls_per_second * 60, 1),
+                 status_counts=dict(self.status_counts), stage_seconds=self.stage_breakdown(), error=error)
@@ -1,96 +1,453 @@
-
 import threading
 import time
-from datetime import datetime, timedelta
-from typing import Callable, Optional
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Optional, Dict, Any, Iterator, List
 import os
+import pytz
+from utils.cron import parse_schedule
+from utils.storage import get_storage_backend
+from utils.structured_log import get_logger
+
+log = get_logger('shopify.scheduler')
+
+
+class ScheduledJob:
+    """
+    A named job: callback, schedule (interval or cron expression, see
+    utils.cron.parse_schedule) and how many runs of it may overlap.
+    Exclusive jobs also take the cross-process check-pass lock, so they never
+    run alongside another full pass (scheduled or manual).
+    """
+
+    def __init__(self, name: str, callback: Callable, schedule: str,
+                 max_concurrency: int = 1, exclusive: bool = False, run_on_start: bool = False):
+        self.name = name
+        self.callback = callback
+        # SCHEDULE_<NAME> overrides the default schedule, e.g. SCHEDULE_RECHECK_DEAD="0 */2 * * *"
+        self.schedule = os.getenv(f"SCHEDULE_{name.upper()}", schedule)
+        self.max_concurrency = max(1, max_concurrency)
+        self.exclusive = exclusive
+        self.run_on_start = run_on_start
+        self.running = 0
+
 
 class CheckScheduler:
-    """Handle scheduled automatic checks of stores"""
-    
-    def __init__(self):
-        self.running = False
+    """
+    Process-level scheduler for named jobs (full check pass, rechecks,
+    exports, maintenance), each on its own interval or cron schedule.
+
+    Schedule state (enabled, per-job next run, last result and recent run
+    history) is persisted through the storage backend, so it survives
+    restarts and is shared by every session and process. Only the process
+    holding the scheduler leader lock (a PostgreSQL advisory lock, or a lock
+    file for SQLite / JSON) runs jobs; other processes follow the shared
+    state and take over when the leader goes away. Each run gets its own
+    thread, so a long full pass doesn't delay the short jobs, and a job never
+    has more than its max_concurrency runs in flight.
+    """
+
+    JOB_NAME = 'check'
+    STATE_NAME = 'scheduler'
+    LEADER_LOCK = 'scheduler'
+    PASS_LOCK = 'check-pass'
+
+    def __init__(self, storage=None):
+        self.storage = storage
+        self.default_interval = int(os.getenv('CHECK_INTERVAL_MINUTES', '60'))
+        # How often followers retry the leader lock and schedule changes from other processes are seen
+        self.poll_seconds = float(os.getenv('SCHEDULER_POLL_SECONDS', '30'))
+        # Runs kept in each job's history
+        self.history_size = int(os.getenv('SCHEDULER_HISTORY_SIZE', '20'))
+        self.jobs: Dict[str, ScheduledJob] = {}
         self.thread: Optional[threading.Thread] = None
-        self.check_interval_minutes = int(os.getenv('CHECK_INTERVAL_MINUTES', '60'))
-        self.last_check_time: Optional[datetime] = None
-        self.check_callback: Optional[Callable] = None
-    
+        self._thread_lock = threading.Lock()
+        self._jobs_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._shutdown = threading.Event()
+        self._stop_requested = threading.Event()
+        self._stop_checked_at = 0.0
+        self._leader_lock = None
+        self._pass_lock = threading.Lock()
+        self._schedules: Dict[str, Any] = {}
+
+    def _storage(self):
+        """Storage backend holding the schedule state (built on first use)"""
+        if self.storage is None:
+            self.storage = get_storage_backend()
+        return self.storage
+
+    def _state(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Persisted state of a job, or of the scheduler itself"""
+        return self._storage().get_scheduler_state(name or self.STATE_NAME)
+
+    def _update_state(self, name: Optional[str] = None, **changes) -> None:
+        """Merge changes into the persisted state of a job, or of the scheduler itself"""
+        self._storage().update_scheduler_state(name or self.STATE_NAME, changes)
+
+    @staticmethod
+    def _now() -> datetime:
+        """Current time, aware UTC"""
+        return datetime.now(pytz.UTC)
+
+    @staticmethod
+    def _parse(value: Optional[str]) -> Optional[datetime]:
+        """Persisted ISO timestamp to datetime"""
+        return datetime.fromisoformat(value) if value else None
+
+    def _schedule(self, job: ScheduledJob, state: Dict[str, Any]):
+        """Parsed schedule of a job: the override saved from the UI, else its configured one (None = off)"""
+        text = state.get('schedule') or job.schedule
+        if text not in self._schedules:
+            try:
+                self._schedules[text] = parse_schedule(text)
+            except ValueError as e:
+                log.warning('schedule_invalid', job=job.name, schedule=text, error=str(e))
+                self._schedules[text] = None
+        return self._schedules[text]
+
+    def add_job(self, name: str, callback: Callable, schedule: str, max_concurrency: int = 1,
+                exclusive: bool = False, run_on_start: bool = False) -> ScheduledJob:
+        """Register (or replace the callback of) a named job, and start the scheduler thread"""
+        with self._jobs_lock:
+            job = self.jobs.get(name)
+            if job is None:
+                job = ScheduledJob(name, callback, schedule, max_concurrency, exclusive, run_on_start)
+                self.jobs[name] = job
+            else:
+                job.callback = callback
+        # Job names are listed in the shared state for other processes (e.g. the metrics exporter)
+        known = self._state().get('jobs') or []
+        if name not in known:
+            self._update_state(jobs=known + [name])
+        self._ensure_thread()
+        self._wake.set()
+        return job
+
     def set_check_callback(self, callback: Callable):
-        """Set the callback function to run on each check"""
-        self.check_callback = callback
-    
+        """Register the full check pass as the 'check' job (every CHECK_INTERVAL_MINUTES unless overridden)"""
+        self.add_job(self.JOB_NAME, callback, f"every {self.default_interval}m",
+                     exclusive=True, run_on_start=True)
+
+    def _ensure_thread(self) -> None:
+        """Start the scheduler thread if it isn't running"""
+        with self._thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self._shutdown.clear()
+                self.thread = threading.Thread(target=self._run_scheduler, daemon=True, name='check-scheduler')
+                self.thread.start()
+
     def start(self):
-        """Start the scheduler"""
-        if self.running:
-            print("Scheduler already running")
+        """Enable scheduled jobs; the full pass runs right away, other jobs at their next slot"""
+        if self._state().get('enabled'):
+            log.info('scheduler_already_running')
             return False
-        
-        if not self.check_callback:
-            print("No check callback set")
+
+        if not self.jobs:
+            log.warning('scheduler_no_jobs')
             return False
-        
-        self.running = True
-        self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self.thread.start()
-        print(f"✅ Scheduler started - will check every {self.check_interval_minutes} minutes")
+
+        now = self._now()
+        for job in list(self.jobs.values()):
+            schedule = self._schedule(job, self._state(job.name))
+            if schedule is None:
+                continue
+            next_run = now if job.run_on_start else schedule.next_after(now)
+            self._update_state(job.name, next_run=next_run.isoformat())
+        self._update_state(enabled=True)
+        self._stop_requested.clear()
+        self._wake.set()
+        log.info('scheduler_started', jobs=self._describe_jobs())
         return True
-    
+
     def stop(self):
-        """Stop the scheduler"""
-        if not self.running:
+        """Disable scheduled jobs; running passes stop after the current store"""
+        if not self._state().get('enabled'):
             return False
-        
-        self.running = False
+
+        self._update_state(enabled=False)
+        for name in list(self.jobs):
+            self._update_state(name, next_run=None)
+        self._stop_requested.set()
+        self._wake.set()
+        log.info('scheduler_stopped')
+        return True
+
+    def should_stop(self) -> bool:
+        """
+        Whether a running job should end early (scheduler stopped here or,
+        checked at most every poll interval, in another process)
+        """
+        if self._stop_requested.is_set() or self._shutdown.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._stop_checked_at >= self.poll_seconds:
+            self._stop_checked_at = now
+            if not self._state().get('enabled'):
+                self._stop_requested.set()
+                return True
+        return False
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the scheduler thread (not the persisted schedule) and give up leadership"""
+        self._shutdown.set()
+        self._wake.set()
         if self.thread:
-            self.thread.join(timeout=5)
-        print("⏸️ Scheduler stopped")
+            self.thread.join(timeout=timeout)
+        self._release_leadership()
+
+    @contextmanager
+    def exclusive_pass(self) -> Iterator[bool]:
+        """
+        Guard a check pass: yields True if no other pass is running in any
+        process (and holds that until the block ends), False otherwise.
+        """
+        if not self._pass_lock.acquire(blocking=False):
+            yield False
+            return
+        lock = None
+        try:
+            lock = self._storage().acquire_leader_lock(self.PASS_LOCK)
+            yield lock is not None
+        finally:
+            if lock:
+                lock.release()
+            self._pass_lock.release()
+
+    def _wait(self, seconds: float) -> None:
+        """Sleep until the timeout or until start / stop / a schedule change / shutdown wakes us"""
+        self._wake.wait(max(seconds, 0))
+        self._wake.clear()
+
+    def _is_leader(self) -> bool:
+        """Hold (or try to take) the leader lock"""
+        if self._leader_lock is not None:
+            if self._leader_lock.is_held():
+                return True
+            log.warning('leader_lock_lost')
+            self._release_leadership()
+
+        self._leader_lock = self._storage().acquire_leader_lock(self.LEADER_LOCK)
+        if self._leader_lock is None:
+            return False
+        log.info('leader_elected', pid=os.getpid())
+        # A run marked in progress belonged to a leader that died mid-run
+        for job in list(self.jobs.values()):
+            if not job.running and self._state(job.name).get('in_progress'):
+                self._update_state(job.name, in_progress=False, last_status='interrupted')
         return True
-    
+
+    def _release_leadership(self) -> None:
+        """Give up the leader lock so another process can take over"""
+        if self._leader_lock is not None:
+            self._leader_lock.release()
+            self._leader_lock = None
+
     def _run_scheduler(self):
-        """Main scheduler loop"""
-        # Run first check immediately when scheduler starts
-        first_run = True
-        
-        while self.running:
+        """Main scheduler loop: start every due job, then sleep until the next one is due"""
+        while not self._shutdown.is_set():
             try:
-                # Skip sleep on first run, execute check immediately
-                if not first_run:
-                    # Wait for the interval
-                    time.sleep(self.check_interval_minutes * 60)
-                else:
-                    first_run = False
-                
-                if not self.running:
-                    break
-                
-                # Run the check
-                print(f"🔄 Scheduled check started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                self.last_check_time = datetime.now()
-                
-                if self.check_callback:
-                    self.check_callback()
-                
-                print(f"✅ Scheduled check completed")
-                
+                if not self._state().get('enabled') or not self.jobs:
+                    self._release_leadership()
+                    self._wait(self.poll_seconds)
+                    continue
+
+                if not self._is_leader():
+                    self._wait(self.poll_seconds)
+                    continue
+
+                wait = self.poll_seconds
+                for job in list(self.jobs.values()):
+                    due_in = self._dispatch(job)
+                    if due_in is not None:
+                        wait = min(wait, due_in)
+                self._wait(wait)
+
             except Exception as e:
-                print(f"Error in scheduler: {e}")
-                time.sleep(60)  # Wait a minute before retrying
-    
+                log.exception('scheduler_error', error=str(e))
+                self._wait(60)  # Wait a minute before retrying
+
+        self._release_leadership()
+
+    def _dispatch(self, job: ScheduledJob) -> Optional[float]:
+        """Start the job if it is due. Returns seconds until its next run (None if it is off)"""
+        state = self._state(job.name)
+        schedule = self._schedule(job, state)
+        if schedule is None:
+            return None
+
+        now = self._now()
+        next_run = self._parse(state.get('next_run'))
+        if next_run is None:
+            if not self._state().get('enabled'):
+                # Cleared by stop() since the loop checked: don't schedule it again
+                return None
+            # Newly added job or schedule: first run at its next slot
+            next_run = schedule.next_after(now)
+            self._update_state(job.name, next_run=next_run.isoformat())
+        if next_run > now:
+            return (next_run - now).total_seconds()
+
+        # Claim the slot before starting, so the loop doesn't fire it twice
+        following = schedule.next_after(now)
+        self._update_state(job.name, next_run=following.isoformat())
+        with self._jobs_lock:
+            if job.running >= job.max_concurrency:
+                busy = True
+            else:
+                busy = False
+                job.running += 1
+        if busy:
+            log.warning('job_skipped', job=job.name, reason='still_running', running=job.running)
+            self._record_run(job.name, now, now, 'skipped', None)
+        else:
+            threading.Thread(target=self._run_job, args=(job,), daemon=True, name=f"job-{job.name}").start()
+        return (following - now).total_seconds()
+
+    def _run_job(self, job: ScheduledJob) -> None:
+        """Run one scheduled job and persist its outcome"""
+        try:
+            if job.exclusive:
+                with self.exclusive_pass() as acquired:
+                    if not acquired:
+                        log.warning('job_skipped', job=job.name, reason='pass_running')
+                        now = self._now()
+                        self._record_run(job.name, now, now, 'skipped', None)
+                        return
+                    self._execute(job)
+            else:
+                self._execute(job)
+        finally:
+            with self._jobs_lock:
+                job.running -= 1
+
+    def _execute(self, job: ScheduledJob) -> None:
+        """Call the job's callback, recording start, result and duration"""
+        started = self._now()
+        log.info('job_started', job=job.name)
+        if job.exclusive:
+            self._stop_requested.clear()
+        self._update_state(job.name, in_progress=True, last_started=started.isoformat())
+
+        status, error = 'ok', None
+        try:
+            job.callback()
+        except Exception as e:
+            status, error = 'error', str(e)
+            log.exception('job_failed', job=job.name, error=str(e))
+        if status == 'ok' and (self._stop_requested.is_set() or self._shutdown.is_set()):
+            status = 'stopped'
+
+        finished = self._now()
+        self._record_run(job.name, started, finished, status, error)
+
+        state = self._state(job.name)
+        schedule = self._schedule(job, state)
+        next_run = self._parse(state.get('next_run'))
+        if schedule and self._state().get('enabled') and next_run and next_run < finished:
+            # The run outlasted its slot: skip the missed one instead of starting back-to-back
+            self._update_state(job.name, next_run=schedule.next_after(finished).isoformat())
+        log.info('job_finished', job=job.name, status=status,
+                 duration_seconds=round((finished - started).total_seconds(), 1))
+
+    def _record_run(self, name: str, started: datetime, finished: datetime,
+                    status: str, error: Optional[str]) -> None:
+        """Persist a run's outcome as the job's last result and at the head of its history"""
+        duration = round((finished - started).total_seconds(), 1)
+        state = self._state(name)
+        run = {'started': started.isoformat(), 'finished': finished.isoformat(),
+               'status': status, 'error': error, 'duration_seconds': duration}
+        history = [run] + list(state.get('history') or [])[:self.history_size - 1]
+        changes: Dict[str, Any] = dict(history=history)
+        if status != 'skipped':
+            changes.update(in_progress=False, last_finished=finished.isoformat(), last_status=status,
+                           last_error=error, last_duration_seconds=duration)
+        self._update_state(name, **changes)
+
+    def _describe_jobs(self) -> str:
+        """'name (schedule)' for every enabled job"""
+        described = []
+        for job in list(self.jobs.values()):
+            schedule = self._schedule(job, self._state(job.name))
+            if schedule is not None:
+                described.append(f"{job.name} ({schedule})")
+        return ', '.join(described) or 'none'
+
+    def get_jobs(self) -> List[Dict[str, Any]]:
+        """Schedule, next run, last result and recent history of every job"""
+        jobs = []
+        for job in list(self.jobs.values()):
+            state = self._state(job.name)
+            schedule = self._schedule(job, state)
+            jobs.append({
+                'name': job.name,
+                'schedule': str(schedule) if schedule else 'off',
+                'max_concurrency': job.max_concurrency,
+                'running': job.running,
+                'next_run': state.get('next_run'),
+                'in_progress': bool(state.get('in_progress')),
+                'last_started': state.get('last_started'),
+                'last_status': state.get('last_status'),
+                'last_error': state.get('last_error'),
+                'last_duration_seconds': state.get('last_duration_seconds'),
+                'history': state.get('history') or []
+            })
+        return jobs
+
     def get_status(self) -> dict:
-        """Get scheduler status"""
+        """Get scheduler status and the full check pass job's (shared by every process)"""
+        state = self._state(self.JOB_NAME)
+        schedule = self._schedule(self.jobs[self.JOB_NAME], state) if self.JOB_NAME in self.jobs else None
         return {
-            'running': self.running,
-            'interval_minutes': self.check_interval_minutes,
-            'last_check': self.last_check_time.isoformat() if self.last_check_time else None,
-            'next_check': (self.last_check_time + timedelta(minutes=self.check_interval_minutes)).isoformat() 
-                         if self.last_check_time else None
+            'running': bool(self._state().get('enabled')),
+            'interval_minutes': getattr(schedule, 'minutes', self.default_interval),
+            'schedule': str(schedule) if schedule else 'off',
+            'last_check': state.get('last_started'),
+            'next_check': state.get('next_run'),
+            'in_progress': bool(state.get('in_progress')),
+            'last_status': state.get('last_status'),
+            'last_error': state.get('last_error'),
+            'last_duration_seconds': state.get('last_duration_seconds'),
+            'leader': self._leader_lock is not None
         }
-    
+
+    def set_schedule(self, name: str, schedule: str) -> bool:
+        """Override a job's schedule (shared by every process); the next run follows the new schedule"""
+        try:
+            parsed = parse_schedule(schedule)
+        except ValueError as e:
+            log.warning('schedule_invalid', job=name, schedule=schedule, error=str(e))
+            return False
+
+        changes: Dict[str, Any] = {'schedule': schedule}
+        state = self._state(name)
+        last_started = self._parse(state.get('last_started'))
+        if parsed is None or not self._state().get('enabled'):
+            changes['next_run'] = None
+        elif last_started and not state.get('in_progress'):
+            changes['next_run'] = max(parsed.next_after(last_started), self._now()).isoformat()
+        else:
+            changes['next_run'] = parsed.next_after(self._now()).isoformat()
+        self._update_state(name, **changes)
+        self._wake.set()
+        log.info('schedule_updated', job=name, schedule=schedule)
+        return True
+
     def set_interval(self, minutes: int):
-        """Change check interval"""
+        """Change the full check pass interval"""
         if minutes < 1:
             return False
-        
-        self.check_interval_minutes = minutes
-        print(f"Check interval updated to {minutes} minutes")
-        return True
+        return self.set_schedule(self.JOB_NAME, f"every {minutes}m")
+
+
+_scheduler: Optional[CheckScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> CheckScheduler:
+    """Process-wide scheduler, shared by every Streamlit session"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CheckScheduler()
+        return _scheduler
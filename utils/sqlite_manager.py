@@ -0,0 +1,808 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+import pytz
+from utils.storage import StorageBackend, CHECK_RUN_COLUMNS, CHECK_RUN_JSON_COLUMNS
+from utils.store_record import StoreRow, ExportRow, DeltaRow
+
+PACIFIC_TZ = pytz.timezone('America/Los_Angeles')
+
+
+def _pacific_date(iso_value: Optional[str]) -> Optional[str]:
+    """Pacific calendar date of a stored UTC timestamp (also registered as SQL pacific_date())"""
+    if not iso_value:
+        return None
+    return datetime.fromisoformat(iso_value).astimezone(PACIFIC_TZ).date().isoformat()
+
+
+def _connect(path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open a connection with the app's SQL functions registered"""
+    if read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.create_function('pacific_date', 1, _pacific_date, deterministic=True)
+    return conn
+
+
+class _SharedConnection:
+    """One SQLite connection per database file, shared by every SQLiteManager in the process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = _connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self.in_transaction = False
+        self.pending_writes = 0
+        self.last_commit = time.monotonic()
+
+    def commit(self) -> None:
+        """Commit the open write batch, if any"""
+        with self.lock:
+            if self.in_transaction:
+                self.conn.execute('COMMIT')
+                self.in_transaction = False
+            self.pending_writes = 0
+            self.last_commit = time.monotonic()
+
+
+_connections: Dict[str, _SharedConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def _get_shared_connection(path: str) -> _SharedConnection:
+    """Get (or open) the process-wide connection for a database file"""
+    path = os.path.abspath(path)
+    with _connections_lock:
+        shared = _connections.get(path)
+        if shared is None:
+            shared = _SharedConnection(path)
+            _connections[path] = shared
+        return shared
+
+
+@atexit.register
+def _commit_all() -> None:
+    """Don't lose the last write batch on interpreter exit"""
+    for shared in list(_connections.values()):
+        try:
+            shared.commit()
+        except sqlite3.Error:
+            pass
+
+
+class SQLiteManager(StorageBackend):
+    """
+    Handle SQLite database operations for store monitoring.
+
+    Same schema and method surface as DatabaseManager, for single-box
+    deployments without PostgreSQL. Runs in WAL mode, and check results are
+    committed in batches (every SQLITE_COMMIT_EVERY writes or
+    SQLITE_COMMIT_INTERVAL seconds, and on flush()) instead of one fsync per
+    check. Timestamps are stored as UTC ISO strings so they sort correctly.
+    """
+
+    def __init__(self, db_path: str = "shopify_data.db"):
+        self.db_path = db_path
+        self.commit_every = int(os.getenv('SQLITE_COMMIT_EVERY', '100'))
+        self.commit_interval = float(os.getenv('SQLITE_COMMIT_INTERVAL', '2.0'))
+        self._shared = _get_shared_connection(db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Initialize database tables"""
+        with self._shared.lock:
+            self._shared.commit()
+            self._shared.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS stores (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT UNIQUE NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'UNCHECKED',
+                    first_check TEXT,
+                    last_check TEXT,
+                    first_dead_date TEXT,
+                    check_count INTEGER DEFAULT 0,
+                    timezone_checked VARCHAR(100),
+                    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+                    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+                );
+
+                CREATE TABLE IF NOT EXISTS check_history (
+                    id INTEGER PRIMARY KEY,
+                    store_id INTEGER REFERENCES stores(id) ON DELETE CASCADE,
+                    status TEXT NOT NULL,
+                    checked_at TEXT NOT NULL,
+                    check_date TEXT NOT NULL,
+                    response_time REAL,
+                    status_code INTEGER
+                );
+
+                -- Change log (added / status changed / removed), filled by the
+                -- triggers below so every write path records its events.
+                -- AUTOINCREMENT: ids are never reused after deletes.
+                CREATE TABLE IF NOT EXISTS store_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    store_id INTEGER,
+                    url TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    old_status TEXT,
+                    new_status TEXT,
+                    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+                );
+
+                CREATE TABLE IF NOT EXISTS sync_cursors (
+                    name TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+                );
+
+                -- Persisted state of scheduled jobs, one JSON document per job
+                CREATE TABLE IF NOT EXISTS scheduler_state (
+                    name TEXT PRIMARY KEY,
+                    state TEXT NOT NULL DEFAULT '{}',
+                    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+                );
+
+                -- One summary per check pass (throughput, per-stage timings), see RunMetrics
+                CREATE TABLE IF NOT EXISTS check_runs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at TEXT NOT NULL,
+                    finished_at TEXT,
+                    total INTEGER,
+                    checked INTEGER,
+                    status_counts TEXT,
+                    stage_seconds TEXT,
+                    urls_per_second REAL,
+                    error TEXT,
+                    profile TEXT
+                );
+
+                CREATE TRIGGER IF NOT EXISTS trg_stores_added AFTER INSERT ON stores
+                BEGIN
+                    INSERT INTO store_events (store_id, url, event, new_status)
+                    VALUES (NEW.id, NEW.url, 'added', NEW.status);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_stores_status_changed AFTER UPDATE OF status ON stores
+                WHEN OLD.status != NEW.status
+                BEGIN
+                    INSERT INTO store_events (store_id, url, event, old_status, new_status)
+                    VALUES (NEW.id, NEW.url, 'changed', OLD.status, NEW.status);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_stores_removed AFTER DELETE ON stores
+                BEGIN
+                    INSERT INTO store_events (store_id, url, event, old_status)
+                    VALUES (OLD.id, OLD.url, 'removed', OLD.status);
+                END;
+
+                CREATE INDEX IF NOT EXISTS idx_stores_status ON stores(status);
+                CREATE INDEX IF NOT EXISTS idx_check_history_store_id ON check_history(store_id);
+                CREATE INDEX IF NOT EXISTS idx_check_history_checked_at ON check_history(checked_at);
+                CREATE INDEX IF NOT EXISTS idx_check_history_store_checked_at ON check_history(store_id, checked_at);
+                CREATE INDEX IF NOT EXISTS idx_check_history_check_date ON check_history(check_date, status);
+                CREATE INDEX IF NOT EXISTS idx_check_runs_started_at ON check_runs(started_at);
+            ''')
+            # check_runs created before profiling existed
+            columns = {row[1] for row in self._shared.conn.execute('PRAGMA table_info(check_runs)')}
+            if 'profile' not in columns:
+                self._shared.conn.execute('ALTER TABLE check_runs ADD COLUMN profile TEXT')
+
+    def _begin_write(self) -> None:
+        """Join the current write batch, opening one if needed (lock held)"""
+        if not self._shared.in_transaction:
+            self._shared.conn.execute('BEGIN IMMEDIATE')
+            self._shared.in_transaction = True
+
+    def _end_write(self, force: bool = False) -> None:
+        """Commit the batch once it is big or old enough (lock held)"""
+        shared = self._shared
+        shared.pending_writes += 1
+        if (force or shared.pending_writes >= self.commit_every
+                or time.monotonic() - shared.last_commit >= self.commit_interval):
+            shared.commit()
+
+    def _rollback(self) -> None:
+        """Abort the current write batch (lock held)"""
+        if self._shared.in_transaction:
+            self._shared.conn.execute('ROLLBACK')
+            self._shared.in_transaction = False
+        self._shared.pending_writes = 0
+
+    def flush(self) -> None:
+        """Commit any buffered writes"""
+        self._shared.commit()
+
+    @staticmethod
+    def _utc_now() -> datetime:
+        """Current time as an aware UTC datetime"""
+        return datetime.now(pytz.UTC)
+
+    @staticmethod
+    def _to_iso(value: datetime) -> str:
+        """Sortable UTC ISO string"""
+        return value.astimezone(pytz.UTC).isoformat(timespec='microseconds')
+
+    def _stream_query(self, query: str, params: tuple, batch_size: int) -> Iterator[List[tuple]]:
+        """
+        Run one ordered query on a private read-only connection and yield
+        batches of rows. In WAL mode the reader sees a consistent snapshot
+        without holding the shared connection's lock, so checks keep writing
+        while a long export streams.
+        """
+        self.flush()
+        conn = _connect(self._shared.path, read_only=True)
+        try:
+            cur = conn.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict[str, Any]:
+        """Convert a stores row (without url) to the dict shape used by the app"""
+        status, first_check, last_check, first_dead_date, check_count, timezone_checked = row
+        return {
+            'status': status,
+            'first_check': first_check,
+            'last_check': last_check,
+            'first_dead_date': first_dead_date,
+            'check_count': check_count,
+            'timezone_checked': timezone_checked
+        }
+
+    def load_urls(self, urls: List[str]) -> None:
+        """Load new URLs into the database (bulk insert in one transaction)"""
+        clean_urls = [(url.strip(),) for url in urls if url.strip()]
+        if not clean_urls:
+            return
+
+        with self._shared.lock:
+            try:
+                self._begin_write()
+                self._shared.conn.executemany(
+                    "INSERT OR IGNORE INTO stores (url, status, check_count) VALUES (?, 'UNCHECKED', 0)",
+                    clean_urls
+                )
+                self._end_write(force=True)
+            except sqlite3.Error:
+                self._rollback()
+                raise
+
+    def update_store_status(self, url: str, status: str, timezone_checked: str = None, response_time: float = None, status_code: int = None) -> Tuple[int, Optional[str]]:
+        """
+        Update store status with timestamp and history tracking.
+        Returns (store_id, previous_status); previous_status is None for new stores.
+        """
+        now = self._utc_now()
+        current_time = self._to_iso(now)
+        check_date = now.astimezone(PACIFIC_TZ).date().isoformat()
+
+        with self._shared.lock:
+            conn = self._shared.conn
+            try:
+                self._begin_write()
+
+                row = conn.execute('SELECT id, status FROM stores WHERE url = ?', (url,)).fetchone()
+                if row:
+                    store_id, previous_status = row
+                    conn.execute('''
+                        UPDATE stores
+                        SET status = ?,
+                            last_check = ?,
+                            check_count = check_count + 1,
+                            updated_at = ?,
+                            timezone_checked = ?,
+                            first_check = COALESCE(first_check, ?),
+                            first_dead_date = CASE
+                                WHEN ? = 'DEAD' AND ? != 'DEAD' THEN ?
+                                WHEN ? != 'DEAD' AND ? = 'DEAD' THEN NULL
+                                ELSE first_dead_date
+                            END
+                        WHERE id = ?
+                    ''', (status, current_time, current_time, timezone_checked, current_time,
+                          status, previous_status, current_time,
+                          status, previous_status, store_id))
+                else:
+                    previous_status = None
+                    cur = conn.execute('''
+                        INSERT INTO stores (url, status, first_check, last_check, check_count,
+                                            timezone_checked, first_dead_date, updated_at)
+                        VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+                    ''', (url, status, current_time, current_time, timezone_checked,
+                          current_time if status == 'DEAD' else None, current_time))
+                    store_id = cur.lastrowid
+
+                conn.execute('''
+                    INSERT INTO check_history (store_id, status, checked_at, check_date, response_time, status_code)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (store_id, status, current_time, check_date, response_time, status_code))
+
+                self._end_write()
+                return store_id, previous_status
+            except sqlite3.Error:
+                self._rollback()
+                raise
+
+    def get_data(self) -> Dict[str, Dict[str, Any]]:
+        """Get all stores data"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute('''
+                SELECT url, status, first_check, last_check, first_dead_date, check_count, timezone_checked
+                FROM stores
+                ORDER BY url
+            ''').fetchall()
+        return {row[0]: self._row_to_dict(row[1:]) for row in rows}
+
+    def iter_stores(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[StoreRow]:
+        """
+        Stream stores ordered by URL.
+        Pages by URL (keyset pagination) so the shared connection's lock is
+        only held per batch, not for the whole iteration.
+        """
+        query = '''
+            SELECT url, status, first_check, last_check, first_dead_date, check_count, timezone_checked
+            FROM stores
+            WHERE url > ?
+        '''
+        params: List[Any] = []
+        if statuses:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        query += ' ORDER BY url LIMIT ?'
+
+        last_url = ''
+        while True:
+            with self._shared.lock:
+                rows = self._shared.conn.execute(query, [last_url, *params, batch_size]).fetchall()
+            for row in rows:
+                yield StoreRow(*row)
+            if len(rows) < batch_size:
+                return
+            last_url = rows[-1][0]
+
+    def iter_export_rows(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[ExportRow]:
+        """Stream stores ordered by URL with the status code and response time of their latest check"""
+        query = '''
+            SELECT s.url, s.status, s.first_check, s.last_check, s.first_dead_date, s.check_count,
+                   s.timezone_checked, ch.status_code, ch.response_time
+            FROM stores s
+            LEFT JOIN check_history ch ON ch.id = (
+                SELECT id FROM check_history
+                WHERE store_id = s.id
+                ORDER BY checked_at DESC, id DESC
+                LIMIT 1
+            )
+        '''
+        params: List[Any] = []
+        if statuses:
+            query += f" WHERE s.status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        query += ' ORDER BY s.url'
+
+        for rows in self._stream_query(query, tuple(params), batch_size):
+            for row in rows:
+                yield ExportRow(*row)
+
+    def get_last_event_id(self) -> int:
+        """Id of the newest store change event (buffered writes are committed first)"""
+        self.flush()
+        with self._shared.lock:
+            return self._shared.conn.execute('SELECT COALESCE(MAX(id), 0) FROM store_events').fetchone()[0]
+
+    def iter_store_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[DeltaRow]:
+        """
+        Net change per store over events (after_id, until_id], ordered by URL.
+        A store whose first event in the range is 'added' is new to the
+        consumer; if it is gone again it is skipped entirely.
+        """
+        query = '''
+            WITH changed AS (
+                SELECT url, MIN(id) AS first_id
+                FROM store_events
+                WHERE id > ? AND id <= ?
+                GROUP BY url
+            ),
+            flagged AS (
+                SELECT c.url, e.event = 'added' AS is_new
+                FROM changed c
+                JOIN store_events e ON e.id = c.first_id
+            )
+            SELECT CASE WHEN s.id IS NULL THEN 'removed' WHEN f.is_new THEN 'added' ELSE 'changed' END,
+                   f.url, s.status, s.first_check, s.last_check, s.first_dead_date, s.check_count,
+                   s.timezone_checked, ch.status_code, ch.response_time
+            FROM flagged f
+            LEFT JOIN stores s ON s.url = f.url
+            LEFT JOIN check_history ch ON ch.id = (
+                SELECT id FROM check_history
+                WHERE store_id = s.id
+                ORDER BY checked_at DESC, id DESC
+                LIMIT 1
+            )
+            WHERE s.id IS NOT NULL OR NOT f.is_new
+            ORDER BY f.url
+        '''
+        for rows in self._stream_query(query, (after_id, until_id), batch_size):
+            for row in rows:
+                yield DeltaRow(*row)
+
+    def iter_status_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[Dict[str, Any]]:
+        """
+        Status transitions from change events (after_id, until_id], oldest first.
+        The first check of a loaded store (UNCHECKED -> status) is not a transition.
+        """
+        query = '''
+            SELECT id, url, old_status, new_status, created_at
+            FROM store_events
+            WHERE id > ? AND id <= ?
+              AND event = 'changed' AND old_status <> 'UNCHECKED'
+            ORDER BY id
+        '''
+        for rows in self._stream_query(query, (after_id, until_id), batch_size):
+            for event_id, url, old_status, new_status, created_at in rows:
+                yield {
+                    'id': event_id,
+                    'url': url,
+                    'from_status': old_status,
+                    'to_status': new_status,
+                    'changed_at': created_at
+                }
+
+    def get_sync_cursor(self, name: str) -> Optional[int]:
+        """Saved change-event watermark of a consumer, None if it never ran"""
+        with self._shared.lock:
+            row = self._shared.conn.execute(
+                'SELECT position FROM sync_cursors WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_sync_cursor(self, name: str, position: int) -> None:
+        """Save a consumer's change-event watermark"""
+        with self._shared.lock:
+            try:
+                self._begin_write()
+                self._shared.conn.execute('''
+                    INSERT INTO sync_cursors (name, position, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE
+                    SET position = excluded.position, updated_at = excluded.updated_at
+                ''', (name, position, self._to_iso(self._utc_now())))
+                self._end_write(force=True)
+            except sqlite3.Error:
+                self._rollback()
+                raise
+
+    def get_scheduler_state(self, name: str) -> Dict[str, Any]:
+        """Persisted state of a scheduled job ({} if it never ran)"""
+        with self._shared.lock:
+            row = self._shared.conn.execute(
+                'SELECT state FROM scheduler_state WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update_scheduler_state(self, name: str, changes: Dict[str, Any]) -> None:
+        """Merge changes into a scheduled job's persisted state (None values remove keys)"""
+        with self._shared.lock:
+            try:
+                self._begin_write()
+                # Patch with the changes themselves: excluded.state has its None values already dropped
+                patch = json.dumps(changes)
+                self._shared.conn.execute('''
+                    INSERT INTO scheduler_state (name, state, updated_at) VALUES (?, json_patch('{}', ?), ?)
+                    ON CONFLICT (name) DO UPDATE
+                    SET state = json_patch(state, ?), updated_at = excluded.updated_at
+                ''', (name, patch, self._to_iso(self._utc_now()), patch))
+                self._end_write(force=True)
+            except sqlite3.Error:
+                self._rollback()
+                raise
+
+    def save_check_run(self, run: Dict[str, Any]) -> None:
+        """Insert or replace a check run summary, keyed by its id"""
+        values = tuple(
+            json.dumps(run.get(column)) if column in CHECK_RUN_JSON_COLUMNS else run.get(column)
+            for column in CHECK_RUN_COLUMNS
+        )
+        with self._shared.lock:
+            try:
+                self._begin_write()
+                self._shared.conn.execute(
+                    f"INSERT OR REPLACE INTO check_runs ({', '.join(CHECK_RUN_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(CHECK_RUN_COLUMNS))})", values)
+                self._end_write(force=True)
+            except sqlite3.Error:
+                self._rollback()
+                raise
+
+    def get_check_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent check run summaries, newest first"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute(
+                f"SELECT {', '.join(CHECK_RUN_COLUMNS)} FROM check_runs ORDER BY started_at DESC LIMIT ?",
+                (limit,)).fetchall()
+        runs = []
+        for row in rows:
+            run = dict(zip(CHECK_RUN_COLUMNS, row))
+            run['status_counts'] = json.loads(run['status_counts'] or '{}')
+            run['stage_seconds'] = json.loads(run['stage_seconds'] or '{}')
+            run['profile'] = json.loads(run['profile']) if run['profile'] else None
+            runs.append(run)
+        return runs
+
+    def _lock_path(self, name: str) -> str:
+        """Leader lock file next to the database"""
+        return f"{self.db_path}.{name}.lock"
+
+    def iter_store_chunks(self, updated_since: Optional[datetime] = None, chunk_size: int = 10000,
+                          updated_before: Optional[datetime] = None) -> Iterator[List[tuple]]:
+        """Stream full store rows in chunks ordered by (updated_at, id), for columnar export"""
+        last_updated = self._to_iso(updated_since) if updated_since else ''
+        last_id = 2 ** 63 - 1 if updated_since else 0
+        # '~' sorts after every ISO timestamp
+        until = self._to_iso(updated_before) if updated_before else '~'
+        while True:
+            with self._shared.lock:
+                rows = self._shared.conn.execute('''
+                    SELECT id, url, status, first_check, last_check, first_dead_date, check_count,
+                           timezone_checked, created_at, updated_at
+                    FROM stores
+                    WHERE (updated_at > ? OR (updated_at = ? AND id > ?)) AND updated_at <= ?
+                    ORDER BY updated_at, id
+                    LIMIT ?
+                ''', (last_updated, last_updated, last_id, until, chunk_size)).fetchall()
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last_updated, last_id = rows[-1][9], rows[-1][0]
+
+    def iter_history_chunks(self, after_id: int = 0, chunk_size: int = 50000,
+                            until_id: Optional[int] = None) -> Iterator[List[tuple]]:
+        """Stream check history rows with after_id < id <= until_id in chunks ordered by id"""
+        if until_id is None:
+            until_id = 2 ** 63 - 1
+        while True:
+            with self._shared.lock:
+                rows = self._shared.conn.execute('''
+                    SELECT ch.id, ch.store_id, s.url, ch.status, ch.checked_at, ch.response_time, ch.status_code
+                    FROM check_history ch
+                    JOIN stores s ON s.id = ch.store_id
+                    WHERE ch.id > ? AND ch.id <= ?
+                    ORDER BY ch.id
+                    LIMIT ?
+                ''', (after_id, until_id, chunk_size)).fetchall()
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            after_id = rows[-1][0]
+
+    def get_history_high_water(self) -> int:
+        """
+        Newest check history id. The pending write batch is committed first;
+        SQLite has a single writer, so no lower id can commit afterwards.
+        """
+        with self._shared.lock:
+            self._shared.commit()
+            return self._shared.conn.execute('SELECT COALESCE(MAX(id), 0) FROM check_history').fetchone()[0]
+
+    def get_stores_by_status(self, status: str) -> List[str]:
+        """Get list of URLs with specific status"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute(
+                'SELECT url FROM stores WHERE status = ? ORDER BY url', (status,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_status_counts(self) -> Dict[str, int]:
+        """Get count of stores by status"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute(
+                'SELECT status, COUNT(*) FROM stores GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def get_total_count(self) -> int:
+        """Get total number of stores"""
+        with self._shared.lock:
+            return self._shared.conn.execute('SELECT COUNT(*) FROM stores').fetchone()[0]
+
+    def get_data_version(self) -> str:
+        """Row count plus latest updated_at - changes on every insert, check and delete"""
+        self.flush()
+        with self._shared.lock:
+            count, last_updated = self._shared.conn.execute(
+                'SELECT COUNT(*), MAX(updated_at) FROM stores').fetchone()
+        return f"{count}:{last_updated or ''}"
+
+    def get_filtered_data(self, status_filters: List[str], search_term: str = "") -> Dict[str, Dict[str, Any]]:
+        """Get filtered data based on status and search term"""
+        if not status_filters:
+            return {}
+
+        query = f'''
+            SELECT url, status, first_check, last_check, first_dead_date, check_count, timezone_checked
+            FROM stores
+            WHERE status IN ({', '.join('?' * len(status_filters))})
+        '''
+        params: List[Any] = list(status_filters)
+
+        if search_term and search_term.strip():
+            term = search_term.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query += " AND url LIKE ? ESCAPE '\\'"
+            params.append(f'%{term}%')
+
+        query += ' ORDER BY url'
+
+        with self._shared.lock:
+            rows = self._shared.conn.execute(query, params).fetchall()
+        return {row[0]: self._row_to_dict(row[1:]) for row in rows}
+
+    def get_timeline_data(self, days: int = None) -> List[Dict[str, Any]]:
+        """Get timeline data for charts with optional date filtering"""
+        query = 'SELECT check_date, status, COUNT(*) FROM check_history'
+        params: List[Any] = []
+        if days:
+            cutoff = (self._utc_now() - timedelta(days=days)).astimezone(PACIFIC_TZ).date().isoformat()
+            query += ' WHERE check_date >= ?'
+            params.append(cutoff)
+        query += ' GROUP BY check_date, status ORDER BY check_date, status'
+
+        with self._shared.lock:
+            rows = self._shared.conn.execute(query, params).fetchall()
+        return [{'date': check_date, 'status': status, 'count': count} for check_date, status, count in rows]
+
+    def get_dead_stores_with_dates(self) -> Dict[str, str]:
+        """Get DEAD stores with their first dead dates"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute('''
+                SELECT url, first_dead_date
+                FROM stores
+                WHERE status = 'DEAD' AND first_dead_date IS NOT NULL
+                ORDER BY first_dead_date DESC
+            ''').fetchall()
+        return {url: _pacific_date(first_dead_date) for url, first_dead_date in rows}
+
+    def iter_dead_stores(self, batch_size: int = 2000) -> Iterator[Tuple[str, str, int]]:
+        """Stream DEAD stores as (dead_date, url, check_count), newest Pacific date first"""
+        query = '''
+            SELECT pacific_date(first_dead_date) AS dead_date, url, check_count
+            FROM stores
+            WHERE status = 'DEAD' AND first_dead_date IS NOT NULL
+            ORDER BY dead_date DESC, url
+        '''
+        for rows in self._stream_query(query, (), batch_size):
+            for dead_date, url, check_count in rows:
+                yield dead_date, url, check_count or 0
+
+    def get_dead_date_counts(self) -> Dict[str, int]:
+        """Number of DEAD stores per Pacific dead date, newest date first"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute('''
+                SELECT pacific_date(first_dead_date) AS dead_date, COUNT(*)
+                FROM stores
+                WHERE status = 'DEAD' AND first_dead_date IS NOT NULL
+                GROUP BY dead_date
+                ORDER BY dead_date DESC
+            ''').fetchall()
+        return {dead_date: count for dead_date, count in rows}
+
+    def get_store_details(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get detailed information for a specific store"""
+        with self._shared.lock:
+            row = self._shared.conn.execute('''
+                SELECT url, status, first_check, last_check, first_dead_date, check_count, timezone_checked
+                FROM stores
+                WHERE url = ?
+            ''', (url,)).fetchone()
+        if row:
+            details = self._row_to_dict(row[1:])
+            details['url'] = row[0]
+            return details
+        return None
+
+    def get_check_history(self, url: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get check history for a specific store"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute('''
+                SELECT ch.status, ch.checked_at, ch.response_time, ch.status_code
+                FROM check_history ch
+                JOIN stores s ON ch.store_id = s.id
+                WHERE s.url = ?
+                ORDER BY ch.checked_at DESC
+                LIMIT ?
+            ''', (url, limit)).fetchall()
+        return [
+            {'status': status, 'timestamp': checked_at, 'response_time': response_time, 'status_code': status_code}
+            for status, checked_at, response_time, status_code in rows
+        ]
+
+    def _delete(self, where: str, params: tuple) -> int:
+        """Delete stores (history cascades) and commit immediately"""
+        with self._shared.lock:
+            try:
+                self._begin_write()
+                deleted = self._shared.conn.execute(f'DELETE FROM stores {where}', params).rowcount
+                self._end_write(force=True)
+                return deleted
+            except sqlite3.Error:
+                self._rollback()
+                raise
+
+    def compact_history(self, keep_days: int) -> int:
+        """Delete check history older than keep_days, keeping each store's latest check"""
+        cutoff = self._to_iso(self._utc_now() - timedelta(days=keep_days))
+        with self._shared.lock:
+            try:
+                self._begin_write()
+                deleted = self._shared.conn.execute('''
+                    DELETE FROM check_history
+                    WHERE checked_at < ?
+                      AND EXISTS (
+                          SELECT 1 FROM check_history newer
+                          WHERE newer.store_id = check_history.store_id
+                            AND newer.checked_at > check_history.checked_at
+                      )
+                ''', (cutoff,)).rowcount
+                self._end_write(force=True)
+                return deleted
+            except sqlite3.Error:
+                self._rollback()
+                raise
+
+    def clear_all_data(self) -> None:
+        """Clear all data"""
+        self._delete('', ())
+
+    def remove_store(self, url: str) -> bool:
+        """Remove a specific store from database"""
+        return self._delete('WHERE url = ?', (url,)) > 0
+
+    def bulk_delete_by_status(self, statuses: List[str]) -> int:
+        """Bulk delete stores by status"""
+        if not statuses:
+            return 0
+        return self._delete(f"WHERE status IN ({', '.join('?' * len(statuses))})", tuple(statuses))
+
+    def _get_changes_since(self, since: datetime) -> List[Dict[str, Any]]:
+        """Status transitions newer than since, computed with LAG over full history"""
+        with self._shared.lock:
+            rows = self._shared.conn.execute('''
+                WITH all_history AS (
+                    SELECT
+                        s.url,
+                        ch.status,
+                        ch.checked_at,
+                        LAG(ch.status) OVER (PARTITION BY s.id ORDER BY ch.checked_at) as prev_status
+                    FROM stores s
+                    JOIN check_history ch ON s.id = ch.store_id
+                )
+                SELECT url, prev_status, status, checked_at
+                FROM all_history
+                WHERE prev_status IS NOT NULL
+                  AND prev_status != status
+                  AND checked_at >= ?
+                ORDER BY checked_at DESC
+            ''', (self._to_iso(since),)).fetchall()
+        return [
+            {'url': url, 'from_status': prev_status, 'to_status': new_status, 'changed_at': checked_at}
+            for url, prev_status, new_status, checked_at in rows
+        ]
+
+    def get_status_changes(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Get stores that changed status in the last N days"""
+        return self._get_changes_since(self._utc_now() - timedelta(days=days))
+
+    def get_latest_changes(self, minutes: int = 60) -> List[Dict[str, Any]]:
+        """Get status changes from the last N minutes (for real-time notifications)"""
+        return self._get_changes_since(self._utc_now() - timedelta(minutes=minutes))
@@ -0,0 +1,281 @@
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from utils.store_record import StoreRow, ExportRow, DeltaRow
+
+# Row layouts of iter_store_chunks() / iter_history_chunks()
+EXPORT_STORE_COLUMNS = [
+    'id', 'url', 'status', 'first_check', 'last_check', 'first_dead_date',
+    'check_count', 'timezone_checked', 'created_at', 'updated_at'
+]
+EXPORT_HISTORY_COLUMNS = [
+    'id', 'store_id', 'url', 'status', 'checked_at', 'response_time', 'status_code'
+]
+
+# Fields of a check run summary (check_runs table, RunMetrics.to_dict())
+CHECK_RUN_COLUMNS = [
+    'id', 'kind', 'status', 'started_at', 'finished_at', 'total', 'checked',
+    'status_counts', 'stage_seconds', 'urls_per_second', 'error', 'profile'
+]
+# check_runs columns holding JSON documents
+CHECK_RUN_JSON_COLUMNS = ('status_counts', 'stage_seconds', 'profile')
+
+
+class LeaderLock:
+    """
+    Exclusive, non-blocking lock on a file (flock), held until release() or
+    process exit. Used by the SQLite and JSON backends to elect one
+    scheduler leader among processes on the same host.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        """Take the lock if no other process holds it"""
+        import fcntl
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def is_held(self) -> bool:
+        """Whether this process still holds the lock"""
+        return self._fd is not None
+
+    def release(self) -> None:
+        """Give the lock up"""
+        if self._fd is not None:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class StorageBackend(ABC):
+    """
+    Common interface for store storage backends.
+
+    Implemented by DatabaseManager (PostgreSQL), SQLiteManager and the JSON
+    DataManager, so the app, scheduler and exporter can use any of them.
+    Use get_storage_backend() to build the configured one.
+    """
+
+    @abstractmethod
+    def load_urls(self, urls: List[str]) -> None:
+        """Load new URLs into storage"""
+
+    @abstractmethod
+    def update_store_status(self, url: str, status: str, timezone_checked: str = None,
+                            response_time: float = None, status_code: int = None) -> Tuple[Optional[int], Optional[str]]:
+        """Record a check result. Returns (store_id, previous_status)"""
+
+    @abstractmethod
+    def get_data(self) -> Dict[str, Dict[str, Any]]:
+        """Get all stores data"""
+
+    @abstractmethod
+    def iter_stores(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[StoreRow]:
+        """Stream stores ordered by URL"""
+
+    @abstractmethod
+    def iter_export_rows(self, statuses: Optional[List[str]] = None, batch_size: int = 2000) -> Iterator[ExportRow]:
+        """Stream stores ordered by URL, with the status code and response time of their latest check"""
+
+    @abstractmethod
+    def get_stores_by_status(self, status: str) -> List[str]:
+        """Get list of URLs with specific status"""
+
+    @abstractmethod
+    def get_status_counts(self) -> Dict[str, int]:
+        """Get count of stores by status"""
+
+    @abstractmethod
+    def get_total_count(self) -> int:
+        """Get total number of stores"""
+
+    @abstractmethod
+    def get_data_version(self) -> str:
+        """Opaque token that changes whenever stores change (cache key for exports)"""
+
+    @abstractmethod
+    def get_filtered_data(self, status_filters: List[str], search_term: str = "") -> Dict[str, Dict[str, Any]]:
+        """Get filtered data based on status and search term"""
+
+    @abstractmethod
+    def get_timeline_data(self, days: int = None) -> List[Dict[str, Any]]:
+        """Get per-day check counts by status"""
+
+    @abstractmethod
+    def get_dead_stores_with_dates(self) -> Dict[str, str]:
+        """Get DEAD stores with their first dead dates"""
+
+    @abstractmethod
+    def iter_dead_stores(self, batch_size: int = 2000) -> Iterator[Tuple[str, str, int]]:
+        """Stream DEAD stores as (dead_date, url, check_count), newest Pacific date first, then by URL"""
+
+    @abstractmethod
+    def get_dead_date_counts(self) -> Dict[str, int]:
+        """Number of DEAD stores per Pacific dead date, newest date first"""
+
+    @abstractmethod
+    def get_store_details(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get detailed information for a specific store"""
+
+    @abstractmethod
+    def get_check_history(self, url: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get check history for a specific store, newest first"""
+
+    @abstractmethod
+    def clear_all_data(self) -> None:
+        """Clear all data"""
+
+    @abstractmethod
+    def remove_store(self, url: str) -> bool:
+        """Remove a specific store"""
+
+    @abstractmethod
+    def bulk_delete_by_status(self, statuses: List[str]) -> int:
+        """Delete all stores with any of the given statuses"""
+
+    @abstractmethod
+    def get_status_changes(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Get stores that changed status in the last N days"""
+
+    @abstractmethod
+    def get_latest_changes(self, minutes: int = 60) -> List[Dict[str, Any]]:
+        """Get status changes from the last N minutes"""
+
+    @abstractmethod
+    def get_last_event_id(self) -> int:
+        """Id of the newest store change event (0 if none); all events up to it are committed"""
+
+    @abstractmethod
+    def iter_store_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[DeltaRow]:
+        """Net change per store over change events (after_id, until_id], ordered by URL"""
+
+    @abstractmethod
+    def iter_status_changes(self, after_id: int, until_id: int, batch_size: int = 2000) -> Iterator[Dict[str, Any]]:
+        """
+        Status transitions of checked stores from change events (after_id, until_id], oldest first,
+        as {'id', 'url', 'from_status', 'to_status', 'changed_at'}
+        """
+
+    @abstractmethod
+    def get_sync_cursor(self, name: str) -> Optional[int]:
+        """Saved change-event watermark of a consumer, None if it never ran"""
+
+    @abstractmethod
+    def set_sync_cursor(self, name: str, position: int) -> None:
+        """Save a consumer's change-event watermark"""
+
+    @abstractmethod
+    def get_scheduler_state(self, name: str) -> Dict[str, Any]:
+        """Persisted state of a scheduled job ({} if it never ran)"""
+
+    @abstractmethod
+    def update_scheduler_state(self, name: str, changes: Dict[str, Any]) -> None:
+        """Merge changes into a scheduled job's persisted state"""
+
+    @abstractmethod
+    def save_check_run(self, run: Dict[str, Any]) -> None:
+        """Insert or replace a check run summary (RunMetrics.to_dict()), keyed by its id"""
+
+    @abstractmethod
+    def get_check_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent check run summaries, newest first"""
+
+    def acquire_leader_lock(self, name: str) -> Optional[LeaderLock]:
+        """
+        Try to become the only process holding the named lock (e.g. the
+        scheduler leader). Returns a held lock, or None if another process
+        has it. The default is a file lock in the working directory.
+        """
+        lock = LeaderLock(self._lock_path(name))
+        return lock if lock.acquire() else None
+
+    def _lock_path(self, name: str) -> str:
+        """File used by acquire_leader_lock()"""
+        return f"{name}.lock"
+
+    def get_live_count(self) -> int:
+        """Get number of LIVE stores"""
+        return self.get_status_counts().get('LIVE', 0)
+
+    def get_dead_count(self) -> int:
+        """Get number of DEAD stores"""
+        return self.get_status_counts().get('DEAD', 0)
+
+    def get_unpaid_count(self) -> int:
+        """Get number of UNPAID stores"""
+        return self.get_status_counts().get('UNPAID', 0)
+
+    def get_newly_dead_stores(self, minutes: int = 60) -> List[str]:
+        """Get stores that became DEAD in the last N minutes"""
+        changes = self.get_latest_changes(minutes)
+        return [c['url'] for c in changes if c['to_status'] == 'DEAD']
+
+    def iter_store_chunks(self, updated_since: Optional[datetime] = None, chunk_size: int = 10000,
+                          updated_before: Optional[datetime] = None) -> Iterator[List[tuple]]:
+        """
+        Stream store rows (EXPORT_STORE_COLUMNS) with updated_since <
+        updated_at <= updated_before, ordered by updated_at
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support columnar export")
+
+    def iter_history_chunks(self, after_id: int = 0, chunk_size: int = 50000,
+                            until_id: Optional[int] = None) -> Iterator[List[tuple]]:
+        """Stream check history rows (EXPORT_HISTORY_COLUMNS) with after_id < id <= until_id, ordered by id"""
+        raise NotImplementedError(f"{type(self).__name__} does not support columnar export")
+
+    def get_history_high_water(self) -> int:
+        """
+        Newest check history id with every lower id committed (or rolled
+        back), so an incremental export up to it never skips a row that
+        commits later
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support columnar export")
+
+    def compact_history(self, keep_days: int) -> int:
+        """
+        Delete check history older than keep_days, keeping each store's latest
+        check. Returns the rows deleted (0 for backends that bound history per store).
+        """
+        return 0
+
+    def flush(self) -> None:
+        """Make buffered writes durable (no-op for backends that commit per call)"""
+
+
+def get_storage_backend() -> StorageBackend:
+    """
+    Build the storage backend selected by STORAGE_BACKEND
+    (postgres, sqlite or json). Defaults to postgres when DATABASE_URL is
+    set and sqlite otherwise.
+    """
+    backend = os.getenv('STORAGE_BACKEND', '').strip().lower()
+    if not backend:
+        backend = 'postgres' if os.getenv('DATABASE_URL') else 'sqlite'
+
+    if backend in ('postgres', 'postgresql'):
+        from utils.db_manager import DatabaseManager
+        return DatabaseManager()
+    if backend == 'sqlite':
+        from utils.sqlite_manager import SQLiteManager
+        return SQLiteManager(os.getenv('SQLITE_PATH', 'shopify_data.db'))
+    if backend == 'json':
+        # Shared per file: JSON instances hold the data in memory
+        from utils.data_manager import get_data_manager
+        return get_data_manager(os.getenv('JSON_DATA_FILE', 'shopify_data.json'))
+
+    raise ValueError(
+        f"Unknown STORAGE_BACKEND '{backend}'. Use postgres, sqlite or json."
+    )
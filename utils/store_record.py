@@ -0,0 +1,240 @@
+import sys
+from array import array
+from collections import namedtuple
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# Lightweight row yielded by the streaming readers (iter_stores) of every
+# storage backend. Timestamps are kept as returned by the backend (datetime
+# for PostgreSQL, ISO string for the JSON store) to avoid per-row formatting.
+StoreRow = namedtuple('StoreRow', [
+    'url',
+    'status',
+    'first_check',
+    'last_check',
+    'first_dead_date',
+    'check_count',
+    'timezone_checked'
+])
+
+# StoreRow plus the HTTP code and response time of the store's latest check,
+# yielded by iter_export_rows() for machine-readable exports
+ExportRow = namedtuple('ExportRow', StoreRow._fields + ('last_status_code', 'last_response_time'))
+
+# Net change of one store since a change-log watermark, yielded by
+# iter_store_changes(). change is 'added', 'changed' or 'removed'; store
+# fields are None for removed stores.
+DeltaRow = namedtuple('DeltaRow', ('change',) + ExportRow._fields)
+
+HISTORY_LIMIT = 50
+
+# Interned status codes shared by every record in the process. History rings
+# store the small integer id instead of a string per entry.
+_STATUS_NAMES: List[str] = []
+_STATUS_IDS: Dict[str, int] = {}
+
+
+def status_id(status: str) -> int:
+    """Small integer code for a status string (assigned on first use)"""
+    code = _STATUS_IDS.get(status)
+    if code is None:
+        code = len(_STATUS_NAMES)
+        _STATUS_NAMES.append(sys.intern(status))
+        _STATUS_IDS[status] = code
+    return code
+
+
+def status_name(code: int) -> str:
+    """Status string for a code from status_id()"""
+    return _STATUS_NAMES[code]
+
+
+def to_epoch_us(value: Optional[str]) -> Optional[int]:
+    """Naive local ISO timestamp -> integer microseconds since the epoch"""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    return int(dt.timestamp()) * 1_000_000 + dt.microsecond
+
+
+def from_epoch_us(value: Optional[int]) -> Optional[str]:
+    """Integer microseconds since the epoch -> naive local ISO timestamp"""
+    if value is None:
+        return None
+    seconds, micros = divmod(value, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micros).isoformat()
+
+
+def epoch_us_date(value: int) -> str:
+    """Local calendar date (YYYY-MM-DD) of an epoch-microsecond timestamp"""
+    return datetime.fromtimestamp(value // 1_000_000).date().isoformat()
+
+
+class HistoryRing:
+    """
+    Fixed-capacity ring buffer of check history stored as parallel typed
+    arrays (struct-of-arrays): epoch-microsecond timestamps, status codes,
+    response times (float64, NaN = unknown) and HTTP codes (-1 = unknown).
+    """
+
+    __slots__ = ('timestamps', 'statuses', 'response_times', 'status_codes', 'start')
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.statuses = array('H')
+        self.response_times = array('d')
+        self.status_codes = array('h')
+        self.start = 0  # index of the oldest entry once the ring is full
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, timestamp: int, status: str, response_time: Optional[float] = None,
+               status_code: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        Add an entry, overwriting the oldest one when full.
+        Returns the overwritten (timestamp, status_code_id) or None.
+        """
+        values = (
+            timestamp,
+            status_id(status),
+            float('nan') if response_time is None else response_time,
+            -1 if status_code is None else status_code
+        )
+        if len(self.timestamps) < HISTORY_LIMIT:
+            self.timestamps.append(values[0])
+            self.statuses.append(values[1])
+            self.response_times.append(values[2])
+            self.status_codes.append(values[3])
+            return None
+
+        i = self.start
+        dropped = (self.timestamps[i], self.statuses[i])
+        self.timestamps[i], self.statuses[i], self.response_times[i], self.status_codes[i] = values
+        self.start = (i + 1) % HISTORY_LIMIT
+        return dropped
+
+    def _order(self) -> Iterator[int]:
+        """Physical indexes from oldest to newest"""
+        n = len(self.timestamps)
+        return ((self.start + k) % n for k in range(n))
+
+    def iter_raw(self) -> Iterator[Tuple[int, int]]:
+        """(timestamp, status_id) pairs from oldest to newest"""
+        for i in self._order():
+            yield self.timestamps[i], self.statuses[i]
+
+    def last(self) -> Optional[Tuple[int, int]]:
+        """Newest (timestamp, status_id), or None when empty"""
+        n = len(self.timestamps)
+        if not n:
+            return None
+        i = (self.start - 1) % n
+        return self.timestamps[i], self.statuses[i]
+
+    def last_result(self) -> Tuple[Optional[int], Optional[float]]:
+        """(status_code, response_time) of the newest entry, None where unknown"""
+        n = len(self.timestamps)
+        if not n:
+            return None, None
+        i = (self.start - 1) % n
+        response_time = self.response_times[i]
+        status_code = self.status_codes[i]
+        return (None if status_code < 0 else status_code,
+                None if response_time != response_time else response_time)
+
+    def entry(self, i: int) -> Dict[str, Any]:
+        """History entry at physical index i as a dict"""
+        response_time = self.response_times[i]
+        status_code = self.status_codes[i]
+        return {
+            'timestamp': from_epoch_us(self.timestamps[i]),
+            'status': status_name(self.statuses[i]),
+            'response_time': None if response_time != response_time else response_time,
+            'status_code': None if status_code < 0 else status_code
+        }
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """History entries from oldest to newest as dicts"""
+        return [self.entry(i) for i in self._order()]
+
+
+class StoreRecord:
+    """
+    Memory-compact in-process store record used by the JSON DataManager:
+    interned status strings, epoch-microsecond integer timestamps and a
+    HistoryRing instead of a dict per field and a list of history dicts.
+    """
+
+    __slots__ = ('status', 'first_check', 'last_check', 'first_dead_date',
+                 'check_count', 'timezone_checked', 'history')
+
+    def __init__(self, status: str = 'UNCHECKED'):
+        self.status = sys.intern(status)
+        self.first_check: Optional[int] = None
+        self.last_check: Optional[int] = None
+        self.first_dead_date: Optional[int] = None
+        self.check_count = 0
+        self.timezone_checked: Optional[str] = None
+        self.history: Optional[HistoryRing] = None  # allocated on first check
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StoreRecord':
+        """Build a record from the JSON dict representation"""
+        record = cls(data.get('status', 'UNCHECKED'))
+        record.update_fields(data)
+        for entry in data.get('check_history', []):
+            record.add_history(to_epoch_us(entry['timestamp']), entry['status'],
+                               entry.get('response_time'), entry.get('status_code'))
+        return record
+
+    def update_fields(self, data: Dict[str, Any]) -> None:
+        """Apply store-level fields from the JSON dict representation"""
+        self.status = sys.intern(data.get('status', self.status))
+        self.first_check = to_epoch_us(data.get('first_check'))
+        self.last_check = to_epoch_us(data.get('last_check'))
+        self.first_dead_date = to_epoch_us(data.get('first_dead_date'))
+        self.check_count = data.get('check_count', 0)
+        timezone_checked = data.get('timezone_checked')
+        self.timezone_checked = sys.intern(timezone_checked) if timezone_checked else None
+
+    def add_history(self, timestamp: int, status: str, response_time: Optional[float] = None,
+                    status_code: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """Append a history entry; returns the evicted (timestamp, status_id) if any"""
+        if self.history is None:
+            self.history = HistoryRing()
+        return self.history.append(timestamp, status, response_time, status_code)
+
+    def fields_dict(self) -> Dict[str, Any]:
+        """Store-level fields in the JSON dict representation"""
+        return {
+            'status': self.status,
+            'first_check': from_epoch_us(self.first_check),
+            'last_check': from_epoch_us(self.last_check),
+            'first_dead_date': from_epoch_us(self.first_dead_date),
+            'check_count': self.check_count,
+            'timezone_checked': self.timezone_checked
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Full JSON dict representation, including check history"""
+        data = self.fields_dict()
+        data['check_history'] = self.history.to_list() if self.history else []
+        return data
+
+    def to_export_row(self, url: str) -> ExportRow:
+        """ExportRow with ISO timestamps and the latest check result"""
+        last_status_code, last_response_time = self.history.last_result() if self.history else (None, None)
+        return ExportRow(*self.to_row(url), last_status_code, last_response_time)
+
+    def to_row(self, url: str) -> StoreRow:
+        """StoreRow with ISO timestamps"""
+        return StoreRow(
+            url,
+            self.status,
+            from_epoch_us(self.first_check),
+            from_epoch_us(self.last_check),
+            from_epoch_us(self.first_dead_date),
+            self.check_count,
+            self.timezone_checked
+        )
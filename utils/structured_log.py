@@ -0,0 +1,171 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# Correlation id of the check run in progress on this thread / context (see RunMetrics)
+_run_id: contextvars.ContextVar = contextvars.ContextVar('run_id', default=None)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def set_run_id(run_id: Optional[str]) -> contextvars.Token:
+    """Tag every following log line in this context with run_id; returns a token for reset_run_id()"""
+    return _run_id.set(run_id)
+
+
+def reset_run_id(token: contextvars.Token) -> None:
+    """Restore the run id that was current before set_run_id()"""
+    _run_id.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, run_id and the event's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        if getattr(record, 'run_id', None):
+            entry['run_id'] = record.run_id
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs: time, level, event, key=value fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = dict(getattr(record, 'fields', {}))
+        if getattr(record, 'run_id', None):
+            fields['run_id'] = record.run_id
+        line = (f"{datetime.fromtimestamp(record.created).strftime('%H:%M:%S')} "
+                f"{record.levelname:<7} {record.getMessage()}")
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class _RunIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = _run_id.get()
+        return True
+
+
+def _configure() -> None:
+    """
+    Set up the 'shopify' logger once: LOG_LEVEL (default INFO) and
+    LOG_FORMAT (json, the default, or text) on stdout.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(TextFormatter() if os.getenv('LOG_FORMAT', 'json').lower() == 'text' else JsonFormatter())
+        handler.addFilter(_RunIdFilter())
+        root = logging.getLogger('shopify')
+        root.addHandler(handler)
+        level = os.getenv('LOG_LEVEL', 'INFO').upper()
+        root.setLevel(level if isinstance(logging.getLevelName(level), int) else logging.INFO)
+        root.propagate = False
+        _configured = True
+
+
+class StructuredLogger:
+    """Logger taking an event name plus fields: log.info('pass_started', total=120)"""
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, fields: Dict[str, Any], exc_info: bool = False) -> None:
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={'fields': fields}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields) -> None:
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields) -> None:
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields) -> None:
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields) -> None:
+        """Error with the current exception's traceback"""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def sampled(self, rate: Optional[float] = None, max_per_second: Optional[float] = None) -> 'SampledLogger':
+        """
+        Logger for hot paths that keeps a random fraction (rate, default
+        LOG_SAMPLE_RATE) of events, at most max_per_second (default
+        LOG_MAX_PER_SECOND) of them
+        """
+        if rate is None:
+            rate = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+        if max_per_second is None:
+            max_per_second = float(os.getenv('LOG_MAX_PER_SECOND', '5'))
+        return SampledLogger(self.logger.name, rate, max_per_second)
+
+
+class SampledLogger(StructuredLogger):
+    """
+    Sampled and rate-limited logger (token bucket). The first event let
+    through after others were dropped carries their count as 'suppressed'.
+    Events below the logger's level cost one level check.
+    """
+
+    def __init__(self, name: str, rate: float, max_per_second: float):
+        super().__init__(name)
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self._tokens = max_per_second
+        self._refilled_at = time.monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def _allow(self) -> Optional[int]:
+        """Number of events suppressed since the last one let through, or None to drop this one"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_per_second, self._tokens + (now - self._refilled_at) * self.max_per_second)
+            self._refilled_at = now
+            if self._tokens < 1 or (self.rate < 1 and random.random() >= self.rate):
+                self._suppressed += 1
+                return None
+            self._tokens -= 1
+            suppressed, self._suppressed = self._suppressed, 0
+            return suppressed
+
+    def _log(self, level: int, event: str, fields: Dict[str, Any], exc_info: bool = False) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        suppressed = self._allow()
+        if suppressed is None:
+            return
+        if suppressed:
+            fields['suppressed'] = suppressed
+        self.logger.log(level, event, extra={'fields': fields}, exc_info=exc_info)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Structured logger under 'shopify' (e.g. 'shopify.checker')"""
+    _configure()
+    return StructuredLogger(name)
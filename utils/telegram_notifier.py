@@ -1,121 +1,478 @@
-
+import csv
+import io
 import os
+import random
+import tempfile
+import threading
+import time
 import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+from utils.metrics import NOTIFICATION_FAILURES
+from utils.structured_log import get_logger
+
+log = get_logger('shopify.telegram')
+# Per-batch events (queued notifications, retries), rate-limited
+batch_log = log.sampled(rate=1.0)
+
+# Telegram rejects messages longer than this many characters
+TELEGRAM_MESSAGE_LIMIT = 4096
+# ... and document captions longer than this
+TELEGRAM_CAPTION_LIMIT = 1024
+
+DEFAULT_API_BASE = "https://api.telegram.org"
+
+
+class TelegramDeliveryError(Exception):
+    """A notification could not be delivered to Telegram"""
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Split text into chunks of at most limit characters, on line boundaries where possible"""
+    chunks = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            # A single overlong line: hard-split it
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class _DeliveryQueue:
+    """
+    Background sender for one bot / chat.
+
+    Notifications are queued and a worker thread delivers them: everything
+    queued within TELEGRAM_COALESCE_SECONDS of the first pending item is
+    merged into one message, split at Telegram's 4096-character limit, and
+    sent over a persistent HTTP session no faster than one message per
+    TELEGRAM_MIN_INTERVAL seconds. Batches listing more stores than
+    TELEGRAM_INLINE_MAX go out as one summary with the full list attached as
+    a CSV document. 429 responses are retried after the retry_after Telegram
+    asks for; network errors and 5xx with exponential backoff, up to
+    TELEGRAM_MAX_RETRIES times.
+    """
+
+    def __init__(self, api_base: str, bot_token: str, chat_id: str):
+        self.api_url = f"{api_base}/bot{bot_token}"
+        self.chat_id = chat_id
+        self.coalesce_seconds = float(os.getenv('TELEGRAM_COALESCE_SECONDS', '5'))
+        self.min_interval = float(os.getenv('TELEGRAM_MIN_INTERVAL', '1.0'))
+        self.max_retries = int(os.getenv('TELEGRAM_MAX_RETRIES', '5'))
+
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._send_lock = threading.Lock()
+        self._last_send = 0.0
+
+        self._cond = threading.Condition()
+        self._messages: List[str] = []
+        self._dead: Dict[str, None] = {}  # ordered set of URLs
+        self._changes: Dict[str, Dict[str, Any]] = {}  # url -> merged change
+        self._first_pending_at: Optional[float] = None
+        self._flush_requested = False
+        self._busy = False
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0, 'rate_limited': 0}
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _has_pending(self) -> bool:
+        return bool(self._messages or self._dead or self._changes)
+
+    def _mark_pending(self):
+        """Start the coalescing window and wake the worker (lock held)"""
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+        self._cond.notify_all()
+
+    def put_message(self, text: str):
+        """Queue a preformatted message"""
+        with self._cond:
+            self._messages.append(text)
+            self._mark_pending()
+
+    def put_dead_stores(self, urls: List[str]):
+        """Queue newly dead stores"""
+        with self._cond:
+            for url in urls:
+                self._dead[url] = None
+            self._mark_pending()
+
+    def put_changes(self, changes: List[Dict[str, Any]]):
+        """Queue status changes, merging repeated changes of the same store"""
+        with self._cond:
+            TelegramNotifier.merge_changes(changes, self._changes)
+            self._mark_pending()
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Send pending notifications now and wait for delivery. Returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._has_pending() or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        """Worker loop: wait out the coalescing window, then send one batch"""
+        while True:
+            with self._cond:
+                while not self._has_pending():
+                    self._flush_requested = False
+                    self._cond.wait()
+                while not self._flush_requested:
+                    remaining = self._first_pending_at + self.coalesce_seconds - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                messages, dead, changes = self._messages, list(self._dead), list(self._changes.values())
+                self._messages, self._dead, self._changes = [], {}, {}
+                self._first_pending_at = None
+                self._busy = True
+
+            try:
+                for message in messages:
+                    self.send(message)
+                if (changes or dead) and not self._send_changes(changes, dead):
+                    log.error('telegram_dropped', stores=len(changes) + len(dead))
+            except Exception as e:
+                log.exception('telegram_delivery_error', error=str(e))
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _send_changes(self, changes: List[Dict[str, Any]], dead_stores: List[str], retry: bool = True) -> bool:
+        """
+        Send a batch inline, or as a summary plus CSV attachment when it is
+        large. True if all of it was delivered.
+        """
+        entries = TelegramNotifier.digest_entries(changes, dead_stores)
+        if len(entries) <= TelegramNotifier.INLINE_MAX:
+            return self.send(TelegramNotifier.format_changes(changes, dead_stores), retry)
+
+        with tempfile.TemporaryFile() as f:
+            TelegramNotifier.write_digest(entries, f)
+            f.seek(0)
+            filename = f"store_changes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            return self.send_document(f, filename, TelegramNotifier.format_summary(changes, dead_stores), retry)
+
+    def send(self, text: str, retry: bool = True) -> bool:
+        """
+        Send a message synchronously, split into chunks. True if every chunk
+        was delivered; with retry=False it stops at the first failed chunk.
+        """
+        delivered = True
+        for chunk in split_message(text):
+            delivered = self._post('sendMessage', {'text': chunk}, retry=retry) and delivered
+            if not delivered and not retry:
+                return False
+        return delivered
+
+    def send_document(self, f, filename: str, caption: str = "", retry: bool = True) -> bool:
+        """Upload a binary file object as one document message with an HTML caption"""
+        return self._post('sendDocument', {'caption': caption[:TELEGRAM_CAPTION_LIMIT]},
+                          files={'document': (filename, f, 'text/csv')}, retry=retry)
+
+    def _post(self, method: str, data: Dict[str, Any], files: Optional[Dict[str, tuple]] = None,
+              retry: bool = True) -> bool:
+        """
+        Call one Bot API method, honouring the send interval and retrying 429 /
+        5xx / network errors. With retry=False only rate limiting (429) is
+        waited out; other failures return False at once for the caller to retry.
+        """
+        payload = dict(data, chat_id=self.chat_id, parse_mode='HTML')
+        for attempt in range(self.max_retries + 1):
+            with self._send_lock:
+                wait = self._last_send + self.min_interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    if files:
+                        for _, fileobj, _ in files.values():
+                            fileobj.seek(0)
+                        response = self.session.post(f"{self.api_url}/{method}", data=payload,
+                                                     files=files, timeout=60)
+                    else:
+                        response = self.session.post(f"{self.api_url}/{method}", json=payload, timeout=10)
+                    error = None
+                except requests.RequestException as e:
+                    response = None
+                    error = str(e)
+                self._last_send = time.monotonic()
+
+            if response is not None and response.status_code == 200:
+                self.stats['sent'] += 1
+                return True
+
+            rate_limited = response is not None and response.status_code == 429
+            if rate_limited:
+                self.stats['rate_limited'] += 1
+                delay = self._retry_after(response) or self._backoff(attempt)
+            elif response is not None and response.status_code < 500:
+                # Bad request / auth errors won't succeed on retry
+                log.error('telegram_api_error', method=method, status_code=response.status_code,
+                          response=response.text[:500])
+                self.stats['failed'] += 1
+                NOTIFICATION_FAILURES.inc(sink='telegram')
+                return False
+            else:
+                delay = self._backoff(attempt)
+                error = error or f"HTTP {response.status_code}"
+            NOTIFICATION_FAILURES.inc(sink='telegram')
+
+            if attempt == self.max_retries or not (retry or rate_limited):
+                break
+            self.stats['retries'] += 1
+            batch_log.warning('telegram_retry', method=method, error=error or 'rate limited',
+                              attempt=attempt + 1, delay_seconds=round(delay, 1))
+            time.sleep(delay)
+
+        log.error('telegram_send_failed', method=method, attempts=attempt + 1)
+        self.stats['failed'] += 1
+        return False
+
+    @staticmethod
+    def _retry_after(response) -> Optional[float]:
+        """Seconds Telegram asked us to wait in a 429 response"""
+        try:
+            return float(response.json()['parameters']['retry_after'])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Exponential backoff with jitter, capped at one minute"""
+        return min(2 ** attempt, 60) + random.uniform(0, 0.5)
+
+
+_deliveries: Dict[Tuple[str, str, str], _DeliveryQueue] = {}
+_deliveries_lock = threading.Lock()
+
+
+def _get_delivery(api_base: str, bot_token: str, chat_id: str) -> _DeliveryQueue:
+    """Process-wide delivery queue per API / bot / chat, shared by every notifier instance"""
+    key = (api_base, bot_token, chat_id)
+    with _deliveries_lock:
+        delivery = _deliveries.get(key)
+        if delivery is None:
+            delivery = _DeliveryQueue(api_base, bot_token, chat_id)
+            _deliveries[key] = delivery
+        return delivery
+
 
 class TelegramNotifier:
-    """Handle Telegram notifications for store status changes"""
-    
-    def __init__(self):
+    """
+    Handle Telegram notifications for store status changes.
+
+    notify_* calls only queue the notification and return immediately; a
+    background worker coalesces, rate-limits and delivers them (see
+    _DeliveryQueue). send_message(), deliver_status_changes() and
+    test_connection() are synchronous.
+    """
+
+    # Batches listing more stores than this are sent as a CSV attachment
+    INLINE_MAX = int(os.getenv('TELEGRAM_INLINE_MAX', '50'))
+
+    DIGEST_COLUMNS = ['change', 'url', 'from_status', 'to_status', 'changed_at']
+
+    def __init__(self, api_base: Optional[str] = None):
+        # TELEGRAM_API_BASE points at a self-hosted Bot API server or the local stub (utils/telegram_stub.py)
+        self.api_base = (api_base or os.getenv('TELEGRAM_API_BASE') or DEFAULT_API_BASE).rstrip('/')
         self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
         self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
         self.enabled = bool(self.bot_token and self.chat_id)
-        
+
         if not self.enabled:
-            print("⚠️ Telegram notifications disabled: TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID not set")
-            print(f"   Bot Token exists: {bool(self.bot_token)}")
-            print(f"   Chat ID exists: {bool(self.chat_id)}")
+            log.warning('telegram_disabled', bot_token_set=bool(self.bot_token), chat_id_set=bool(self.chat_id))
+            self.delivery = None
         else:
-            print(f"✅ Telegram enabled - Chat ID: {self.chat_id[:5]}...")
-    
+            log.info('telegram_enabled', chat_id=f"{self.chat_id[:5]}...", api_base=self.api_base)
+            self.delivery = _get_delivery(self.api_base, self.bot_token, self.chat_id)
+
     def send_message(self, message: str) -> bool:
-        """Send a message to Telegram"""
+        """Send a message to Telegram now (chunked and retried)"""
         if not self.enabled:
-            print("❌ Telegram send_message: Not enabled")
+            log.warning('telegram_not_enabled', call='send_message')
             return False
-        
-        try:
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
-            payload = {
-                'chat_id': self.chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }
-            
-            print(f"📤 Sending Telegram message to {self.chat_id}...")
-            response = requests.post(url, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                print("✅ Telegram message sent successfully")
-                return True
-            else:
-                print(f"❌ Telegram API error: {response.status_code}")
-                print(f"   Response: {response.text}")
-                return False
-        except Exception as e:
-            print(f"❌ Error sending Telegram message: {e}")
-            import traceback
-            traceback.print_exc()
+
+        if self.delivery.send(message):
+            log.info('telegram_message_sent', length=len(message))
+            return True
+        return False
+
+    def queue_message(self, message: str) -> bool:
+        """Queue a message for background delivery"""
+        if not self.enabled:
             return False
-    
+        self.delivery.put_message(message)
+        return True
+
     def notify_dead_stores(self, dead_stores: List[str]) -> bool:
-        """Notify about newly dead stores"""
+        """Queue a notification about newly dead stores"""
         if not dead_stores:
-            print("ℹ️ notify_dead_stores: No dead stores to notify")
+            log.debug('telegram_nothing_to_notify', call='notify_dead_stores')
             return True
-        
-        print(f"📢 notify_dead_stores: Preparing notification for {len(dead_stores)} dead stores")
-        
-        message = f"🔴 <b>New DEAD Stores Detected</b>\n\n"
-        message += f"Found {len(dead_stores)} newly dead store(s):\n\n"
-        
-        for i, url in enumerate(dead_stores[:10], 1):  # Limit to 10 to avoid message too long
-            message += f"{i}. {url}\n"
-        
-        if len(dead_stores) > 10:
-            message += f"\n... and {len(dead_stores) - 10} more"
-        
-        message += f"\n\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        
-        return self.send_message(message)
-    
+        if not self.enabled:
+            return False
+
+        batch_log.info('telegram_queued', kind='dead_stores', count=len(dead_stores))
+        self.delivery.put_dead_stores(dead_stores)
+        return True
+
     def notify_status_changes(self, changes: List[Dict[str, Any]]) -> bool:
-        """Notify about status changes"""
+        """Queue a notification about status changes"""
         if not changes:
-            print("ℹ️ notify_status_changes: No changes to notify")
+            log.debug('telegram_nothing_to_notify', call='notify_status_changes')
             return True
-        
-        print(f"📢 notify_status_changes: Preparing notification for {len(changes)} changes")
-        
-        message = f"🔄 <b>Store Status Changes</b>\n\n"
-        
-        # Group by change type
-        to_dead = [c for c in changes if c['to_status'] == 'DEAD']
-        to_live = [c for c in changes if c['to_status'] == 'LIVE' and c['from_status'] == 'DEAD']
-        to_unpaid = [c for c in changes if c['to_status'] == 'UNPAID']
-        
-        if to_dead:
-            message += f"🔴 Newly DEAD ({len(to_dead)}):\n"
-            for change in to_dead[:5]:
-                message += f"• {change['url']}\n"
-            if len(to_dead) > 5:
-                message += f"... and {len(to_dead) - 5} more\n"
-            message += "\n"
-        
-        if to_live:
-            message += f"🟢 Recovered to LIVE ({len(to_live)}):\n"
-            for change in to_live[:5]:
-                message += f"• {change['url']}\n"
-            if len(to_live) > 5:
-                message += f"... and {len(to_live) - 5} more\n"
-            message += "\n"
-        
-        if to_unpaid:
-            message += f"🟡 Now UNPAID ({len(to_unpaid)}):\n"
-            for change in to_unpaid[:5]:
-                message += f"• {change['url']}\n"
-            if len(to_unpaid) > 5:
-                message += f"... and {len(to_unpaid) - 5} more\n"
-        
-        message += f"\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        
-        return self.send_message(message)
-    
+        if not self.enabled:
+            return False
+
+        batch_log.info('telegram_queued', kind='status_changes', count=len(changes))
+        self.delivery.put_changes(changes)
+        return True
+
+    def deliver_status_changes(self, changes: List[Dict[str, Any]]) -> None:
+        """
+        Send status changes now, formatted like queued ones, sharing the
+        queue's send interval. Raises TelegramDeliveryError unless Telegram
+        accepted all of it; failures other than rate limiting are not
+        retried here, so the caller (the notification sink) owns retries.
+        """
+        if not self.enabled:
+            raise TelegramDeliveryError("Telegram is not configured (TELEGRAM_BOT_TOKEN / TELEGRAM_CHAT_ID)")
+        merged = list(self.merge_changes(changes).values())
+        if merged and not self.delivery._send_changes(merged, [], retry=False):
+            raise TelegramDeliveryError(f"Telegram did not accept {len(merged)} status changes")
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Deliver queued notifications now and wait for them (e.g. before exit)"""
+        if not self.enabled:
+            return True
+        return self.delivery.flush(timeout)
+
+    def get_delivery_stats(self) -> Dict[str, int]:
+        """Counters of the background sender"""
+        return dict(self.delivery.stats) if self.enabled else {}
+
+    @staticmethod
+    def merge_changes(changes: List[Dict[str, Any]],
+                      merged: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Merge repeated changes of the same store (into merged, url -> change):
+        one change from the first status to the last, dropped when the store
+        ends where it started
+        """
+        merged = {} if merged is None else merged
+        for change in changes:
+            pending = merged.get(change['url'])
+            if pending is None:
+                merged[change['url']] = dict(change)
+            else:
+                pending['to_status'] = change['to_status']
+                if pending['to_status'] == pending['from_status']:
+                    del merged[change['url']]
+        return merged
+
+    @staticmethod
+    def digest_entries(changes: List[Dict[str, Any]], dead_stores: List[str] = ()) -> List[Tuple[str, ...]]:
+        """
+        Every store in a batch as (change, url, from_status, to_status, changed_at),
+        grouped dead / recovered / unpaid / other. A store reported both as a
+        status change and as newly dead is listed once.
+        """
+        groups: Dict[str, List[Tuple[str, ...]]] = {'dead': [], 'recovered': [], 'unpaid': [], 'other': []}
+        seen = set()
+        for c in changes:
+            if c['to_status'] == 'DEAD':
+                change = 'dead'
+            elif c['to_status'] == 'LIVE' and c['from_status'] == 'DEAD':
+                change = 'recovered'
+            elif c['to_status'] == 'UNPAID':
+                change = 'unpaid'
+            else:
+                change = 'other'
+            groups[change].append((change, c['url'], c['from_status'], c['to_status'], c.get('changed_at') or ''))
+            seen.add(c['url'])
+        for url in dead_stores:
+            if url not in seen:
+                groups['dead'].append(('dead', url, '', 'DEAD', ''))
+                seen.add(url)
+        return [entry for group in groups.values() for entry in group]
+
+    @classmethod
+    def write_digest(cls, entries: List[Tuple[str, ...]], f) -> None:
+        """Write digest entries as CSV to a binary file object"""
+        text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(cls.DIGEST_COLUMNS)
+        writer.writerows(entries)
+        text.flush()
+        text.detach()
+
+    @staticmethod
+    def _count_changes(entries: List[Tuple[str, ...]]) -> Dict[str, int]:
+        """Number of digest entries per change category"""
+        counts: Dict[str, int] = {}
+        for entry in entries:
+            counts[entry[0]] = counts.get(entry[0], 0) + 1
+        return counts
+
+    @staticmethod
+    def _title(changes: List[Dict[str, Any]]) -> str:
+        """Message heading - dead-only batches keep the old dead store alert title"""
+        if changes:
+            return "🔄 <b>Store Status Changes</b>\n\n"
+        return "🔴 <b>New DEAD Stores Detected</b>\n\n"
+
+    @classmethod
+    def format_changes(cls, changes: List[Dict[str, Any]], dead_stores: List[str] = ()) -> str:
+        """One message listing every store of a small batch"""
+        entries = cls.digest_entries(changes, dead_stores)
+        message = cls._title(changes)
+        for change, title in (('dead', "🔴 Newly DEAD"), ('recovered', "🟢 Recovered to LIVE"),
+                              ('unpaid', "🟡 Now UNPAID")):
+            urls = [entry[1] for entry in entries if entry[0] == change]
+            if urls:
+                message += f"{title} ({len(urls)}):\n"
+                message += "".join(f"• {url}\n" for url in urls)
+                message += "\n"
+
+        message += f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        return message
+
+    @classmethod
+    def format_summary(cls, changes: List[Dict[str, Any]], dead_stores: List[str] = ()) -> str:
+        """Caption with per-category counts for a batch sent as an attachment"""
+        counts = cls._count_changes(cls.digest_entries(changes, dead_stores))
+        message = cls._title(changes)
+        for change, title in (('dead', "🔴 Newly DEAD"), ('recovered', "🟢 Recovered to LIVE"),
+                              ('unpaid', "🟡 Now UNPAID"), ('other', "🔁 Other changes")):
+            if counts.get(change):
+                message += f"{title}: {counts[change]:,}\n"
+        message += "\n📎 Full list attached\n"
+        message += f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        return message
+
     def test_connection(self) -> bool:
         """Test Telegram connection"""
         if not self.enabled:
             return False
-        
+
         message = "✅ Telegram notification is working!\n\nShopify Store Monitor is connected."
         return self.send_message(message)
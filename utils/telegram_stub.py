@@ -0,0 +1,193 @@
+"""
+Local stand-in for the Telegram Bot API, for testing notification delivery
+without a real bot.
+
+Accepts sendMessage (JSON or form) and sendDocument (multipart) on
+/bot<token>/<method>, records every delivered message, and can inject
+latency, 5xx errors and Telegram-style 429 rate limiting.
+
+Usage: python -m utils.telegram_stub [--port 8081] [--rate-limit 1] [--error-rate 0.05]
+Then run the app with TELEGRAM_API_BASE=http://127.0.0.1:8081
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import parse_qsl
+
+
+class TelegramStub:
+    """
+    Threaded fake Bot API server.
+
+    latency: seconds added to every request (plus up to latency_jitter)
+    error_rate: fraction of requests answered with 502
+    rate_limit: messages accepted per chat per rate_window seconds, 0 = unlimited;
+        requests over the limit get 429 with parameters.retry_after
+    """
+
+    METHODS = ('sendMessage', 'sendDocument', 'getMe')
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 latency_jitter: float = 0.0, error_rate: float = 0.0, rate_limit: int = 0,
+                 rate_window: float = 1.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.messages: List[Dict[str, Any]] = []
+        self.stats = {'requests': 0, 'delivered': 0, 'rate_limited': 0, 'errors': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sent_at: Dict[str, deque] = {}  # chat_id -> accept times inside the window
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as TELEGRAM_API_BASE"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """Serve in a background thread; returns the base URL"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _check_rate_limit(self, chat_id: str) -> Optional[int]:
+        """Record an accepted message, or return retry_after seconds if over the limit (lock held)"""
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        sent = self._sent_at.setdefault(chat_id, deque())
+        while sent and sent[0] <= now - self.rate_window:
+            sent.popleft()
+        if len(sent) >= self.rate_limit:
+            return max(1, math.ceil(sent[0] + self.rate_window - now))
+        sent.append(now)
+        return None
+
+    def handle(self, method: str, fields: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Process one API call; returns (HTTP status, JSON body)"""
+        delay = self.latency + self._random.uniform(0, self.latency_jitter)
+        if delay:
+            time.sleep(delay)
+
+        with self._lock:
+            self.stats['requests'] += 1
+            if method not in self.METHODS:
+                return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+            if method == 'getMe':
+                return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'username': 'stub_bot'}}
+            if self._random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}
+
+            chat_id = str(fields.get('chat_id', ''))
+            retry_after = self._check_rate_limit(chat_id)
+            if retry_after is not None:
+                self.stats['rate_limited'] += 1
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {retry_after}",
+                    'parameters': {'retry_after': retry_after}
+                }
+
+            self.stats['delivered'] += 1
+            message = dict(fields, method=method, message_id=len(self.messages) + 1,
+                           received_at=time.time())
+            self.messages.append(message)
+            return 200, {'ok': True, 'result': {'message_id': message['message_id']}}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                parts = self.path.strip('/').split('/')
+                method = parts[-1] if len(parts) == 2 and parts[0].startswith('bot') else ''
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                status, payload = stub.handle(method, stub.parse_body(self.headers.get('Content-Type', ''), body))
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @staticmethod
+    def parse_body(content_type: str, body: bytes) -> Dict[str, Any]:
+        """Request fields from a JSON, urlencoded or multipart body; uploads become {'filename', 'content'}"""
+        if not body:
+            return {}
+        if content_type.startswith('application/json'):
+            return json.loads(body)
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=default_policy).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body)
+            fields: Dict[str, Any] = {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                content = part.get_payload(decode=True)
+                if part.get_filename():
+                    fields[name] = {'filename': part.get_filename(), 'content': content}
+                else:
+                    fields[name] = content.decode('utf-8')
+            return fields
+        return dict(parse_qsl(body.decode('utf-8')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests failing with 502')
+    parser.add_argument('--rate-limit', type=int, default=0, help='messages per chat per --rate-window, 0 = unlimited')
+    parser.add_argument('--rate-window', type=float, default=1.0)
+    args = parser.parse_args()
+
+    stub = TelegramStub(args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+                        rate_limit=args.rate_limit, rate_window=args.rate_window)
+    print(f"🤖 Telegram stub listening on {stub.start()}")
+    seen = 0
+    try:
+        while True:
+            time.sleep(0.5)
+            for message in stub.messages[seen:]:
+                text = message.get('text') or message.get('caption') or ''
+                print(f"[{message['method']} #{message['message_id']} chat={message.get('chat_id')}] "
+                      f"{text.splitlines()[0] if text else ''}")
+            seen = len(stub.messages)
+    except KeyboardInterrupt:
+        print(f"\n{stub.stats}")
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()